@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import logging
+import time
+
+import asyncpg
+
+from init_db import PRODUCTS_DB_URL
+from product_queries import PRICE_BUCKETS
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Recalcul complet de user_product_stats (migrations/products_db/0004), par
+# tranches d'utilisateurs : un INSERT ... SELECT ... GROUP BY par tranche, lu
+# par l'index (user_id, id) INCLUDE (..., price), au lieu d'une requête par
+# utilisateur. À lancer après un chargement fait triggers désactivés, ou pour
+# corriger une dérive signalée par --check.
+
+# Utilisateurs recalculés par transaction : borne la durée du verrou d'écriture
+BACKFILL_BATCH_USERS = 10000
+
+STATS_COLUMNS = (["user_id", "product_count", "priced_count", "total_price"]
+                 + [column for column, _, _ in PRICE_BUCKETS])
+
+DELETE_RANGE = "DELETE FROM user_product_stats WHERE user_id >= $1 AND user_id < $2"
+INSERT_RANGE = (f"INSERT INTO user_product_stats ({', '.join(STATS_COLUMNS)}) "
+                f"SELECT {', '.join(STATS_COLUMNS)} FROM user_product_stats_source "
+                f"WHERE user_id >= $1 AND user_id < $2")
+
+# Utilisateurs dont la ligne diffère du calcul complet ou manque ; une ligne à
+# zéro sans produit est normale (tous ses produits ont été supprimés)
+CHECK_DRIFT = (f"SELECT count(*) FROM user_product_stats_source s "
+               f"FULL JOIN user_product_stats t USING (user_id) "
+               f"WHERE CASE WHEN s.user_id IS NULL THEN t.product_count <> 0 "
+               f"WHEN t.user_id IS NULL THEN true "
+               f"ELSE ({', '.join('s.' + c for c in STATS_COLUMNS[1:])}) "
+               f"IS DISTINCT FROM ({', '.join('t.' + c for c in STATS_COLUMNS[1:])}) END")
+
+
+async def backfill_range(conn, low: int, high: int) -> int:
+    # Le verrou SHARE bloque les écritures (pas les lectures) sur products le
+    # temps de la tranche : aucun delta de trigger ne peut se glisser entre le
+    # calcul et son écriture
+    async with conn.transaction():
+        await conn.execute("LOCK TABLE products IN SHARE MODE")
+        await conn.execute(DELETE_RANGE, low, high)
+        result = await conn.execute(INSERT_RANGE, low, high)
+    return int(result.split()[-1])
+
+
+async def backfill(dsn: str, batch_users: int):
+    conn = await asyncpg.connect(dsn)
+    try:
+        first, last = await conn.fetchrow(
+            "SELECT least((SELECT min(user_id) FROM products), (SELECT min(user_id) FROM user_product_stats)), "
+            "greatest((SELECT max(user_id) FROM products), (SELECT max(user_id) FROM user_product_stats))")
+        if first is None:
+            logger.info("No products: nothing to backfill")
+            return
+        started = time.perf_counter()
+        users = 0
+        for low in range(first, last + 1, batch_users):
+            users += await backfill_range(conn, low, low + batch_users)
+            elapsed = time.perf_counter() - started
+            logger.info("user_product_stats: users %s-%s done, %s users (%.0f users/s)",
+                        low, min(last, low + batch_users - 1), users, users / elapsed)
+        await conn.execute("ANALYZE user_product_stats")
+        logger.info("Backfilled %s users in %.1f s", users, time.perf_counter() - started)
+    finally:
+        await conn.close()
+
+
+async def check(dsn: str) -> int:
+    conn = await asyncpg.connect(dsn)
+    try:
+        drift = await conn.fetchval(CHECK_DRIFT)
+    finally:
+        await conn.close()
+    print(f"{drift} users with out-of-date product stats")
+    return drift
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Recompute per-user product aggregates in batches")
+    parser.add_argument("--batch-users", type=int, default=BACKFILL_BATCH_USERS,
+                        help="users recomputed per transaction")
+    parser.add_argument("--check", action="store_true", help="only count users whose stats are out of date")
+    args = parser.parse_args()
+    if args.check:
+        raise SystemExit(1 if asyncio.run(check(PRODUCTS_DB_URL)) else 0)
+    asyncio.run(backfill(PRODUCTS_DB_URL, args.batch_users))
@@ -0,0 +1,107 @@
+# Benchmark de débit des écritures en lot (product_writes).
+#
+# Pour chaque taille de lot (1 à 10 000), crée, met à jour puis supprime des
+# produits, une transaction par lot, et affiche le débit en lignes/s par
+# opération. Le mode "rows" sert de référence : une instruction par ligne
+# (executemany), qui déclenche les triggers de user_product_stats à chaque ligne.
+# Les produits sont écrits pour des utilisateurs réservés au benchmark et
+# supprimés à la fin de chaque passe.
+# Nécessite une base products_db migrée (0004 : user_product_stats).
+#
+# Usage : python benchmarks/bench_bulk_writes.py --rows 20000
+#         python benchmarks/bench_bulk_writes.py --sizes 100 1000 --modes batch
+import argparse
+import asyncio
+import os
+import sys
+import time
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import products_service  # noqa: E402
+from product_writes import create_products, delete_products, update_products  # noqa: E402
+
+# Utilisateurs réservés au benchmark, hors des plages de seed_db.py
+FIRST_USER_ID = 900000000
+USERS = 100
+
+ROW_INSERT = "INSERT INTO products (user_id, name, price, description) VALUES ($1, $2, $3, $4) RETURNING id"
+ROW_UPDATE = "UPDATE products SET price = $2 WHERE id = $1"
+ROW_DELETE = "DELETE FROM products WHERE id = $1"
+
+
+def make_products(count: int) -> list:
+    return [{"user_id": FIRST_USER_ID + i % USERS, "name": f"Bench product {i}",
+             "price": Decimal(i % 2000) + Decimal("0.99"), "description": "bulk write benchmark"}
+            for i in range(count)]
+
+
+async def write_batch(conn, mode: str, operation: str, batch: list) -> list:
+    # Renvoie les ids créés (création) ; une transaction par lot dans les deux modes
+    async with conn.transaction():
+        if mode == "batch":
+            if operation == "create":
+                result, _ = await create_products(conn, batch)
+                return result["ids"]
+            if operation == "update":
+                await update_products(conn, [{"id": product_id, "price": Decimal("1.00")} for product_id in batch])
+            else:
+                await delete_products(conn, batch)
+            return []
+        if operation == "create":
+            return [await conn.fetchval(ROW_INSERT, p["user_id"], p["name"], p["price"], p["description"])
+                    for p in batch]
+        if operation == "update":
+            await conn.executemany(ROW_UPDATE, [(product_id, Decimal("1.00")) for product_id in batch])
+        else:
+            await conn.executemany(ROW_DELETE, [(product_id,) for product_id in batch])
+        return []
+
+
+async def measure(conn, mode: str, size: int, rows: int) -> dict:
+    products = make_products(rows)
+    batches = [products[i:i + size] for i in range(0, rows, size)]
+    result = {}
+
+    start = time.perf_counter()
+    ids = []
+    for batch in batches:
+        ids += await write_batch(conn, mode, "create", batch)
+    result["create"] = rows / (time.perf_counter() - start)
+
+    id_batches = [ids[i:i + size] for i in range(0, len(ids), size)]
+    for operation in ("update", "delete"):
+        start = time.perf_counter()
+        for batch in id_batches:
+            await write_batch(conn, mode, operation, batch)
+        result[operation] = rows / (time.perf_counter() - start)
+    return result
+
+
+async def run(args):
+    await products_service.db_pool.start()
+    try:
+        async with products_service.db_pool.acquire() as conn:
+            print(f"{args.rows} rows per operation, one transaction per batch\n")
+            print(f"{'mode':<6} {'batch':>6} {'create rows/s':>14} {'update rows/s':>14} {'delete rows/s':>14}")
+            for mode in args.modes:
+                for size in args.sizes:
+                    # Le mode ligne à ligne est plafonné : il mesure le coût par ligne
+                    rows = min(args.rows, args.max_row_mode_rows) if mode == "rows" else args.rows
+                    result = await measure(conn, mode, size, max(rows, size))
+                    print(f"{mode:<6} {size:>6} {result['create']:>14.0f} {result['update']:>14.0f} "
+                          f"{result['delete']:>14.0f}")
+    finally:
+        await products_service.db_pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write throughput of the bulk product API per batch size")
+    parser.add_argument("--rows", type=int, default=20000, help="rows written per operation and batch size")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 10, 100, 1000, 10000])
+    parser.add_argument("--modes", nargs="+", default=["batch", "rows"], choices=["batch", "rows"])
+    parser.add_argument("--max-row-mode-rows", type=int, default=5000,
+                        help="cap on rows written by the per-row reference mode")
+    asyncio.run(run(parser.parse_args()))
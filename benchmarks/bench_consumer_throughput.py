@@ -0,0 +1,107 @@
+# Benchmark de débit du moteur de consommation de products_service.
+#
+# Remplit la file "bench_product_requests" (flux ou liste) d'un Redis local,
+# puis la vide avec ConsumerEngine pour plusieurs niveaux de concurrence. La
+# requête SQL est simulée par une latence fixe par lot afin de mesurer
+# uniquement le moteur, le regroupement et Redis.
+#
+# Usage : python benchmarks/bench_consumer_throughput.py --messages 5000 --concurrency 1 8 32 --mode stream list
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis.asyncio as aioredis  # noqa: E402
+
+from consumer_engine import ConsumerEngine  # noqa: E402
+from work_queue import MESSAGE_FIELD, ListQueue, StreamQueue  # noqa: E402
+
+QUEUE = "bench_product_requests"
+REPLY_KEY = "bench_product_replies"
+FAKE_PRODUCTS = [{"id": i, "user_id": 1, "name": f"Product {i}", "price": 9.99, "description": None}
+                 for i in range(5)]
+
+
+def make_queue(client, mode: str):
+    if mode == "stream":
+        return StreamQueue(client, QUEUE, group="bench", maxlen=0)
+    return ListQueue(client, QUEUE)
+
+
+async def fill_queue(client, queue, messages: int):
+    await client.delete(QUEUE, REPLY_KEY)
+    # Le groupe doit exister avant le remplissage (lecture à partir de "0")
+    await queue.setup()
+    async with client.pipeline(transaction=False) as pipe:
+        for i in range(messages):
+            message = json.dumps({"user_id": 1, "correlation_id": str(i), "reply_to": REPLY_KEY})
+            if queue.mode == "stream":
+                pipe.xadd(QUEUE, {MESSAGE_FIELD: message})
+            else:
+                pipe.lpush(QUEUE, message)
+        await pipe.execute()
+
+
+async def run_level(client, mode: str, messages: int, concurrency: int, db_latency: float, batch_size: int):
+    async def handler(messages):
+        # Une requête simulée par lot, puis une réponse par demande
+        await asyncio.sleep(db_latency)
+        async with client.pipeline(transaction=False) as pipe:
+            for message in messages:
+                request_data = json.loads(message)
+                pipe.lpush(request_data["reply_to"], json.dumps(
+                    {"correlation_id": request_data["correlation_id"], "products": FAKE_PRODUCTS}))
+            await pipe.execute()
+
+    queue = make_queue(client, mode)
+    await fill_queue(client, queue, messages)
+    engine = ConsumerEngine(queue, handler, concurrency=concurrency,
+                            max_pending=concurrency * batch_size * 2, batch_size=batch_size)
+    runner = asyncio.create_task(engine.run())
+
+    start = time.perf_counter()
+    while engine.processed + engine.failed < messages:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    await engine.stop()
+    await runner
+    return elapsed, engine.failed
+
+
+async def run(messages: int, levels, db_latency: float, batch_sizes, modes, host: str, port: int):
+    client = aioredis.Redis(host=host, port=port, max_connections=max(levels) + 8)
+    try:
+        await client.ping()
+    except Exception as e:
+        print(f"Redis is not reachable at {host}:{port}: {e}")
+        return
+
+    print(f"{'mode':>6} {'workers':>8} {'batch':>6} {'messages':>9} {'seconds':>8} {'msg/s':>9} {'failed':>7}")
+    for mode in modes:
+        for batch_size in batch_sizes:
+            for concurrency in levels:
+                elapsed, failed = await run_level(client, mode, messages, concurrency, db_latency, batch_size)
+                print(f"{mode:>6} {concurrency:>8} {batch_size:>6} {messages:>9} {elapsed:>8.2f} "
+                      f"{messages / elapsed:>9.0f} {failed:>7}")
+
+    await client.delete(QUEUE, REPLY_KEY)
+    await client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sustained throughput of the products consumer engine")
+    parser.add_argument("--messages", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, nargs="+", default=[1, 8, 32])
+    parser.add_argument("--db-latency", type=float, default=0.002, help="simulated query latency (s)")
+    parser.add_argument("--batch-size", type=int, nargs="+", default=[1, 50])
+    parser.add_argument("--mode", nargs="+", default=["stream", "list"], choices=["stream", "list"])
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6380)
+    args = parser.parse_args()
+    asyncio.run(run(args.messages, args.concurrency, args.db_latency, args.batch_size, args.mode,
+                    args.host, args.port))
@@ -0,0 +1,71 @@
+# Benchmark mémoire de l'export NDJSON de products_service.
+#
+# Pour chaque nombre de lignes, un processus neuf exporte les produits soit en
+# flux (stream_products_ndjson, curseur côté serveur), soit à l'ancienne
+# (fetch de toutes les lignes, liste Python puis tableau JSON), et on relève
+# son pic de RSS. En flux, le pic doit rester plat quel que soit le volume.
+# Nécessite une base products_db remplie (voir l'outil de seed).
+#
+# Usage : python benchmarks/bench_export_memory.py --rows 10000 100000 1000000
+import argparse
+import asyncio
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss est en kilo-octets sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def child(rows: int, mode: str):
+    import products_service
+    from product_queries import build_export_query
+
+    await products_service.db_pool.start()
+    start = time.perf_counter()
+    exported_bytes = 0
+    try:
+        if mode == "stream":
+            async for chunk in products_service.stream_products_ndjson(max_rows=rows):
+                exported_bytes += len(chunk)
+        else:
+            async with products_service.db_pool.acquire() as conn:
+                products = await conn.fetch(build_export_query(False, rows))
+            exported_bytes = len(json.dumps([dict(p) for p in products], default=float))
+    finally:
+        await products_service.db_pool.close()
+    elapsed = time.perf_counter() - start
+    print(json.dumps({"seconds": elapsed, "bytes": exported_bytes, "peak_rss_mb": peak_rss_mb()}))
+
+
+def run(row_counts, modes):
+    print(f"{'rows':>10} {'mode':>7} {'seconds':>8} {'MB out':>8} {'peak RSS MB':>12}")
+    for rows in row_counts:
+        for mode in modes:
+            output = subprocess.run([sys.executable, os.path.abspath(__file__), "--child", str(rows), mode],
+                                    capture_output=True, text=True, cwd=ROOT)
+            if output.returncode != 0:
+                print(f"{rows:>10} {mode:>7} failed: {output.stderr.strip().splitlines()[-1:]}")
+                continue
+            result = json.loads(output.stdout.strip().splitlines()[-1])
+            print(f"{rows:>10} {mode:>7} {result['seconds']:>8.2f} {result['bytes'] / 1e6:>8.1f} "
+                  f"{result['peak_rss_mb']:>12.1f}")
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--child":
+        asyncio.run(child(int(sys.argv[2]), sys.argv[3]))
+        sys.exit(0)
+    parser = argparse.ArgumentParser(description="Peak RSS of streamed vs in-memory product export")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--modes", nargs="+", default=["stream", "list"], choices=["stream", "list"])
+    args = parser.parse_args()
+    run(args.rows, args.modes)
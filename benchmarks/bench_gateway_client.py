@@ -0,0 +1,70 @@
+# Benchmark du client HTTP de la passerelle vers users_service.
+#
+# Compare l'ancien comportement (un httpx.AsyncClient créé par requête, donc
+# une nouvelle connexion TCP à chaque appel) au client partagé du lifespan
+# (gateway_service.create_http_client) et affiche les latences p50/p99.
+#
+# Usage : python benchmarks/bench_gateway_client.py --url http://localhost:8002/users/2 --requests 2000
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+from gateway_service import create_http_client  # noqa: E402
+
+
+async def per_request_client(url: str):
+    async with httpx.AsyncClient() as client:
+        return await client.get(url, timeout=10.0)
+
+
+async def run_mode(name: str, call, requests: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            start = time.perf_counter()
+            try:
+                response = await call()
+                if response.status_code >= 500:
+                    errors += 1
+            except httpx.HTTPError:
+                errors += 1
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(requests)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = latencies[len(latencies) // 2] * 1000
+    p99 = latencies[max(0, int(len(latencies) * 0.99) - 1)] * 1000
+    print(f"{name:<12} {requests / elapsed:>9.0f} {p50:>9.2f} {p99:>9.2f} {errors:>7}")
+
+
+async def run(url: str, requests: int, concurrency: int):
+    print(f"{'client':<12} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    await run_mode("per-request", lambda: per_request_client(url), requests, concurrency)
+
+    client = create_http_client()
+    try:
+        await run_mode("pooled", lambda: client.get(url), requests, concurrency)
+    finally:
+        await client.aclose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-request vs pooled httpx client latency")
+    parser.add_argument("--url", default="http://localhost:8002/health")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.requests, args.concurrency))
@@ -0,0 +1,95 @@
+# Benchmark du coût de la journalisation par requête.
+#
+# Envoie des requêtes à /api/users/{id} de la passerelle, en processus (ASGI),
+# avec un service users simulé, et compare le débit selon la configuration
+# des logs. Les logs sont écrits dans /dev/null : on mesure le coût CPU côté
+# boucle d'événements, pas celui du disque (--output pour écrire dans un vrai
+# fichier). Les modes sont alternés sur plusieurs tours et on garde le meilleur.
+#   off          : WARNING seulement
+#   sync-debug   : handler synchrone, charges utiles journalisées (ancien comportement)
+#   sync-info    : handler synchrone au niveau INFO
+#   queue-info   : QueueHandler + thread d'écriture JSON (logging_setup)
+#   queue-sampled: idem, 1 % des requêtes journalisées
+#
+# Usage : python benchmarks/bench_logging.py --requests 5000 --concurrency 20 --rounds 3
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+
+import gateway_service  # noqa: E402
+import logging_setup  # noqa: E402
+
+MODES = ["off", "sync-debug", "sync-info", "queue-info", "queue-sampled"]
+
+USER_REPLY = {"id": 1, "name": "John Doe", "email": "john@example.com",
+              "products": [{"id": i, "user_id": 1, "name": f"Product {i}", "price": "9.99",
+                            "description": "Wireless noise-cancelling headphones"} for i in range(20)]}
+
+
+def configure(mode: str, devnull):
+    logging_setup.stop_logging()
+    if mode.startswith("queue"):
+        logging_setup.setup_logging("gateway", stream=devnull, level="INFO",
+                                    sample_rate=0.01 if mode == "queue-sampled" else 1.0)
+        return
+    handler = logging.StreamHandler(devnull)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel({"off": logging.WARNING, "sync-debug": logging.DEBUG, "sync-info": logging.INFO}[mode])
+
+
+async def run_mode(mode: str, requests: int, concurrency: int, devnull) -> float:
+    configure(mode, devnull)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(app=gateway_service.app, base_url="http://gateway") as client:
+        async def one(i: int):
+            async with semaphore:
+                response = await client.get(f"/api/users/{i % 1000 + 1}")
+                response.raise_for_status()
+
+        # Échauffement hors mesure
+        await asyncio.gather(*(one(i) for i in range(min(200, requests))))
+        start = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(requests)))
+        elapsed = time.perf_counter() - start
+    logging_setup.stop_logging()
+    return elapsed
+
+
+async def run(requests: int, concurrency: int, modes, rounds: int, output: str):
+    # Service users simulé : réponse fixe, sans réseau
+    gateway_service.http_client = httpx.AsyncClient(
+        transport=httpx.MockTransport(lambda request: httpx.Response(200, json=USER_REPLY)))
+    best = {}
+    with open(output, "w") as stream:
+        for _ in range(rounds):
+            for mode in modes:
+                elapsed = await run_mode(mode, requests, concurrency, stream)
+                best[mode] = min(best.get(mode, elapsed), elapsed)
+    await gateway_service.http_client.aclose()
+
+    print(f"{'mode':<14} {'req/s':>9} {'us/req':>9} {'overhead':>9}")
+    baseline = best[modes[0]] / requests * 1e6
+    for mode in modes:
+        per_request = best[mode] / requests * 1e6
+        print(f"{mode:<14} {requests / best[mode]:>9.0f} {per_request:>9.1f} "
+              f"{(per_request - baseline) / baseline:>+9.1%}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Request overhead of the logging configurations")
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--modes", nargs="+", default=MODES, choices=MODES)
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--output", default=os.devnull, help="where log lines are written")
+    args = parser.parse_args()
+    asyncio.run(run(args.requests, args.concurrency, args.modes, args.rounds, args.output))
@@ -0,0 +1,108 @@
+# Benchmark de concurrence du chemin demande/réponse Redis de users_service.
+#
+# Un répondeur simulé remplace products_service (latence fixe par demande) et
+# on lance N recherches de produits en parallèle. Avec un client Redis
+# asynchrone, la durée totale doit rester proche de la latence d'une seule
+# recherche et la boucle d'événements ne doit jamais rester bloquée.
+#
+# Usage : python benchmarks/bench_redis_concurrency.py --lookups 500 --delay 0.05
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import users_service  # noqa: E402
+from work_queue import product_request_queue  # noqa: E402
+
+
+async def fake_products_worker(delay: float, stop: asyncio.Event):
+    # Chaque demande est traitée dans sa propre tâche, comme un products_service idéal
+    client = users_service.redis_client
+    # Même transport (flux ou liste) que users_service, lu avec son propre consommateur
+    queue = product_request_queue(client, users_service.product_queue.mode)
+    await queue.setup()
+
+    async def reply(request_data):
+        await asyncio.sleep(delay)
+        user_id = request_data["user_id"]
+        await client.lpush(request_data["reply_to"], json.dumps({
+            "correlation_id": request_data["correlation_id"],
+            "products": [{"id": user_id, "user_id": user_id}],
+        }))
+
+    pending = set()
+    while not stop.is_set():
+        entries = await queue.read(100, 1)
+        for _, message in entries:
+            task = asyncio.create_task(reply(json.loads(message)))
+            pending.add(task)
+            task.add_done_callback(pending.discard)
+        await queue.ack([entry_id for entry_id, _ in entries if entry_id is not None])
+    await asyncio.gather(*pending)
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01):
+    # Retard maximal observé entre deux réveils successifs de la boucle
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def lookup(user_id: int):
+    start = time.perf_counter()
+    # Appel direct du transport : le cache de produits fusionnerait les recherches
+    reply = await users_service.request_products(user_id)
+    return time.perf_counter() - start, len(reply.get("products", []))
+
+
+async def run(lookups: int, delay: float):
+    # Un seul contrôle, sans la surveillance périodique du service
+    await users_service.redis_monitor.check()
+    if not users_service.USE_REDIS:
+        print("Redis is not reachable, aborting benchmark")
+        return
+    users_service.reply_router.start()
+
+    stop = asyncio.Event()
+    worker = asyncio.create_task(fake_products_worker(delay, stop))
+    lag = asyncio.create_task(measure_loop_lag(stop))
+
+    start = time.perf_counter()
+    # Toutes les recherches portent sur le même utilisateur : les identifiants
+    # de corrélation garantissent que chacune reçoit sa propre réponse
+    results = await asyncio.gather(*(lookup(1) for _ in range(lookups)))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    await worker
+    worst_lag = await lag
+    await users_service.reply_router.stop()
+    # Démarré par redis_monitor avec le routeur de réponses
+    await users_service.change_subscriber.stop()
+    await users_service.redis_client.close()
+
+    latencies = sorted(r[0] for r in results)
+    answered = sum(1 for r in results if r[1])
+    print(f"lookups:            {lookups}")
+    print(f"answered:           {answered}")
+    print(f"simulated latency:  {delay * 1000:.1f} ms")
+    print(f"wall time:          {elapsed:.3f} s (sequential would be ~{lookups * delay:.1f} s)")
+    print(f"throughput:         {lookups / elapsed:.0f} lookups/s")
+    print(f"p50 / p99 latency:  {latencies[len(latencies) // 2] * 1000:.1f} / "
+          f"{latencies[int(len(latencies) * 0.99) - 1] * 1000:.1f} ms")
+    print(f"max event-loop lag: {worst_lag * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent product lookups through Redis")
+    parser.add_argument("--lookups", type=int, default=500)
+    parser.add_argument("--delay", type=float, default=0.05, help="simulated products_service latency (s)")
+    args = parser.parse_args()
+    asyncio.run(run(args.lookups, args.delay))
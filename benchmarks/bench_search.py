@@ -0,0 +1,120 @@
+# Benchmark de latence de la recherche de produits (/products/search).
+#
+# Rejoue un mélange de requêtes (mots entiers, préfixes, plusieurs mots, filtres
+# de prix, pages suivantes) avec chacun des moteurs :
+#   postgres : index GIN plein texte + trigrammes (search_products)
+#   memory   : index inversé en mémoire (SearchIndex), lignes relues par id
+#   ilike    : référence sans index de recherche (ILIKE sur name et description)
+# et affiche les percentiles de latence par moteur. Le temps de chargement et
+# la mémoire de l'index en mémoire sont affichés à part.
+# Nécessite une base products_db migrée et remplie (seed_db.py --products 1000000).
+#
+# Usage : python benchmarks/bench_search.py --iterations 200
+#         python benchmarks/bench_search.py --backends postgres memory --iterations 500
+import argparse
+import asyncio
+import os
+import resource
+import statistics
+import sys
+import time
+from decimal import Decimal
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import products_service  # noqa: E402
+from product_queries import PRODUCT_COLUMNS, search_products  # noqa: E402
+from search_index import SearchIndex  # noqa: E402
+
+# (q, min_price, max_price, offset) ; vocabulaire de seed_db.py
+QUERIES = [
+    ("laptop", None, None, 0),
+    ("wireless", None, None, 0),
+    ("wire", None, None, 0),
+    ("head", None, None, 0),
+    ("smart watch", None, None, 0),
+    ("portable speaker bluetooth", None, None, 0),
+    ("phone", None, None, 0),
+    ("noise cancelling", Decimal("100"), Decimal("500"), 0),
+    ("camera", Decimal("1000"), None, 0),
+    ("drone", None, None, 100),
+    ("eco lamp energy", None, None, 0),
+    ("zzz", None, None, 0),
+]
+
+LIMIT = 20
+
+ILIKE_QUERY = ("SELECT id, user_id, name, price, description FROM products "
+               "WHERE name ILIKE $1 OR description ILIKE $1 ORDER BY id LIMIT $2 OFFSET $3")
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss est en kilo-octets sous Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+async def run_query(backend: str, q: str, min_price, max_price, offset: int) -> int:
+    columns = list(PRODUCT_COLUMNS)
+    if backend == "memory":
+        products, _ = await products_service.search_in_index(q, LIMIT, offset, columns, min_price, max_price)
+        return len(products)
+    async with products_service.db_pool.acquire() as conn:
+        if backend == "postgres":
+            products, _ = await search_products(conn, q, LIMIT, offset, columns, min_price, max_price)
+        else:
+            # Référence : filtre de prix ignoré, une seule sous-chaîne
+            products = await conn.fetch(ILIKE_QUERY, f"%{q}%", LIMIT, offset)
+    return len(products)
+
+
+async def measure(backend: str, iterations: int) -> dict:
+    latencies = []
+    found = 0
+    for i in range(iterations):
+        q, min_price, max_price, offset = QUERIES[i % len(QUERIES)]
+        start = time.perf_counter()
+        found += await run_query(backend, q, min_price, max_price, offset)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+
+    def percentile(p):
+        return latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000
+
+    return {"p50": percentile(0.5), "p95": percentile(0.95), "p99": percentile(0.99),
+            "mean": statistics.mean(latencies) * 1000, "rows": found / iterations}
+
+
+async def run(args):
+    await products_service.db_pool.start()
+    try:
+        async with products_service.db_pool.acquire() as conn:
+            total = await conn.fetchval("SELECT count(*) FROM products")
+        print(f"{total} products, {args.iterations} queries per backend\n")
+
+        if "memory" in args.backends:
+            rss_before = peak_rss_mb()
+            products_service.search_index = SearchIndex()
+            async with products_service.db_pool.acquire() as conn:
+                await products_service.search_index.load(conn)
+            index = products_service.search_index.metrics()
+            print(f"memory index: {index['documents']} products, {index['terms']} terms, "
+                  f"loaded in {index['load_seconds']:.1f} s, peak RSS +{peak_rss_mb() - rss_before:.0f} MB\n")
+
+        print(f"{'backend':<9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'mean ms':>8} {'rows':>6}")
+        for backend in args.backends:
+            # Une passe de chauffe : caches PostgreSQL et requêtes préparées
+            await measure(backend, len(QUERIES))
+            result = await measure(backend, args.iterations)
+            print(f"{backend:<9} {result['p50']:>8.1f} {result['p95']:>8.1f} {result['p99']:>8.1f} "
+                  f"{result['mean']:>8.1f} {result['rows']:>6.1f}")
+    finally:
+        await products_service.db_pool.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Latency of product search per backend")
+    parser.add_argument("--iterations", type=int, default=200, help="queries per backend")
+    parser.add_argument("--backends", nargs="+", default=["postgres", "memory", "ilike"],
+                        choices=["postgres", "memory", "ilike"])
+    asyncio.run(run(parser.parse_args()))
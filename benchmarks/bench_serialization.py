@@ -0,0 +1,86 @@
+# Micro-benchmark des sérialiseurs de lignes produits.
+#
+# Compare, en lignes par seconde :
+#   - legacy  : dict(row) + boucle hasattr('to_eng_string') + json.dumps (ancien process_requests)
+#   - json    : RowSerializer précompilé + json standard
+#   - orjson  : RowSerializer précompilé + orjson (si installé)
+#
+# Usage : python benchmarks/bench_serialization.py --rows 100000
+import argparse
+import json
+import os
+import sys
+import time
+from decimal import Decimal
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from serialization import RowSerializer, _default  # noqa: E402
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+COLUMNS = [("id", "int4"), ("user_id", "int4"), ("name", "varchar"), ("price", "numeric"), ("description", "text")]
+
+
+def make_rows(count: int) -> list:
+    # Des dict imitent les asyncpg.Record (mêmes méthodes values()/items())
+    return [{"id": i, "user_id": i % 1000, "name": f"Product {i}", "price": Decimal(f"{i % 1000}.99"),
+             "description": "Lorem ipsum dolor sit amet" if i % 3 else None} for i in range(count)]
+
+
+def legacy(rows) -> bytes:
+    products_json = []
+    for product in rows:
+        product_dict = {}
+        for key, value in dict(product).items():
+            if hasattr(value, 'to_eng_string'):
+                try:
+                    product_dict[key] = float(value)
+                except:
+                    product_dict[key] = str(value)
+            elif value is None:
+                product_dict[key] = None
+            else:
+                product_dict[key] = value
+        products_json.append(product_dict)
+    return json.dumps(products_json).encode()
+
+
+def compiled_json(rows) -> bytes:
+    serializer = RowSerializer(COLUMNS)
+    return json.dumps(serializer.to_dicts(rows), default=_default, separators=(",", ":")).encode()
+
+
+def compiled_orjson(rows) -> bytes:
+    serializer = RowSerializer(COLUMNS)
+    return orjson.dumps(serializer.to_dicts(rows), default=_default)
+
+
+def run(count: int, repeat: int):
+    rows = make_rows(count)
+    candidates = [("legacy", legacy), ("json", compiled_json)]
+    if orjson is not None:
+        candidates.append(("orjson", compiled_orjson))
+    else:
+        print("orjson is not installed, skipping the orjson serializer")
+
+    print(f"{'serializer':<10} {'rows/s':>12} {'bytes':>12}")
+    for name, serializer in candidates:
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            payload = serializer(rows)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        print(f"{name:<10} {count / best:>12.0f} {len(payload):>12}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rows per second for each product row serializer")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.rows, args.repeat)
@@ -0,0 +1,86 @@
+# Benchmark du temps de démarrage à froid des trois services.
+#
+# Lance chaque service avec uvicorn dans un nouveau processus et mesure, depuis
+# le lancement :
+#   live  : première réponse 200 de /health/live (première requête servie)
+#   ready : première réponse 200 de /health/ready (dépendances requises prêtes)
+# Chaque service est lancé seul, --runs fois ; on garde la médiane et le pire.
+# --env permet de mesurer un démarrage sans Redis ou sans PostgreSQL joignable
+# (ex. --env REDIS_PORT=1) : live ne doit pas en dépendre.
+#
+# Usage : python benchmarks/bench_startup.py --runs 5
+#         python benchmarks/bench_startup.py --runs 5 --env REDIS_PORT=1
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx  # noqa: E402
+
+# Module ASGI et port de chaque service
+SERVICES = {
+    "products": ("products_service:app", 8000),
+    "users": ("users_service:app", 8002),
+    "gateway": ("gateway_service:app", 8003),
+}
+
+
+def wait_for(client: httpx.Client, url: str, deadline: float, interval: float):
+    while time.perf_counter() < deadline:
+        try:
+            if client.get(url, timeout=1.0).status_code == 200:
+                return time.perf_counter()
+        except httpx.HTTPError:
+            pass
+        time.sleep(interval)
+    return None
+
+
+def measure(app: str, port: int, env: dict, timeout: float, interval: float) -> tuple:
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+        cwd=ROOT, env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        deadline = start + timeout
+        with httpx.Client() as client:
+            live = wait_for(client, f"http://localhost:{port}/health/live", deadline, interval)
+            ready = wait_for(client, f"http://localhost:{port}/health/ready", deadline, interval) if live else None
+    finally:
+        process.terminate()
+        process.wait()
+    return (live - start if live else None), (ready - start if ready else None)
+
+
+def summarize(values: list) -> str:
+    measured = [v * 1000 for v in values if v is not None]
+    if not measured:
+        return f"{'-':>9} {'-':>9}"
+    missing = len(values) - len(measured)
+    suffix = f" ({missing} timeouts)" if missing else ""
+    return f"{statistics.median(measured):>9.0f} {max(measured):>9.0f}{suffix}"
+
+
+def main(args):
+    env = dict(item.split("=", 1) for item in args.env)
+    print(f"{'service':<9} {'live p50':>9} {'live max':>9} {'ready p50':>9} {'ready max':>9}  (ms)")
+    for name in args.services:
+        app, port = SERVICES[name]
+        runs = [measure(app, port, env, args.timeout, args.interval) for _ in range(args.runs)]
+        print(f"{name:<9} {summarize([r[0] for r in runs])} {summarize([r[1] for r in runs])}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start time of each service until it serves requests")
+    parser.add_argument("--services", nargs="+", default=list(SERVICES), choices=list(SERVICES))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--timeout", type=float, default=30, help="seconds before a run is counted as a timeout")
+    parser.add_argument("--interval", type=float, default=0.01, help="polling interval (s)")
+    parser.add_argument("--env", nargs="*", default=[], metavar="KEY=VALUE",
+                        help="extra environment for the services, e.g. REDIS_PORT=1")
+    main(parser.parse_args())
@@ -0,0 +1,137 @@
+# Benchmark de passage à l'échelle des consommateurs du flux de demandes.
+#
+# Remplit un flux Redis, puis le vide avec N processus consommateurs d'un même
+# groupe (un ConsumerEngine par processus, comme PRODUCTS_CONSUMER_PROCESSES).
+# La requête SQL est simulée par une latence fixe par lot : le débit d'un
+# consommateur est connu et l'écart à la linéarité mesure le coût de la
+# coordination (XREADGROUP, XACK, XAUTOCLAIM) et de Redis.
+#
+# Avec --crash, un consommateur est tué (SIGKILL) à mi-parcours : ses demandes
+# lues mais non acquittées doivent être reprises par les autres (XAUTOCLAIM),
+# aucune ne doit manquer ; les doublons éventuels sont comptés.
+#
+# Usage : python benchmarks/bench_stream_workers.py --messages 20000 --workers 1 2 4 8
+#         python benchmarks/bench_stream_workers.py --messages 20000 --workers 4 --crash
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import signal
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis.asyncio as aioredis  # noqa: E402
+
+from consumer_engine import ConsumerEngine  # noqa: E402
+from work_queue import MESSAGE_FIELD, StreamQueue  # noqa: E402
+
+STREAM = "bench_product_requests:stream"
+GROUP = "bench"
+DONE_KEY = "bench_product_requests:done"
+HANDLED_KEY = "bench_product_requests:handled"
+
+
+def make_queue(client, claim_idle_ms: int) -> StreamQueue:
+    return StreamQueue(client, STREAM, group=GROUP, maxlen=0, claim_idle_ms=claim_idle_ms, claim_interval=0.2)
+
+
+async def consume(args):
+    client = aioredis.Redis(host=args.host, port=args.port)
+
+    async def handler(messages):
+        # Une requête simulée par lot, puis le marquage des demandes traitées
+        await asyncio.sleep(args.db_latency)
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.sadd(DONE_KEY, *(json.loads(message)["correlation_id"] for message in messages))
+            pipe.incrby(HANDLED_KEY, len(messages))
+            await pipe.execute()
+
+    engine = ConsumerEngine(make_queue(client, args.claim_idle_ms), handler, concurrency=args.concurrency,
+                            batch_size=args.batch_size)
+    loop = asyncio.get_running_loop()
+    loop.add_signal_handler(signal.SIGTERM, lambda: asyncio.create_task(engine.stop()))
+    await engine.run()
+    await client.close()
+
+
+def run_consumer(args):
+    asyncio.run(consume(args))
+
+
+async def fill_stream(client, messages: int, claim_idle_ms: int):
+    await client.delete(STREAM, DONE_KEY, HANDLED_KEY)
+    await make_queue(client, claim_idle_ms).setup()
+    for start in range(0, messages, 10000):
+        async with client.pipeline(transaction=False) as pipe:
+            for i in range(start, min(messages, start + 10000)):
+                pipe.xadd(STREAM, {MESSAGE_FIELD: json.dumps({"user_id": 1, "correlation_id": str(i)})})
+            await pipe.execute()
+
+
+async def run_level(client, args, workers: int):
+    await fill_stream(client, args.messages, args.claim_idle_ms)
+    context = multiprocessing.get_context("fork")
+    processes = [context.Process(target=run_consumer, args=(args,), name=f"bench-consumer-{i}")
+                 for i in range(workers)]
+    start = time.perf_counter()
+    for process in processes:
+        process.start()
+
+    crashed = False
+    while (done := await client.scard(DONE_KEY)) < args.messages:
+        if args.crash and not crashed and workers > 1 and done >= args.messages // 2:
+            # Arrêt brutal : pas d'acquittement ni de remise en file
+            os.kill(processes[0].pid, signal.SIGKILL)
+            crashed = True
+        if time.perf_counter() - start > args.timeout:
+            break
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - start
+
+    for process in processes:
+        if process.is_alive():
+            process.terminate()
+    for process in processes:
+        process.join()
+    handled = int(await client.get(HANDLED_KEY) or 0)
+    return elapsed, done, handled - done
+
+
+async def run(args):
+    client = aioredis.Redis(host=args.host, port=args.port)
+    try:
+        await client.ping()
+    except Exception as e:
+        print(f"Redis is not reachable at {args.host}:{args.port}: {e}")
+        return
+
+    print(f"{'workers':>8} {'messages':>9} {'done':>9} {'seconds':>8} {'msg/s':>9} {'speedup':>8} "
+          f"{'efficiency':>10} {'duplicates':>10}")
+    baseline = None
+    for workers in args.workers:
+        elapsed, done, duplicates = await run_level(client, args, workers)
+        throughput = done / elapsed
+        baseline = baseline or throughput / workers
+        print(f"{workers:>8} {args.messages:>9} {done:>9} {elapsed:>8.2f} {throughput:>9.0f} "
+              f"{throughput / baseline:>8.2f} {throughput / baseline / workers:>10.0%} {duplicates:>10}")
+
+    await client.delete(STREAM, DONE_KEY, HANDLED_KEY)
+    await client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Throughput of N stream consumers in one consumer group")
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8], help="consumer processes")
+    parser.add_argument("--concurrency", type=int, default=1, help="engine workers per process")
+    parser.add_argument("--batch-size", type=int, default=10)
+    parser.add_argument("--db-latency", type=float, default=0.005, help="simulated query latency per batch (s)")
+    parser.add_argument("--claim-idle-ms", type=int, default=1000)
+    parser.add_argument("--crash", action="store_true", help="SIGKILL one consumer half-way through")
+    parser.add_argument("--timeout", type=float, default=120, help="give up on a level after this many seconds")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=6380)
+    asyncio.run(run(parser.parse_args()))
@@ -0,0 +1,64 @@
+# Benchmark des formats de messages Redis pour les réponses produits.
+#
+# Pour plusieurs tailles de réponse, affiche la taille sur le fil et le temps
+# d'encodage/décodage de chaque format, avec et sans compression.
+#
+# Usage : python benchmarks/bench_wire_format.py --products 5 100 1000
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import wire_format  # noqa: E402
+from wire_format import FORMAT_COLUMNAR, FORMAT_JSON, FORMAT_MSGPACK, decode, encode  # noqa: E402
+
+
+def make_reply(count: int) -> dict:
+    return {
+        "correlation_id": "4f9c2d0e8a7b4c1d9e3f5a6b7c8d9e0f",
+        "products": [{"id": i, "user_id": 42, "name": f"Product {i}", "price": f"{i % 1000}.99",
+                      "description": "Wireless noise-cancelling headphones" if i % 3 else None}
+                     for i in range(count)],
+    }
+
+
+def timed(fn, repeat: int) -> float:
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def run(sizes, repeat: int):
+    formats = [FORMAT_JSON, FORMAT_COLUMNAR]
+    if wire_format.msgpack is not None:
+        formats.append(FORMAT_MSGPACK)
+    else:
+        print("msgpack is not installed, skipping the msgpack format")
+
+    print(f"{'products':>8} {'format':<10} {'zlib':>5} {'bytes':>9} {'encode us':>10} {'decode us':>10}")
+    for size in sizes:
+        reply = make_reply(size)
+        for fmt in formats:
+            for threshold in (0, 1):
+                if fmt == FORMAT_JSON and threshold:
+                    continue  # le format historique n'est jamais compressé
+                wire_format.COMPRESSION_THRESHOLD = threshold
+                payload = encode(reply, fmt)
+                encode_time = timed(lambda: encode(reply, fmt), repeat)
+                decode_time = timed(lambda: decode(payload), repeat)
+                print(f"{size:>8} {fmt:<10} {'yes' if threshold else 'no':>5} {len(payload):>9} "
+                      f"{encode_time * 1e6:>10.1f} {decode_time * 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bytes on the wire and CPU cost of each Redis message format")
+    parser.add_argument("--products", type=int, nargs="+", default=[5, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    run(args.products, args.repeat)
@@ -0,0 +1,227 @@
+# Banc de charge de bout en bout des trois services.
+#
+# Rejoue un mélange de requêtes (fichier JSONL, une ligne par type de requête
+# avec son poids) en boucle ouverte : les arrivées suivent un processus de
+# Poisson au débit demandé, indépendamment des réponses, et la latence est
+# mesurée depuis l'instant d'arrivée prévu (pas d'omission coordonnée).
+# Chaque type de requête vise la passerelle ou directement users/products, ce
+# qui donne la latence de chaque saut. Les services tournent déjà, ou sont
+# lancés par le banc avec uvicorn (--spawn) contre PostgreSQL et Redis locaux.
+# Seul ce mode avec de vrais services est pris en charge : des substituts en
+# processus de PostgreSQL et Redis mesureraient les substituts, pas les sauts
+# (pool de connexions, file Redis, requêtes SQL) que le banc doit suivre.
+#
+# Les résultats peuvent être enregistrés comme référence (--save) et comparés
+# à une référence précédente (--compare) : code de sortie 1 en cas de régression.
+#
+# Usage : python benchmarks/harness.py --spawn --rate 200 --duration 30 --save local
+#         python benchmarks/harness.py --rate 200 --duration 30 --compare benchmarks/baselines/local.json
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINES_DIR = os.path.join(ROOT, "benchmarks", "baselines")
+sys.path.insert(0, ROOT)
+
+import httpx  # noqa: E402
+
+# Services lancés par --spawn : module, port et sonde de disponibilité
+SERVICES = {
+    "products": ("products_service:app", 8000, "/health/ready"),
+    "users": ("users_service:app", 8002, "/health/ready"),
+    "gateway": ("gateway_service:app", 8003, "/health/ready"),
+}
+
+# Hausse absolue du taux d'erreurs tolérée par --compare
+ERROR_RATE_TOLERANCE = 0.01
+
+
+def load_mix(path: str) -> list:
+    mix = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                entry = json.loads(line)
+                entry.setdefault("method", "GET")
+                entry.setdefault("weight", 1)
+                mix.append(entry)
+    return mix
+
+
+def build_request(entry: dict, rng: random.Random, max_user_id: int) -> dict:
+    user_id = rng.randint(1, max_user_id)
+    request = {"method": entry["method"], "url": entry["path"].replace("{user_id}", str(user_id))}
+    if entry.get("params"):
+        request["params"] = entry["params"]
+    if entry.get("batch_size"):
+        request["json"] = {"ids": [rng.randint(1, max_user_id) for _ in range(entry["batch_size"])]}
+    return request
+
+
+def spawn_services():
+    processes = []
+    for name, (app, port, _) in SERVICES.items():
+        processes.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", app, "--port", str(port), "--log-level", "warning"],
+            cwd=ROOT))
+    return processes
+
+
+async def wait_ready(urls: dict, timeout: float):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        for name, url in urls.items():
+            health = url + SERVICES[name][2]
+            while True:
+                try:
+                    if (await client.get(health, timeout=1.0)).status_code == 200:
+                        break
+                except httpx.HTTPError:
+                    pass
+                if time.monotonic() > deadline:
+                    raise SystemExit(f"{name} service not ready at {health}")
+                await asyncio.sleep(0.2)
+
+
+def percentile(values: list, fraction: float) -> float:
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+def summarize(samples: dict, duration: float) -> dict:
+    results = {}
+    for name, sample in sorted(samples.items()):
+        latencies = sorted(sample["latencies"])
+        count = len(latencies)
+        results[name] = {
+            "service": sample["service"],
+            "requests": count,
+            "errors": sample["errors"],
+            "throughput": count / duration,
+            "p50_ms": percentile(latencies, 0.50) * 1000 if count else None,
+            "p95_ms": percentile(latencies, 0.95) * 1000 if count else None,
+            "p99_ms": percentile(latencies, 0.99) * 1000 if count else None,
+        }
+    return results
+
+
+async def run_load(mix: list, urls: dict, rate: float, duration: float, max_user_id: int,
+                   seed: int, timeout: float) -> dict:
+    rng = random.Random(seed)
+    weights = [entry["weight"] for entry in mix]
+    samples = {entry["name"]: {"service": entry["service"], "latencies": [], "errors": 0} for entry in mix}
+    limits = httpx.Limits(max_connections=1000, max_keepalive_connections=200)
+
+    async with httpx.AsyncClient(limits=limits, timeout=timeout) as client:
+        async def fire(entry: dict, request: dict, scheduled: float):
+            ok = True
+            try:
+                response = await client.request(request.pop("method"), urls[entry["service"]] + request.pop("url"),
+                                                **request)
+                ok = response.status_code < 400
+            except httpx.HTTPError:
+                ok = False
+            sample = samples[entry["name"]]
+            sample["latencies"].append(time.perf_counter() - scheduled)
+            if not ok:
+                sample["errors"] += 1
+
+        tasks = []
+        start = time.perf_counter()
+        next_arrival = start
+        while next_arrival - start < duration:
+            delay = next_arrival - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            entry = rng.choices(mix, weights)[0]
+            tasks.append(asyncio.create_task(fire(entry, build_request(entry, rng, max_user_id), next_arrival)))
+            next_arrival += rng.expovariate(rate)
+        await asyncio.gather(*tasks)
+    return summarize(samples, duration)
+
+
+def print_results(results: dict):
+    print(f"{'request':<20} {'service':<9} {'req':>7} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for name, r in results.items():
+        if not r["requests"]:
+            continue
+        print(f"{name:<20} {r['service']:<9} {r['requests']:>7} {r['errors']:>5} {r['throughput']:>8.1f} "
+              f"{r['p50_ms']:>8.2f} {r['p95_ms']:>8.2f} {r['p99_ms']:>8.2f}")
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> int:
+    # Régression : p95/p99 plus lents au-delà de la tolérance, ou taux d'erreurs en hausse
+    regressions = 0
+    for name, old in baseline["results"].items():
+        new = results.get(name)
+        if not new or not new["requests"] or not old["requests"]:
+            continue
+        for key in ("p95_ms", "p99_ms"):
+            if new[key] > old[key] * (1 + tolerance):
+                regressions += 1
+                print(f"REGRESSION {name} {key}: {old[key]:.2f} -> {new[key]:.2f}")
+        if new["errors"] / new["requests"] > old["errors"] / old["requests"] + ERROR_RATE_TOLERANCE:
+            regressions += 1
+            print(f"REGRESSION {name} errors: {old['errors']}/{old['requests']} -> {new['errors']}/{new['requests']}")
+    print(f"{regressions} regression(s) against baseline ({tolerance:.0%} tolerance)")
+    return regressions
+
+
+async def main(args) -> int:
+    urls = {"gateway": args.gateway_url, "users": args.users_url, "products": args.products_url}
+    processes = spawn_services() if args.spawn else []
+    try:
+        await wait_ready(urls, args.ready_timeout)
+        mix = load_mix(args.mix)
+        results = await run_load(mix, urls, args.rate, args.duration, args.max_user_id, args.seed, args.timeout)
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            process.wait()
+
+    print_results(results)
+    report = {
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "rate": args.rate,
+        "duration": args.duration,
+        "mix": os.path.relpath(os.path.abspath(args.mix), ROOT),
+        "max_user_id": args.max_user_id,
+        "results": results,
+    }
+    if args.save:
+        os.makedirs(BASELINES_DIR, exist_ok=True)
+        path = os.path.join(BASELINES_DIR, f"{args.save}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {path}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            return 1 if compare(results, json.load(f), args.tolerance) else 0
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Open-loop load test of the gateway, users and products services")
+    parser.add_argument("--mix", default=os.path.join(ROOT, "benchmarks", "request_mix.jsonl"),
+                        help="JSONL request mix")
+    parser.add_argument("--rate", type=float, default=100, help="mean arrival rate (requests/s)")
+    parser.add_argument("--duration", type=float, default=30, help="seconds of load")
+    parser.add_argument("--max-user-id", type=int, default=3, help="user ids are drawn in [1, max]")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=30, help="client timeout per request")
+    parser.add_argument("--spawn", action="store_true", help="start the three services with uvicorn")
+    parser.add_argument("--ready-timeout", type=float, default=30)
+    parser.add_argument("--gateway-url", default="http://localhost:8003")
+    parser.add_argument("--users-url", default="http://localhost:8002")
+    parser.add_argument("--products-url", default="http://localhost:8000")
+    parser.add_argument("--save", metavar="NAME", help="write benchmarks/baselines/NAME.json")
+    parser.add_argument("--compare", metavar="BASELINE", help="baseline JSON to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args)))
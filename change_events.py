@@ -0,0 +1,116 @@
+import asyncio
+import inspect
+import logging
+import os
+import socket
+import time
+
+from serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Canal Redis (pub/sub) des modifications de produits : un événement par lot
+# d'écritures validé, avec les utilisateurs touchés et leur nouvelle version
+PRODUCT_CHANGES_CHANNEL = os.getenv("PRODUCT_CHANGES_CHANNEL", "product_changes")
+# Attente avant un nouvel abonnement après la perte de la connexion
+CHANGES_RESUBSCRIBE_DELAY = float(os.getenv("CHANGES_RESUBSCRIBE_DELAY", "1"))
+
+
+def instance_id() -> str:
+    # Calculé à chaque appel : un processus fils (fork) a son propre identifiant
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+async def publish_product_changes(client, operation: str, user_ids: list,
+                                  channel: str = PRODUCT_CHANGES_CHANNEL) -> int:
+    # Renvoie le nombre d'abonnés qui ont reçu l'événement. Publié avant
+    # l'incrément des versions du contenu (ContentVersions) : l'événement ne
+    # les contient pas, l'API d'écriture les renvoie.
+    event = {
+        "type": "products_changed",
+        "operation": operation,
+        "user_ids": list(user_ids),
+        "origin": instance_id(),
+        "published_at": time.time(),
+    }
+    return await client.publish(channel, dumps(event))
+
+
+class ChangeSubscriber:
+    # Abonnement aux événements de modification ; handler(événement) peut être
+    # synchrone ou asynchrone. Pub/sub ne garde rien pour un abonné déconnecté :
+    # on_change(abonné) est appelé à chaque (ré)abonnement et à chaque perte de
+    # l'abonnement, pour que l'abonné vide ses caches au lieu de manquer des
+    # invalidations.
+    def __init__(self, client, handler, on_change=None, channel: str = PRODUCT_CHANGES_CHANNEL):
+        self.client = client
+        self.handler = handler
+        self.on_change = on_change
+        self.channel = channel
+        self.subscribed = False
+        self._task = None
+
+        self.received = 0
+        self.errors = 0
+        self.subscriptions = 0
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _set_subscribed(self, subscribed: bool):
+        if subscribed == self.subscribed:
+            return
+        self.subscribed = subscribed
+        if subscribed:
+            self.subscriptions += 1
+            logger.info("Subscribed to '%s'", self.channel)
+        if self.on_change is not None:
+            result = self.on_change(subscribed)
+            if inspect.isawaitable(result):
+                await result
+
+    async def _listen(self):
+        while True:
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                await pubsub.subscribe(self.channel)
+                await self._set_subscribed(True)
+                async for message in pubsub.listen():
+                    await self._dispatch(message["data"])
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Lost subscription to '%s': %s", self.channel, e)
+            finally:
+                await self._set_subscribed(False)
+                await pubsub.close()
+            await asyncio.sleep(CHANGES_RESUBSCRIBE_DELAY)
+
+    async def _dispatch(self, data):
+        self.received += 1
+        try:
+            result = self.handler(loads(data))
+            if inspect.isawaitable(result):
+                await result
+        except Exception as e:
+            # Un événement mal traité ne coupe pas l'abonnement
+            self.errors += 1
+            logger.error("Error handling event from '%s': %s", self.channel, e)
+
+    def metrics(self) -> dict:
+        return {
+            "subscribed": self.subscribed,
+            "received": self.received,
+            "errors": self.errors,
+            "subscriptions": self.subscriptions,
+        }
@@ -0,0 +1,156 @@
+import argparse
+import asyncio
+import json
+import logging
+import sys
+from decimal import Decimal
+
+import asyncpg
+
+from dependencies import PRODUCTS_DATABASE_URL, USERS_DATABASE_URL
+from product_queries import (PAGE_DEFAULT_LIMIT, PRODUCT_COLUMNS, SEARCH_DEFAULT_LIMIT, SELECT_PRODUCTS_BY_USERS,
+                             SELECT_USER_PRODUCT_STATS, SELECT_USERS_PRODUCT_STATS, build_export_query,
+                             build_page_query, build_products_by_ids_query, build_search_query, infix_pattern,
+                             prefix_tsquery, search_terms)
+from product_writes import DELETE_PRODUCTS, LOCK_PRODUCTS, UPDATE_FROM_ARRAYS
+from user_queries import SELECT_USER_BY_ID, SELECT_USERS_BY_IDS
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Au-delà de ce nombre de lignes lues, un Seq Scan sur une requête du chemin
+# chaud signale un index manquant (sur une petite table il reste le bon plan)
+SEQ_SCAN_THRESHOLD = 1000
+
+# Requêtes des services, avec la requête SQL qui fournit leurs paramètres à partir
+# des données existantes. L'export complet (sans user_id) lit toute la table par
+# construction et n'est pas vérifié. Les écritures sont exécutées dans une
+# transaction annulée (voir explain).
+USERS_QUERIES = [
+    ("user by id", SELECT_USER_BY_ID,
+     "SELECT id FROM users ORDER BY id LIMIT 1", lambda row: (row["id"],)),
+    ("users batch", SELECT_USERS_BY_IDS,
+     "SELECT array_agg(id) AS ids FROM (SELECT id FROM users ORDER BY id LIMIT 50) s", lambda row: (row["ids"],)),
+]
+
+# Utilisateur ayant le plus de produits : le cas le plus coûteux
+_BIGGEST_USER = "SELECT user_id FROM products GROUP BY user_id ORDER BY count(*) DESC LIMIT 1"
+
+_SEARCH_WORD = ("SELECT split_part(name, ' ', 1) AS word FROM products "
+                "WHERE length(split_part(name, ' ', 1)) >= 3 ORDER BY id LIMIT 1")
+
+# Produits existants pour les lectures par id et les écritures en lot
+_PRODUCT_IDS = "SELECT array_agg(id) AS ids FROM (SELECT id FROM products ORDER BY id DESC LIMIT 50) s"
+_PRODUCT_UPDATES = ("SELECT array_agg(id) AS ids, array_agg(price) AS prices "
+                    "FROM (SELECT id, price FROM products ORDER BY id DESC LIMIT 50) s")
+_USER_IDS = "SELECT array_agg(user_id) AS ids FROM (SELECT DISTINCT user_id FROM products LIMIT 50) s"
+
+
+def _search_args(row, *prices) -> tuple:
+    return (prefix_tsquery(search_terms(row["word"])), SEARCH_DEFAULT_LIMIT + 1, 0, infix_pattern(row["word"]),
+            *prices)
+
+
+def _update_args(row) -> tuple:
+    # Mise à jour du seul prix, à sa valeur actuelle
+    count = len(row["ids"])
+    return row["ids"], [None] * count, [None] * count, row["prices"], [False] * count, [None] * count
+
+PRODUCTS_QUERIES = [
+    ("products by users", SELECT_PRODUCTS_BY_USERS,
+     _BIGGEST_USER, lambda row: ([row["user_id"]],)),
+    ("products page", build_page_query(list(PRODUCT_COLUMNS)),
+     _BIGGEST_USER, lambda row: (row["user_id"], 0, PAGE_DEFAULT_LIMIT + 1)),
+    ("products export by user", build_export_query(True),
+     _BIGGEST_USER, lambda row: (row["user_id"],)),
+    ("product aggregates", SELECT_USER_PRODUCT_STATS,
+     _BIGGEST_USER, lambda row: (row["user_id"],)),
+    ("product aggregates batch", SELECT_USERS_PRODUCT_STATS,
+     _USER_IDS, lambda row: (row["ids"],)),
+    # Plein texte et trigrammes (index GIN) sur le premier mot d'un nom existant,
+    # sans filtre puis avec chaque filtre de prix
+    ("products search", build_search_query(list(PRODUCT_COLUMNS), True, False, False),
+     _SEARCH_WORD, _search_args),
+    ("products search min price", build_search_query(list(PRODUCT_COLUMNS), True, True, False),
+     _SEARCH_WORD, lambda row: _search_args(row, Decimal("100"))),
+    ("products search max price", build_search_query(list(PRODUCT_COLUMNS), True, False, True),
+     _SEARCH_WORD, lambda row: _search_args(row, Decimal("100"))),
+    ("products search price range", build_search_query(list(PRODUCT_COLUMNS), True, True, True),
+     _SEARCH_WORD, lambda row: _search_args(row, Decimal("100"), Decimal("500"))),
+    # Lignes classées par l'index de recherche en mémoire
+    ("products by ids", build_products_by_ids_query(list(PRODUCT_COLUMNS)),
+     _PRODUCT_IDS, lambda row: (row["ids"],)),
+    # Écritures en lot (product_writes)
+    ("bulk lock", LOCK_PRODUCTS, _PRODUCT_IDS, lambda row: (row["ids"],)),
+    ("bulk update", UPDATE_FROM_ARRAYS, _PRODUCT_UPDATES, _update_args),
+    ("bulk delete", DELETE_PRODUCTS, _PRODUCT_IDS, lambda row: (row["ids"],)),
+]
+
+
+def iter_nodes(node):
+    yield node
+    for child in node.get("Plans", []):
+        yield from iter_nodes(child)
+
+
+def seq_scans(plan: dict, threshold: int) -> list:
+    # Lignes lues par un Seq Scan : lignes renvoyées plus lignes écartées par le
+    # filtre, pour chacune des boucles du nœud
+    problems = []
+    for node in iter_nodes(plan["Plan"]):
+        if node["Node Type"] != "Seq Scan":
+            continue
+        scanned = (node.get("Actual Rows", 0) + node.get("Rows Removed by Filter", 0)) * node.get("Actual Loops", 1)
+        if scanned > threshold:
+            problems.append((node.get("Relation Name"), scanned))
+    return problems
+
+
+async def explain(conn, query: str, args) -> dict:
+    # ANALYZE exécute réellement la requête : on reste dans une transaction annulée
+    tr = conn.transaction()
+    await tr.start()
+    try:
+        result = await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", *args)
+    finally:
+        await tr.rollback()
+    return json.loads(result)[0]
+
+
+async def check_database(dsn: str, queries, threshold: int) -> int:
+    conn = await asyncpg.connect(dsn)
+    failures = 0
+    try:
+        for name, query, params_query, make_args in queries:
+            row = await conn.fetchrow(params_query)
+            if row is None or None in row.values():
+                logger.warning("%s: no data to build parameters, skipped", name)
+                continue
+            plan = await explain(conn, query, make_args(row))
+            nodes = ", ".join(dict.fromkeys(node["Node Type"] for node in iter_nodes(plan["Plan"])))
+            print(f"{name:<28} {plan['Execution Time']:>9.3f} ms  {nodes}")
+            for relation, scanned in seq_scans(plan, threshold):
+                failures += 1
+                print(f"  FAIL: Seq Scan on {relation} read {scanned:.0f} rows (threshold {threshold})")
+    finally:
+        await conn.close()
+    return failures
+
+
+async def main(threshold: int) -> int:
+    failures = await check_database(USERS_DATABASE_URL, USERS_QUERIES, threshold)
+    failures += await check_database(PRODUCTS_DATABASE_URL, PRODUCTS_QUERIES, threshold)
+    if failures:
+        logger.error("%s query plan(s) use a sequential scan above %s rows", failures, threshold)
+    else:
+        logger.info("All query plans use indexes")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fail when a service query plans a large sequential scan")
+    parser.add_argument("--threshold", type=int, default=SEQ_SCAN_THRESHOLD,
+                        help="rows a Seq Scan may read before the check fails")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(main(args.threshold)))
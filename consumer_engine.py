@@ -0,0 +1,212 @@
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+# Configuration du moteur de consommation (surchargeable par variables d'environnement)
+CONSUMER_CONCURRENCY = int(os.getenv("CONSUMER_CONCURRENCY", "16"))
+CONSUMER_MAX_PENDING = int(os.getenv("CONSUMER_MAX_PENDING", "256"))
+CONSUMER_BLOCK_TIMEOUT = int(os.getenv("CONSUMER_BLOCK_TIMEOUT", "1"))
+CONSUMER_DRAIN_TIMEOUT = float(os.getenv("CONSUMER_DRAIN_TIMEOUT", "10"))
+CONSUMER_BATCH_SIZE = int(os.getenv("CONSUMER_BATCH_SIZE", "50"))
+CONSUMER_BATCH_WAIT_MS = float(os.getenv("CONSUMER_BATCH_WAIT_MS", "5"))
+
+# Bornes supérieures des classes de l'histogramme des tailles de lot
+BATCH_SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class BatchStats:
+    # Histogramme des tailles de lot et estimation du temps gagné par rapport
+    # à une requête par message (moyenne mobile des lots d'un seul élément)
+    def __init__(self):
+        self.buckets = {bound: 0 for bound in BATCH_SIZE_BUCKETS}
+        self.overflow = 0
+        self.batches = 0
+        self.messages = 0
+        self.single_query_seconds = None
+        self.saved_seconds = 0.0
+
+    def record_batch(self, size: int, distinct_keys: int):
+        self.batches += 1
+        self.messages += size
+        for bound in BATCH_SIZE_BUCKETS:
+            if size <= bound:
+                self.buckets[bound] += 1
+                break
+        else:
+            self.overflow += 1
+        # Les demandes en double dans un lot ne coûtent aucune requête
+        if self.single_query_seconds is not None:
+            self.saved_seconds += self.single_query_seconds * (size - distinct_keys)
+
+    def record_query(self, keys: int, query_seconds: float):
+        if keys == 1:
+            if self.single_query_seconds is None:
+                self.single_query_seconds = query_seconds
+            else:
+                self.single_query_seconds = 0.9 * self.single_query_seconds + 0.1 * query_seconds
+        elif self.single_query_seconds is not None:
+            self.saved_seconds += max(0.0, self.single_query_seconds * keys - query_seconds)
+
+    def metrics(self) -> dict:
+        histogram = {f"le_{bound}": count for bound, count in self.buckets.items()}
+        histogram["le_inf"] = self.overflow
+        return {
+            "batches": self.batches,
+            "messages": self.messages,
+            "avg_batch_size": self.messages / self.batches if self.batches else 0.0,
+            "batch_size_histogram": histogram,
+            "single_query_ms": (self.single_query_seconds or 0.0) * 1000,
+            "estimated_saved_ms": self.saved_seconds * 1000,
+        }
+
+
+class ConsumerEngine:
+    # Une tâche lit la file Redis et alimente un tampon borné ; plusieurs
+    # workers traitent les messages en parallèle. Quand le tampon est plein,
+    # la lecture s'arrête (backpressure) au lieu d'accumuler des messages.
+    # Chaque worker regroupe jusqu'à batch_size messages (ou attend au plus
+    # batch_wait_ms) et appelle le handler avec la liste du lot, puis acquitte
+    # le lot auprès de la file (ListQueue ou StreamQueue, voir work_queue).
+    def __init__(self, queue, handler, concurrency: int = CONSUMER_CONCURRENCY,
+                 max_pending: int = CONSUMER_MAX_PENDING, block_timeout: int = CONSUMER_BLOCK_TIMEOUT,
+                 drain_timeout: float = CONSUMER_DRAIN_TIMEOUT, batch_size: int = CONSUMER_BATCH_SIZE,
+                 batch_wait_ms: float = CONSUMER_BATCH_WAIT_MS):
+        self.queue = queue
+        self.queue_name = queue.name
+        self.handler = handler
+        self.concurrency = concurrency
+        self.block_timeout = block_timeout
+        self.drain_timeout = drain_timeout
+        self.batch_size = max(1, batch_size)
+        self.batch_wait = batch_wait_ms / 1000
+
+        self._buffer = asyncio.Queue(maxsize=max_pending)
+        self._stopping = asyncio.Event()
+        self._fetcher = None
+        self._workers = []
+
+        self.in_flight = 0
+        self.processed = 0
+        self.failed = 0
+
+    @property
+    def running(self) -> bool:
+        return self._fetcher is not None
+
+    async def run(self):
+        self._stopping.clear()
+        await self.queue.setup()
+        self._fetcher = asyncio.create_task(self._fetch_loop())
+        self._workers = [asyncio.create_task(self._worker_loop()) for _ in range(self.concurrency)]
+        logger.info("Consumer started on '%s' with %s workers", self.queue_name, self.concurrency)
+        await asyncio.gather(self._fetcher, *self._workers, return_exceptions=True)
+        logger.info("Consumer on '%s' stopped", self.queue_name)
+
+    async def stop(self):
+        # Arrêt gracieux : plus de nouvelles lectures, on vide le tampon puis
+        # on rend à la file ce qui n'a pas pu être traité à temps
+        if self._fetcher is None:
+            return
+        self._stopping.set()
+        await asyncio.gather(self._fetcher, return_exceptions=True)
+        try:
+            await asyncio.wait_for(self._buffer.join(), timeout=self.drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Drain timeout after %ss, requeueing %s messages", self.drain_timeout, self._buffer.qsize())
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        await self._requeue_leftovers()
+        self._fetcher = None
+        self._workers = []
+
+    async def _requeue_leftovers(self):
+        leftovers = []
+        while not self._buffer.empty():
+            leftovers.append(self._buffer.get_nowait())
+            self._buffer.task_done()
+        if leftovers:
+            try:
+                await self.queue.release(leftovers)
+            except Exception as e:
+                logger.error("Could not requeue %s messages: %s", len(leftovers), e)
+
+    async def _fetch_loop(self):
+        while not self._stopping.is_set():
+            try:
+                # Couples (identifiant, message) à acquitter après traitement
+                for entry in await self.queue.read(self.batch_size, self.block_timeout):
+                    # Bloque si le tampon est plein : c'est la backpressure
+                    await self._buffer.put(entry)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Error reading from '%s': %s", self.queue_name, e)
+                await asyncio.sleep(1)
+
+    async def _next_batch(self):
+        batch = [await self._buffer.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._buffer.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self._buffer.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _worker_loop(self):
+        while True:
+            batch = await self._next_batch()
+            self.in_flight += len(batch)
+            try:
+                await self.handler([message for _, message in batch])
+                self.processed += len(batch)
+            except asyncio.CancelledError:
+                # Non acquitté : un autre consommateur reprendra le lot
+                raise
+            except Exception as e:
+                self.failed += len(batch)
+                logger.error("Error handling batch of %s messages from '%s': %s", len(batch), self.queue_name, e)
+            finally:
+                self.in_flight -= len(batch)
+            # Acquitté même en cas d'erreur : le handler répond déjà lui-même aux
+            # échecs attendus, et un message qui fait échouer le lot serait
+            # sinon repris indéfiniment
+            await self._ack(batch)
+            for _ in batch:
+                self._buffer.task_done()
+
+    async def _ack(self, batch: list):
+        entry_ids = [entry_id for entry_id, _ in batch if entry_id is not None]
+        if not entry_ids:
+            return
+        try:
+            await self.queue.ack(entry_ids)
+        except Exception as e:
+            # Non acquittées : elles seront reprises et traitées une seconde fois
+            logger.error("Could not acknowledge %s messages on '%s': %s", len(entry_ids), self.queue_name, e)
+
+    def metrics(self) -> dict:
+        return {
+            "queue": self.queue_name,
+            "concurrency": self.concurrency,
+            "batch_size": self.batch_size,
+            "batch_wait_ms": self.batch_wait * 1000,
+            "buffered": self._buffer.qsize(),
+            "max_pending": self._buffer.maxsize,
+            "in_flight": self.in_flight,
+            "processed": self.processed,
+            "failed": self.failed,
+            **self.queue.metrics(),
+        }
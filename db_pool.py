@@ -0,0 +1,232 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import asyncpg
+
+logger = logging.getLogger(__name__)
+
+# Configuration du pool (surchargeable par variables d'environnement)
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "20"))
+POOL_ACQUIRE_TIMEOUT = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "2.0"))
+POOL_STATEMENT_CACHE_SIZE = int(os.getenv("DB_POOL_STATEMENT_CACHE_SIZE", "256"))
+POOL_MAX_QUERIES = int(os.getenv("DB_POOL_MAX_QUERIES", "50000"))
+POOL_MAX_INACTIVE_LIFETIME = float(os.getenv("DB_POOL_MAX_INACTIVE_LIFETIME", "300"))
+POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+# Délai maximal d'ouverture d'une connexion, et intervalle entre deux
+# tentatives de création du pool quand PostgreSQL n'est pas encore joignable
+POOL_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+POOL_RETRY_INTERVAL = float(os.getenv("DB_RETRY_INTERVAL", "2"))
+
+# Nombre de mesures conservées pour calculer les percentiles d'acquisition
+LATENCY_WINDOW = 1024
+
+
+class PoolTimeoutError(Exception):
+    pass
+
+
+class DatabasePool:
+    def __init__(self, dsn: str, min_size: int = POOL_MIN_SIZE, max_size: int = POOL_MAX_SIZE,
+                 acquire_timeout: float = POOL_ACQUIRE_TIMEOUT,
+                 statement_cache_size: int = POOL_STATEMENT_CACHE_SIZE,
+                 max_queries: int = POOL_MAX_QUERIES,
+                 max_inactive_lifetime: float = POOL_MAX_INACTIVE_LIFETIME,
+                 health_check_interval: float = POOL_HEALTH_CHECK_INTERVAL,
+                 connect_timeout: float = POOL_CONNECT_TIMEOUT):
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.acquire_timeout = acquire_timeout
+        self.statement_cache_size = statement_cache_size
+        self.max_queries = max_queries
+        self.max_inactive_lifetime = max_inactive_lifetime
+        self.health_check_interval = health_check_interval
+        self.connect_timeout = connect_timeout
+
+        self._pool = None
+        self._health_task = None
+        self._start_task = None
+        self._started = asyncio.Event()
+        self.last_error = None
+
+        # Compteurs de saturation
+        self.in_use = 0
+        self.waiting = 0
+        self.acquire_count = 0
+        self.acquire_timeouts = 0
+        self.health_check_failures = 0
+        self._latencies = deque(maxlen=LATENCY_WINDOW)
+        self._latency_total = 0.0
+        self._latency_max = 0.0
+
+    async def start(self):
+        if self._pool is not None:
+            return
+        try:
+            self._pool = await asyncpg.create_pool(
+                self.dsn,
+                min_size=self.min_size,
+                max_size=self.max_size,
+                max_queries=self.max_queries,
+                max_inactive_connection_lifetime=self.max_inactive_lifetime,
+                statement_cache_size=self.statement_cache_size,
+                timeout=self.connect_timeout,
+            )
+        except Exception as e:
+            self.last_error = str(e) or type(e).__name__
+            logger.error("Could not create database pool: %s", e)
+            raise
+        self.last_error = None
+        self._started.set()
+        logger.info("Database pool created (min=%s, max=%s)", self.min_size, self.max_size)
+        if self.health_check_interval > 0:
+            self._health_task = asyncio.create_task(self._health_check_loop())
+
+    @property
+    def ready(self) -> bool:
+        return self._pool is not None
+
+    async def wait_ready(self):
+        # Attend la fin du démarrage (start ou start_in_background), sans délai
+        await self._started.wait()
+
+    def start_in_background(self, retry_interval: float = POOL_RETRY_INTERVAL):
+        # Démarrage sans bloquer le service : nouvelles tentatives jusqu'à ce
+        # que PostgreSQL réponde (les requêtes échouent en attendant et
+        # /health/ready répond 503)
+        if self._start_task is None and self._pool is None:
+            self._start_task = asyncio.create_task(self._start_loop(retry_interval))
+        return self._start_task
+
+    async def _start_loop(self, retry_interval: float):
+        while self._pool is None:
+            try:
+                await self.start()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                await asyncio.sleep(retry_interval)
+        self._start_task = None
+
+    async def close(self):
+        if self._start_task:
+            self._start_task.cancel()
+            try:
+                await self._start_task
+            except asyncio.CancelledError:
+                pass
+            self._start_task = None
+        if self._health_task:
+            self._health_task.cancel()
+            try:
+                await self._health_task
+            except asyncio.CancelledError:
+                pass
+            self._health_task = None
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+            self._started.clear()
+            logger.info("Database pool closed")
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self._pool is None and self._start_task is not None:
+            # Démarrage en arrière-plan en cours : attendre le pool comme une connexion
+            try:
+                await asyncio.wait_for(asyncio.shield(self._started.wait()), self.acquire_timeout)
+            except asyncio.TimeoutError:
+                self.acquire_timeouts += 1
+                raise PoolTimeoutError(f"Database not available after {self.acquire_timeout}s: {self.last_error}")
+        if self._pool is None:
+            raise RuntimeError("Database pool is not started")
+
+        self.waiting += 1
+        start = time.perf_counter()
+        try:
+            conn = await self._pool.acquire(timeout=self.acquire_timeout)
+        except asyncio.TimeoutError:
+            self.acquire_timeouts += 1
+            raise PoolTimeoutError(f"Timed out after {self.acquire_timeout}s waiting for a database connection")
+        finally:
+            self.waiting -= 1
+        self._record_latency(time.perf_counter() - start)
+
+        self.in_use += 1
+        try:
+            yield conn
+        finally:
+            self.in_use -= 1
+            await self._pool.release(conn)
+
+    def _record_latency(self, latency: float):
+        self.acquire_count += 1
+        self._latencies.append(latency)
+        self._latency_total += latency
+        if latency > self._latency_max:
+            self._latency_max = latency
+
+    async def _health_check_loop(self):
+        # Vérifie périodiquement une connexion et recycle le pool en cas d'échec.
+        # La sonde passe directement par asyncpg : elle ne doit pas fausser les
+        # compteurs d'acquisition ni les percentiles de latence.
+        while True:
+            await asyncio.sleep(self.health_check_interval)
+            if self._pool is None:
+                continue
+            try:
+                conn = await self._pool.acquire(timeout=self.acquire_timeout)
+            except asyncio.CancelledError:
+                raise
+            except asyncio.TimeoutError:
+                # Pool saturé : les connexions sont occupées, pas défaillantes.
+                # Les recycler en pleine charge provoquerait une vague de reconnexions.
+                logger.debug("Database pool saturated, skipping health check")
+                continue
+            except Exception as e:
+                self.health_check_failures += 1
+                logger.warning("Database health check could not get a connection: %s", e)
+                continue
+            try:
+                await conn.fetchval("SELECT 1", timeout=self.acquire_timeout)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.health_check_failures += 1
+                logger.warning("Database health check failed, recycling connections: %s", e)
+                await self._pool.expire_connections()
+            finally:
+                await self._pool.release(conn)
+
+    def metrics(self) -> dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(p):
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        size = self._pool.get_size() if self._pool is not None else 0
+        idle = self._pool.get_idle_size() if self._pool is not None else 0
+        return {
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            "size": size,
+            "idle": idle,
+            "in_use": self.in_use,
+            "waiting": self.waiting,
+            "acquire_count": self.acquire_count,
+            "acquire_timeouts": self.acquire_timeouts,
+            "health_check_failures": self.health_check_failures,
+            "acquire_latency_ms": {
+                "avg": (self._latency_total / self.acquire_count * 1000) if self.acquire_count else 0.0,
+                "p50": percentile(0.50) * 1000,
+                "p99": percentile(0.99) * 1000,
+                "max": self._latency_max * 1000,
+            },
+        }
@@ -1,120 +1,540 @@
-from fastapi import FastAPI, HTTPException
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, Response, StreamingResponse
+from starlette.background import BackgroundTask
+from pydantic import BaseModel
+from typing import List, Optional
 import httpx
+import asyncio
 import logging
-import redis
-import subprocess
+import random
+import redis.asyncio as aioredis
 import os
-import time
+from contextlib import asynccontextmanager
+from decimal import Decimal
 
-# Configuration du logging
-logging.basicConfig(level=logging.INFO)
+from dependencies import (REDIS_HOST, REDIS_PORT, RedisMonitor, check_redis, readiness_response,
+                          spawn_redis_server)
+from http_cache import (ContentVersions, ResponseCache, content_etag, etag_matches, http_date, not_modified_since,
+                        versioned_etag)
+from logging_setup import RequestLogContextMiddleware, setup_logging
+from resilience import (AdmissionControlMiddleware, AdmissionController, CircuitBreaker, CircuitOpenError,
+                        deadline_headers, publish_metrics, remaining_time)
+from metrics import instrument_app, metrics_response, set_gauges, span, trace_headers, traced
+from serialization import dumps
+
+# Configuration du logging (JSON via un thread d'écriture, voir logging_setup)
+setup_logging("gateway")
 logger = logging.getLogger(__name__)
 
-app = FastAPI()
+# Versions du contenu (incrémentées par products_service à chaque invalidation)
+# et cache des réponses de /api/users/{id} : un client qui renvoie l'ETag reçu
+# obtient un 304 sans appel aux services en aval. Délai court : Redis lent ou
+# absent ne doit pas ralentir les requêtes, qui passent alors sans cache.
+REDIS_VERSION_TIMEOUT = float(os.getenv("GATEWAY_REDIS_VERSION_TIMEOUT", "0.25"))
+redis_client = aioredis.Redis(host=REDIS_HOST, port=REDIS_PORT, socket_timeout=REDIS_VERSION_TIMEOUT,
+                              socket_connect_timeout=REDIS_VERSION_TIMEOUT)
+content_versions = ContentVersions(redis_client)
+response_cache = ResponseCache()
+USE_REDIS = False
 
-# Démarrer Redis s'il n'est pas déjà en cours d'exécution
-def ensure_redis_running():
-    try:
-        # Vérifier si Redis est déjà en cours d'exécution
-        redis_client = redis.Redis(host='localhost', port=6380)
-        redis_client.ping()
-        logger.info("Redis is already running")
-        return True
-    except:
-        logger.info("Redis is not running, starting it...")
-        try:
-            # Démarrer Redis en arrière-plan avec le fichier de configuration
-            redis_path = r"C:\Program Files\Redis\redis-server.exe"
-            config_path = os.path.join(os.getcwd(), "redis.windows.conf")
-            
-            if os.path.exists(redis_path):
-                subprocess.Popen([redis_path, config_path], 
-                                stdout=subprocess.DEVNULL, 
-                                stderr=subprocess.DEVNULL)
-                # Attendre que Redis démarre
-                time.sleep(2)
-                return True
-            else:
-                logger.error(f"Redis executable not found at {redis_path}")
-                return False
-        except Exception as e:
-            logger.error(f"Failed to start Redis: {str(e)}")
-            return False
-
-# S'assurer que Redis est en cours d'exécution
-ensure_redis_running()
-
-# Configuration Redis
-REDIS_HOST = 'localhost'
-REDIS_PORT = 6380
-try:
-    redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT)
-    redis_client.ping()  # Test de connexion
-    logger.info("Connected to Redis successfully")
-    USE_REDIS = True
-except Exception as e:
-    logger.warning(f"Could not connect to Redis: {str(e)}. Using fallback mode.")
-    USE_REDIS = False
+def set_redis_available(available: bool):
+    # Appelé par redis_monitor à chaque changement d'état ; sans Redis, pas de
+    # versions ni de 304 sans appel en aval
+    global USE_REDIS
+    USE_REDIS = available
+    content_versions.enable(available)
+
+redis_monitor = RedisMonitor(redis_client, set_redis_available)
 
 # Configuration des services
 USERS_SERVICE_URL = "http://localhost:8002"
 PRODUCTS_SERVICE_URL = "http://localhost:8000"
 
+# Configuration du client HTTP partagé vers les services en aval
+HTTP_MAX_CONNECTIONS = int(os.getenv("GATEWAY_HTTP_MAX_CONNECTIONS", "200"))
+HTTP_MAX_KEEPALIVE = int(os.getenv("GATEWAY_HTTP_MAX_KEEPALIVE", "50"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("GATEWAY_HTTP_KEEPALIVE_EXPIRY", "30"))
+# HTTP/2 nécessite le paquet h2 et un service en aval qui le parle (uvicorn ne le fait pas)
+HTTP2_ENABLED = os.getenv("GATEWAY_HTTP2", "0") == "1"
+
+# Délais par service en aval (connexion courte, lecture selon le service)
+UPSTREAM_TIMEOUTS = {
+    "users": httpx.Timeout(float(os.getenv("USERS_SERVICE_TIMEOUT", "10")), connect=2.0),
+    "products": httpx.Timeout(float(os.getenv("PRODUCTS_SERVICE_TIMEOUT", "5")), connect=2.0),
+    # Export en flux : pas de durée totale, seulement un délai maximal entre deux morceaux
+    "export": httpx.Timeout(float(os.getenv("EXPORT_READ_TIMEOUT", "60")), connect=2.0),
+}
+
+# Nouvelles tentatives (GET uniquement) avec backoff exponentiel et jitter complet
+UPSTREAM_RETRIES = int(os.getenv("GATEWAY_UPSTREAM_RETRIES", "2"))
+RETRY_BACKOFF_BASE = float(os.getenv("GATEWAY_RETRY_BACKOFF_BASE", "0.05"))
+RETRY_BACKOFF_MAX = float(os.getenv("GATEWAY_RETRY_BACKOFF_MAX", "1.0"))
+RETRYABLE_STATUS_CODES = {502, 503, 504}
+
+# Nombre maximal d'identifiants acceptés par l'endpoint groupé
+BATCH_MAX_IDS = int(os.getenv("BATCH_MAX_IDS", "1000"))
+
+# Mode fan-out de /api/users/{id} : utilisateur (users_service) et produits
+# (products_service) demandés en parallèle au lieu de passer par la file Redis.
+# Activable globalement ou par requête (?fanout=true). Chaque branche a son
+# propre budget, nouvelles tentatives comprises ; au-delà, la réponse est
+# renvoyée sans les produits et marquée "partial".
+GATEWAY_FANOUT = os.getenv("GATEWAY_FANOUT", "0") == "1"
+FANOUT_USERS_TIMEOUT = float(os.getenv("GATEWAY_FANOUT_USERS_TIMEOUT", "10"))
+FANOUT_PRODUCTS_TIMEOUT = float(os.getenv("GATEWAY_FANOUT_PRODUCTS_TIMEOUT", "2"))
+
+# Budget total d'une requête reçue par la passerelle ; l'échéance qui en découle
+# est transmise aux services en aval (X-Request-Deadline) qui abandonnent le
+# travail devenu inutile
+GATEWAY_REQUEST_TIMEOUT = float(os.getenv("GATEWAY_REQUEST_TIMEOUT", "15"))
+
+# Un disjoncteur par service en aval : après plusieurs échecs consécutifs, les
+# appels échouent immédiatement (503) au lieu d'attendre chacun leur délai
+breakers = {"users": CircuitBreaker("users"), "products": CircuitBreaker("products")}
+UPSTREAM_BREAKERS = {"users": breakers["users"], "products": breakers["products"], "export": breakers["products"]}
+
+# Requêtes simultanées bornées par route (503 + Retry-After au-delà)
+admission = AdmissionController(default_timeout=GATEWAY_REQUEST_TIMEOUT)
+
+http_client = None
+
+def create_http_client() -> httpx.AsyncClient:
+    http2 = HTTP2_ENABLED
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("GATEWAY_HTTP2 is set but the h2 package is missing, using HTTP/1.1")
+            http2 = False
+    limits = httpx.Limits(max_connections=HTTP_MAX_CONNECTIONS,
+                          max_keepalive_connections=HTTP_MAX_KEEPALIVE,
+                          keepalive_expiry=HTTP_KEEPALIVE_EXPIRY)
+    return httpx.AsyncClient(limits=limits, http2=http2, timeout=UPSTREAM_TIMEOUTS["users"])
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Un seul client HTTP pour toute la durée de vie du service (connexions réutilisées)
+    global http_client
+    http_client = create_http_client()
+    # Contrôle borné par REDIS_CONNECT_TIMEOUT ; redis-server n'est lancé que
+    # si REDIS_SERVER_PATH est défini, et détecté ensuite par redis_monitor
+    if not await redis_monitor.start():
+        await spawn_redis_server()
+    yield
+    await redis_monitor.stop()
+    await http_client.aclose()
+    http_client = None
+    await redis_client.close()
+
+app = FastAPI(lifespan=lifespan)
+instrument_app(app, "gateway")
+app.add_middleware(RequestLogContextMiddleware)
+app.add_middleware(AdmissionControlMiddleware, controller=admission)
+
+def is_shed(response: httpx.Response) -> bool:
+    return response.status_code == 503 and "retry-after" in response.headers
+
+def retry_after_headers(response: httpx.Response):
+    # Retry-After du service en aval, relayé au client
+    retry_after = response.headers.get("retry-after")
+    return {"Retry-After": retry_after} if retry_after else None
+
+async def get_with_retry(url: str, upstream: str, **kwargs) -> httpx.Response:
+    return await request_with_retry("GET", url, upstream, **kwargs)
+
+def upstream_timeout(upstream: str) -> httpx.Timeout:
+    # Délai de l'appel borné par le temps restant avant l'échéance de la requête
+    timeout = UPSTREAM_TIMEOUTS[upstream]
+    remaining = remaining_time(timeout.read)
+    if remaining >= timeout.read:
+        return timeout
+    return httpx.Timeout(remaining, connect=min(timeout.connect, remaining))
+
+async def request_with_retry(method: str, url: str, upstream: str, **kwargs) -> httpx.Response:
+    # À n'utiliser que pour des appels idempotents (GET ou lectures groupées en POST)
+    breaker = UPSTREAM_BREAKERS[upstream]
+    for attempt in range(UPSTREAM_RETRIES + 1):
+        # Disjoncteur ouvert ou échéance dépassée : on abandonne sans appeler
+        breaker.check()
+        timeout = upstream_timeout(upstream)
+        try:
+            # Un span par tentative, propagé au service en aval par l'en-tête traceparent
+            with span(f"upstream_{upstream}"):
+                response = await http_client.request(method, url, timeout=timeout,
+                                                     headers={**trace_headers(), **deadline_headers()}, **kwargs)
+            # Délestage (503 + Retry-After) : le service répond, ce n'est pas une
+            # panne pour le disjoncteur, et le relancer aussitôt annulerait le délestage
+            if is_shed(response):
+                return response
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                breaker.record_failure()
+            else:
+                breaker.record_success()
+            if response.status_code not in RETRYABLE_STATUS_CODES or attempt == UPSTREAM_RETRIES:
+                return response
+            logger.warning("%s service returned %s, retrying (%s/%s)",
+                           upstream, response.status_code, attempt + 1, UPSTREAM_RETRIES)
+        except (httpx.ConnectError, httpx.TimeoutException) as e:
+            breaker.record_failure()
+            if attempt == UPSTREAM_RETRIES:
+                raise
+            logger.warning("%s service request failed (%s), retrying (%s/%s)",
+                           upstream, type(e).__name__, attempt + 1, UPSTREAM_RETRIES)
+        await asyncio.sleep(random.uniform(0, min(RETRY_BACKOFF_MAX, RETRY_BACKOFF_BASE * 2 ** attempt)))
+
 @app.get("/api/health")
 async def health_check():
     return {"status": "ok", "message": "Gateway service is running"}
 
+@app.get("/health/live")
+async def liveness():
+    return {"status": "alive"}
+
+@app.get("/health/ready")
+async def readiness():
+    # Les services en aval ont leurs propres sondes : seul l'état des
+    # disjoncteurs est rapporté ici
+    checks = {
+        "http_client": {"ok": http_client is not None},
+        "redis": await check_redis(redis_client),
+        "upstreams": {"ok": all(b.state == "closed" for b in breakers.values()),
+                      "breakers": {name: b.state for name, b in breakers.items()}},
+    }
+    return readiness_response(checks, required=("http_client",))
+
+@app.get("/metrics")
+async def prometheus_metrics():
+    publish_metrics(admission, breakers.values())
+    set_gauges("gateway_cache", response_cache.metrics())
+    set_gauges("content_versions", content_versions.metrics())
+    return metrics_response()
+
+@app.get("/metrics/cache")
+async def cache_metrics():
+    return {**response_cache.metrics(), "versions": content_versions.metrics()}
+
 @app.get("/api/users/{user_id}")
-async def get_user_data(user_id: int):
-    logger.info(f"Fetching data for user ID: {user_id}")
+async def get_user_data(user_id: int, request: Request, limit: Optional[int] = None, cursor: Optional[int] = None,
+                        fields: Optional[str] = None, fanout: Optional[bool] = None,
+                        summary: bool = False):
+    # Options de pagination et de projection transmises telles quelles au service users
+    params = {k: v for k, v in (("limit", limit), ("cursor", cursor), ("fields", fields)) if v is not None}
+    if_none_match = request.headers.get("if-none-match")
+
+    current = await content_versions.get(user_id)
+    if current is None:
+        # Pas de version connue : ETag calculé sur le contenu, le 304 économise
+        # seulement la bande passante vers le client
+        result = await load_user_view(user_id, params, fanout, summary)
+        body = dumps(result)
+        if result.get("partial"):
+            return Response(body, media_type="application/json")
+        etag = content_etag(body)
+        if etag_matches(if_none_match, etag):
+            response_cache.record_not_modified(len(body))
+            return Response(status_code=304, headers={"ETag": etag})
+        return Response(body, media_type="application/json", headers={"ETag": etag})
+
+    version, modified = current
+    # Les agrégats font partie de la variante : ETag et entrée de cache distincts
+    variant_params = {**params, "summary": "true"} if summary else params
+    variant = "&".join(f"{k}={v}" for k, v in sorted(variant_params.items()))
+    if modified is not None:
+        headers = validator_headers(user_id, version, modified, variant)
+        # If-Modified-Since n'est pris en compte qu'en l'absence d'If-None-Match
+        if (etag_matches(if_none_match, headers["ETag"]) if if_none_match
+                else not_modified_since(request.headers.get("if-modified-since"), modified)):
+            response_cache.record_not_modified(response_cache.size_of((user_id, variant), current))
+            return Response(status_code=304, headers=headers)
+        body = response_cache.get((user_id, variant), current)
+        if body is not None:
+            return Response(body, media_type="application/json", headers=headers)
+
+    result = await load_user_view(user_id, params, fanout, summary)
+    body = dumps(result)
+    # Une réponse partielle (produits ou agrégats indisponibles) n'est ni mise en cache
+    # ni validable : le client doit la redemander en entier
+    if result.get("partial"):
+        return Response(body, media_type="application/json")
+    if modified is None:
+        # Première réponse complète : création de la version. Si une écriture l'a
+        # incrémentée pendant le chargement, le corps lu peut lui être antérieur.
+        started = await content_versions.start(user_id)
+        if started is None or started[0] != version:
+            return Response(body, media_type="application/json")
+        current = version, modified = started
+        headers = validator_headers(user_id, version, modified, variant)
+    response_cache.put((user_id, variant), current, body)
+    return Response(body, media_type="application/json", headers=headers)
+
+def validator_headers(user_id: int, version: int, modified: float, variant: str) -> dict:
+    return {"ETag": versioned_etag(user_id, version, modified, variant), "Last-Modified": http_date(modified),
+            "Cache-Control": "private, no-cache"}
+
+async def load_user_view(user_id: int, params: dict, fanout: Optional[bool], summary: bool) -> dict:
+    # Vue utilisateur, avec si demandé (?summary=true) les agrégats de ses
+    # produits, demandés en parallèle à products_service
+    if not summary:
+        return await load_user_data(user_id, params, fanout)
+    result, aggregates = await asyncio.gather(load_user_data(user_id, params, fanout),
+                                              fetch_product_aggregates(user_id), return_exceptions=True)
+    if isinstance(result, BaseException):
+        raise result
+    if isinstance(aggregates, BaseException):
+        logger.warning("Product aggregates unavailable for user %s, returning partial result: %s",
+                       user_id, getattr(aggregates, "detail", repr(aggregates)))
+        result["summary"] = None
+        result["summary_error"] = "Products service unavailable"
+        result["partial"] = True
+    else:
+        result["summary"] = aggregates
+    return result
+
+async def fetch_product_aggregates(user_id: int) -> dict:
+    response = await asyncio.wait_for(
+        get_with_retry(f"{PRODUCTS_SERVICE_URL}/products/{user_id}/aggregates", "products"),
+        FANOUT_PRODUCTS_TIMEOUT)
+    if response.status_code != 200:
+        raise upstream_error(response)
+    return response.json()
+
+@traced("get_user_data")
+async def load_user_data(user_id: int, params: dict, fanout: Optional[bool] = None) -> dict:
+    logger.info("Fetching data for user ID: %s", user_id)
+    if GATEWAY_FANOUT if fanout is None else fanout:
+        return await get_user_data_fanout(user_id, params)
     try:
-        async with httpx.AsyncClient() as client:
-            # Récupérer les données utilisateur
-            logger.info(f"Requesting user data from {USERS_SERVICE_URL}/users/{user_id}")
-            try:
-                user_response = await client.get(f"{USERS_SERVICE_URL}/users/{user_id}", timeout=10.0)
-                logger.info(f"User service response status: {user_response.status_code}")
-                
-                if user_response.status_code != 200:
-                    error_detail = "Unknown error"
-                    try:
-                        error_data = user_response.json()
-                        error_detail = error_data.get("detail", "Unknown error")
-                    except:
-                        error_detail = user_response.text
-                    
-                    logger.error(f"Error from users service: {user_response.status_code} - {error_detail}")
-                    raise HTTPException(status_code=user_response.status_code, detail=error_detail)
+        # Récupérer les données utilisateur
+        logger.debug("Requesting user data from %s/users/%s", USERS_SERVICE_URL, user_id)
+        try:
+            user_response = await get_with_retry(f"{USERS_SERVICE_URL}/users/{user_id}", "users", params=params)
+            logger.debug("User service response status: %s", user_response.status_code)
+            
+            if user_response.status_code != 200:
+                error_detail = "Unknown error"
+                try:
+                    error_data = user_response.json()
+                    error_detail = error_data.get("detail", "Unknown error")
+                except:
+                    error_detail = user_response.text
                 
-                user_data = user_response.json()
-                logger.info(f"User data received: {user_data}")
+                logger.error("Error from users service: %s - %s", user_response.status_code, error_detail)
+                raise HTTPException(status_code=user_response.status_code, detail=error_detail,
+                                    headers=retry_after_headers(user_response))
+            
+            user_data = user_response.json()
+            logger.debug("User data received: %s", user_data)
 
-                # Extraire les produits de la réponse du service users
-                products = user_data.get("products", [])
-                
-                # Créer la réponse finale
-                return {
-                    "user": {
-                        "id": user_data["id"],
-                        "name": user_data["name"],
-                        "email": user_data.get("email", "")
-                    },
-                    "products": products
-                }
-            except httpx.ConnectError as e:
-                logger.error(f"Could not connect to users service at {USERS_SERVICE_URL}: {str(e)}")
-                raise HTTPException(status_code=503, detail="Users service unavailable")
-            except httpx.TimeoutException:
-                logger.error(f"Timeout while connecting to users service at {USERS_SERVICE_URL}")
-                raise HTTPException(status_code=504, detail="Users service timeout")
+            # Extraire les produits de la réponse du service users
+            products = user_data.get("products", [])
             
+            # Créer la réponse finale
+            result = {
+                "user": {
+                    "id": user_data["id"],
+                    "name": user_data["name"],
+                    "email": user_data.get("email", "")
+                },
+                "products": products
+            }
+            if "next_cursor" in user_data:
+                result["next_cursor"] = user_data["next_cursor"]
+            # Produits indisponibles côté users_service : réponse dégradée, à ne pas mettre en cache
+            if user_data.get("partial"):
+                result["partial"] = True
+                result["products_error"] = user_data.get("products_error")
+            return result
+        except httpx.ConnectError as e:
+            logger.error("Could not connect to users service at %s: %s", USERS_SERVICE_URL, e)
+            raise HTTPException(status_code=503, detail="Users service unavailable")
+        except httpx.TimeoutException:
+            logger.error("Timeout while connecting to users service at %s", USERS_SERVICE_URL)
+            raise HTTPException(status_code=504, detail="Users service timeout")
+        except (CircuitOpenError, asyncio.TimeoutError) as e:
+            raise upstream_exception(e, "Users")
+        
     except HTTPException:
         raise
     except Exception as e:
-        logger.error(f"Error fetching user data: {str(e)}")
+        logger.error("Error fetching user data: %s", e)
         raise HTTPException(status_code=500, detail=str(e))
 
+def upstream_exception(error: BaseException, service: str) -> HTTPException:
+    # Traduit l'échec d'un appel en aval en réponse HTTP de la passerelle
+    if isinstance(error, HTTPException):
+        return error
+    if isinstance(error, CircuitOpenError):
+        return HTTPException(status_code=503, detail=f"{service} service unavailable",
+                             headers={"Retry-After": str(max(1, round(error.retry_after)))})
+    if isinstance(error, (httpx.TimeoutException, asyncio.TimeoutError)):
+        return HTTPException(status_code=504, detail=f"{service} service timeout")
+    if isinstance(error, httpx.HTTPError):
+        return HTTPException(status_code=503, detail=f"{service} service unavailable")
+    return HTTPException(status_code=500, detail=str(error))
+
+def upstream_error(response: httpx.Response) -> HTTPException:
+    try:
+        error_detail = response.json().get("detail", "Unknown error")
+    except:
+        error_detail = response.text
+    return HTTPException(status_code=response.status_code, detail=error_detail, headers=retry_after_headers(response))
+
+async def fetch_user_only(user_id: int) -> dict:
+    response = await asyncio.wait_for(
+        get_with_retry(f"{USERS_SERVICE_URL}/users/{user_id}", "users", params={"include_products": "false"}),
+        FANOUT_USERS_TIMEOUT)
+    if response.status_code != 200:
+        raise upstream_error(response)
+    return response.json()
+
+async def fetch_products_only(user_id: int, params: dict):
+    # Renvoie (produits, curseur suivant) ; le curseur vient de l'en-tête X-Next-Cursor
+    response = await asyncio.wait_for(
+        get_with_retry(f"{PRODUCTS_SERVICE_URL}/products/{user_id}", "products", params=params),
+        FANOUT_PRODUCTS_TIMEOUT)
+    if response.status_code != 200:
+        raise upstream_error(response)
+    next_cursor = response.headers.get("X-Next-Cursor")
+    return response.json(), int(next_cursor) if next_cursor is not None else None
+
+@traced("get_user_data_fanout")
+async def get_user_data_fanout(user_id: int, params: dict):
+    # Les deux appels partent ensemble : la latence est celle du plus lent,
+    # bornée côté produits par FANOUT_PRODUCTS_TIMEOUT
+    user_result, products_result = await asyncio.gather(
+        fetch_user_only(user_id),
+        fetch_products_only(user_id, params),
+        return_exceptions=True,
+    )
+
+    if isinstance(user_result, BaseException):
+        logger.error("Error fetching user %s: %s", user_id, getattr(user_result, "detail", repr(user_result)))
+        raise upstream_exception(user_result, "Users")
+
+    result = {
+        "user": {"id": user_result["id"], "name": user_result["name"], "email": user_result.get("email", "")},
+        "products": [],
+    }
+    if isinstance(products_result, BaseException):
+        # Produits lents ou indisponibles : l'utilisateur est renvoyé quand même
+        logger.warning("Products unavailable for user %s, returning partial result: %s",
+                       user_id, getattr(products_result, "detail", repr(products_result)))
+        result["partial"] = True
+        result["products_error"] = ("Products service timeout"
+                                    if isinstance(products_result, (httpx.TimeoutException, asyncio.TimeoutError))
+                                    else "Products service unavailable")
+        if params:
+            result["next_cursor"] = None
+        return result
+
+    result["products"], next_cursor = products_result
+    if params:
+        result["next_cursor"] = next_cursor
+    return result
+
+@app.get("/api/products/export")
+async def export_products(user_id: Optional[int] = None):
+    # Relaie le flux NDJSON de products_service morceau par morceau, sans le charger en mémoire
+    params = {"user_id": user_id} if user_id is not None else {}
+    # Pas d'échéance transmise : un export dure aussi longtemps que le flux
+    request = http_client.build_request("GET", f"{PRODUCTS_SERVICE_URL}/products/export", params=params,
+                                        headers=trace_headers(), timeout=UPSTREAM_TIMEOUTS["export"])
+    breaker = UPSTREAM_BREAKERS["export"]
+    try:
+        breaker.check()
+        upstream = await http_client.send(request, stream=True)
+    except CircuitOpenError as e:
+        raise upstream_exception(e, "Products")
+    except httpx.ConnectError as e:
+        breaker.record_failure()
+        logger.error("Could not connect to products service at %s: %s", PRODUCTS_SERVICE_URL, e)
+        raise HTTPException(status_code=503, detail="Products service unavailable")
+    except httpx.TimeoutException:
+        breaker.record_failure()
+        logger.error("Timeout while connecting to products service at %s", PRODUCTS_SERVICE_URL)
+        raise HTTPException(status_code=504, detail="Products service timeout")
+    # Délestage (503 + Retry-After) : ni échec ni succès pour le disjoncteur
+    if not is_shed(upstream):
+        if upstream.status_code in RETRYABLE_STATUS_CODES:
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    if upstream.status_code != 200:
+        await upstream.aread()
+        await upstream.aclose()
+        logger.error("Error from products service export: %s", upstream.status_code)
+        raise HTTPException(status_code=upstream.status_code, detail=upstream.text,
+                            headers=retry_after_headers(upstream))
+
+    return StreamingResponse(upstream.aiter_raw(), media_type="application/x-ndjson",
+                             background=BackgroundTask(upstream.aclose))
+
+@app.get("/api/products/search")
+async def search_products(q: str, limit: Optional[int] = None, offset: Optional[int] = None,
+                          min_price: Optional[Decimal] = None, max_price: Optional[Decimal] = None,
+                          fields: Optional[str] = None):
+    # Relaie la recherche à products_service ; les erreurs de validation (400)
+    # sont renvoyées telles quelles et le corps n'est pas redécodé
+    params = {name: value for name, value in (("q", q), ("limit", limit), ("offset", offset),
+                                              ("min_price", min_price), ("max_price", max_price),
+                                              ("fields", fields)) if value is not None}
+    try:
+        response = await get_with_retry(f"{PRODUCTS_SERVICE_URL}/products/search", "products", params=params)
+    except Exception as e:
+        logger.error("Error searching products: %s", e)
+        raise upstream_exception(e, "Products")
+    if response.status_code != 200:
+        raise upstream_error(response)
+    return Response(response.content, media_type="application/json")
+
+class BatchRequest(BaseModel):
+    ids: List[int]
+
+async def fetch_batch(url: str, upstream: str, ids: list) -> dict:
+    response = await request_with_retry("POST", url, upstream, json={"ids": ids})
+    if response.status_code != 200:
+        raise upstream_error(response)
+    return response.json()
+
+@app.post("/api/users:batch")
+async def get_users_batch(batch: BatchRequest):
+    if len(batch.ids) > BATCH_MAX_IDS:
+        raise HTTPException(status_code=413, detail=f"At most {BATCH_MAX_IDS} ids per batch")
+    user_ids = list(dict.fromkeys(batch.ids))
+    logger.info("Fetching batch of %s users", len(user_ids))
+
+    # Utilisateurs et produits demandés en parallèle, chacun en un seul appel groupé
+    users_result, products_result = await asyncio.gather(
+        fetch_batch(f"{USERS_SERVICE_URL}/users:batch", "users", user_ids),
+        fetch_batch(f"{PRODUCTS_SERVICE_URL}/products:batch", "products", user_ids),
+        return_exceptions=True,
+    )
+
+    if isinstance(users_result, BaseException):
+        logger.error("Error fetching users batch: %s", getattr(users_result, 'detail', str(users_result)))
+        raise upstream_exception(users_result, "Users")
+
+    products_error = None
+    products_by_user = {}
+    if isinstance(products_result, BaseException):
+        # Les produits manquants n'empêchent pas de renvoyer les utilisateurs
+        logger.error("Error fetching products batch: %s", getattr(products_result, 'detail', str(products_result)))
+        products_error = "Products service unavailable"
+    else:
+        products_by_user = {item["user_id"]: item["products"] for item in products_result["items"]}
+
+    items = []
+    for item in users_result["items"]:
+        if "error" in item:
+            items.append(item)
+            continue
+        entry = {"id": item["id"], "user": item["user"], "products": products_by_user.get(item["id"], [])}
+        if products_error:
+            entry["products_error"] = products_error
+        items.append(entry)
+    return {"items": items}
+
 @app.get("/", response_class=HTMLResponse)
 async def get_home():
     return """
@@ -242,7 +662,10 @@ async def get_home():
                     <h3>API Documentation</h3>
                     <p>You can also use these endpoints directly:</p>
                     <ul>
-                        <li><strong>GET /api/users/{id}</strong> - Get user and products information</li>
+                        <li><strong>GET /api/users/{id}</strong> - Get user and products information (optional <code>limit</code>, <code>cursor</code>, <code>fields</code>, <code>fanout</code>, <code>summary</code> for product count, total and average price and price buckets; conditional with <code>If-None-Match</code> / <code>If-Modified-Since</code>)</li>
+                        <li><strong>GET /api/products/search</strong> - Search products by name and description (<code>q</code>; optional <code>min_price</code>, <code>max_price</code>, <code>limit</code>, <code>offset</code>, <code>fields</code>)</li>
+                        <li><strong>GET /api/products/export</strong> - Stream products as NDJSON (optional <code>user_id</code>)</li>
+                        <li><strong>POST /api/users:batch</strong> - Get users and products for a list of ids (<code>{"ids": [1, 2, 3]}</code>)</li>
                         <li><strong>GET /api/health</strong> - Check service health</li>
                     </ul>
                     <p>Example with Postman:</p>
@@ -0,0 +1,229 @@
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+
+logger = logging.getLogger(__name__)
+
+# Cache de réponses de la passerelle (surchargeable par variables d'environnement)
+GATEWAY_CACHE_MAX_ENTRIES = int(os.getenv("GATEWAY_CACHE_MAX_ENTRIES", "10000"))
+GATEWAY_CACHE_MAX_BYTES = int(os.getenv("GATEWAY_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+# Âge maximal d'une réponse en cache, même si sa version n'a pas changé
+GATEWAY_CACHE_MAX_AGE = float(os.getenv("GATEWAY_CACHE_MAX_AGE", "300"))
+
+# Version du contenu par utilisateur : hash Redis {version, modified}.
+# Seules les écritures de produits incrémentent la version ; la clé expire
+# CONTENT_VERSION_TTL secondes après sa création ou son dernier incrément, ce
+# qui borne aussi le retard des modifications de la ligne users (pas d'API
+# d'écriture) et le nombre de clés. Une clé recréée a une nouvelle date de
+# modification, qui fait partie de l'ETag : pas de retour d'anciens ETag.
+CONTENT_VERSION_KEY_PREFIX = "content_version"
+CONTENT_VERSION_TTL = int(os.getenv("CONTENT_VERSION_TTL", "300"))
+
+# Incrément atomique ; la date de modification avance d'au moins une seconde
+# (Last-Modified et If-Modified-Since sont à la seconde près)
+_BUMP_SCRIPT = """
+local now = tonumber(ARGV[1])
+local previous = tonumber(redis.call('HGET', KEYS[1], 'modified') or '0')
+if math.floor(now) <= math.floor(previous) then
+    now = math.floor(previous) + 1
+end
+local version = redis.call('HINCRBY', KEYS[1], 'version', 1)
+redis.call('HSET', KEYS[1], 'modified', tostring(now))
+redis.call('EXPIRE', KEYS[1], ARGV[2])
+return version
+"""
+
+
+class ContentVersions:
+    # Compteur de version et date de modification par utilisateur, incrémentés
+    # à chaque écriture de produits (products_changed, après l'événement de
+    # modification) et lus par la passerelle pour ses ETag / Last-Modified
+    def __init__(self, redis_client=None, ttl: int = CONTENT_VERSION_TTL):
+        self.redis_client = redis_client
+        self.ttl = ttl
+        self.enabled = False
+
+        self.bumps = 0
+        self.errors = 0
+
+    def enable(self, enabled: bool):
+        self.enabled = enabled and self.redis_client is not None
+
+    @staticmethod
+    def key(user_id) -> str:
+        return f"{CONTENT_VERSION_KEY_PREFIX}:{user_id}"
+
+    async def get(self, user_id):
+        # (version, date de modification) ou None si Redis n'est pas disponible.
+        # Lecture seule : sans clé (utilisateur jamais servi, ou clé expirée),
+        # renvoie (0, None) ; la clé est créée par start() après une réponse complète.
+        if not self.enabled:
+            return None
+        try:
+            version, modified = await self.redis_client.hmget(self.key(user_id), "version", "modified")
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Could not read content version of user %s: %s", user_id, e)
+            return None
+        if modified is None:
+            return 0, None
+        return int(version or 0), float(modified)
+
+    async def start(self, user_id):
+        # Crée la clé d'un utilisateur servi sans version connue ; renvoie la
+        # version courante, ou None si Redis n'est pas disponible
+        if not self.enabled:
+            return None
+        key = self.key(user_id)
+        try:
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                pipe.hsetnx(key, "modified", time.time())
+                pipe.hmget(key, "version", "modified")
+                pipe.ttl(key)
+                created, (version, modified), ttl = await pipe.execute()
+            if created or ttl < 0:
+                await self.redis_client.expire(key, self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Could not create content version of user %s: %s", user_id, e)
+            return None
+        return int(version or 0), float(modified)
+
+    async def bump_many(self, user_ids) -> dict:
+        # Renvoie les nouvelles versions {user_id: version} ({} sans Redis)
+        if not self.enabled or not user_ids:
+            return {}
+        now = time.time()
+        try:
+            async with self.redis_client.pipeline(transaction=True) as pipe:
+                for user_id in user_ids:
+                    pipe.eval(_BUMP_SCRIPT, 1, self.key(user_id), now, self.ttl)
+                results = await pipe.execute()
+            self.bumps += len(user_ids)
+        except Exception as e:
+            self.errors += 1
+            logger.warning("Could not bump content version of %s users: %s", len(user_ids), e)
+            return {}
+        return dict(zip(user_ids, results))
+
+    def metrics(self) -> dict:
+        return {"redis": self.enabled, "bumps": self.bumps, "errors": self.errors}
+
+
+class ResponseCache:
+    # LRU de corps de réponse déjà sérialisés, bornée en nombre d'entrées et en
+    # octets. Une entrée n'est servie que pour la version avec laquelle elle a
+    # été enregistrée (valeur comparée telle quelle, ex. (version, modified)),
+    # et au plus max_age secondes.
+    def __init__(self, max_entries: int = GATEWAY_CACHE_MAX_ENTRIES, max_bytes: int = GATEWAY_CACHE_MAX_BYTES,
+                 max_age: float = GATEWAY_CACHE_MAX_AGE):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self._entries = OrderedDict()
+        self.memory_bytes = 0
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+        self.not_modified = 0
+        # Octets de corps non envoyés aux clients grâce aux réponses 304
+        self.bytes_saved = 0
+        # Octets servis depuis le cache sans appel aux services en aval
+        self.bytes_served = 0
+
+    def get(self, key, version):
+        entry = self._entries.get(key)
+        if entry is not None and (entry[0] != version or time.monotonic() - entry[2] > self.max_age):
+            self.stale += 1
+            self._drop(key)
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        self.bytes_served += len(entry[1])
+        return entry[1]
+
+    def put(self, key, version, body: bytes):
+        if len(body) > self.max_bytes:
+            return
+        self._drop(key)
+        self._entries[key] = (version, body, time.monotonic())
+        self.memory_bytes += len(body)
+        while len(self._entries) > self.max_entries or self.memory_bytes > self.max_bytes:
+            _, (_, evicted, _) = self._entries.popitem(last=False)
+            self.memory_bytes -= len(evicted)
+            self.evictions += 1
+
+    def size_of(self, key, version) -> int:
+        entry = self._entries.get(key)
+        return len(entry[1]) if entry is not None and entry[0] == version else 0
+
+    def record_not_modified(self, size: int):
+        self.not_modified += 1
+        self.bytes_saved += size
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.memory_bytes -= len(entry[1])
+
+    def metrics(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "memory_bytes": self.memory_bytes,
+            "max_bytes": self.max_bytes,
+            "max_age_seconds": self.max_age,
+            "hits": self.hits,
+            "misses": self.misses,
+            "stale": self.stale,
+            "evictions": self.evictions,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "not_modified": self.not_modified,
+            "bytes_saved": self.bytes_saved,
+            "bytes_served": self.bytes_served,
+        }
+
+
+def versioned_etag(user_id, version: int, modified: float, variant: str) -> str:
+    # La variante (pagination, projection) fait partie de l'ETag : deux vues
+    # d'un même utilisateur n'ont jamais le même. La date de modification
+    # distingue une clé de version recréée après expiration.
+    digest = hashlib.sha1(variant.encode()).hexdigest()[:8]
+    return f'"u{user_id}-v{version}-{int(modified * 1000):x}-{digest}"'
+
+
+def content_etag(body: bytes) -> str:
+    return '"' + hashlib.sha1(body).hexdigest()[:20] + '"'
+
+
+def etag_matches(if_none_match, etag: str) -> bool:
+    # Comparaison faible (RFC 9110) : W/"x" correspond à "x"
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+
+def http_date(timestamp: float) -> str:
+    return formatdate(timestamp, usegmt=True)
+
+
+def not_modified_since(if_modified_since, modified: float) -> bool:
+    if not if_modified_since:
+        return False
+    try:
+        since = parsedate_to_datetime(if_modified_since).timestamp()
+    except (TypeError, ValueError):
+        return False
+    # Last-Modified est à la seconde près
+    return int(modified) <= since
@@ -2,6 +2,8 @@ import asyncpg
 import asyncio
 import logging
 
+from migrate import migrate
+
 # Configuration du logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -15,14 +17,8 @@ async def init_users_db():
         # Connexion à la base de données users
         conn = await asyncpg.connect(USERS_DB_URL)
         
-        # Création de la table users si elle n'existe pas
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                id SERIAL PRIMARY KEY,
-                name VARCHAR(100) NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL
-            )
-        ''')
+        # Schéma géré par les migrations versionnées (migrations/users_db)
+        await migrate(USERS_DB_URL, "users_db")
         
         # Insertion des utilisateurs de test
         await conn.execute('''
@@ -37,7 +33,7 @@ async def init_users_db():
         await conn.close()
         
     except Exception as e:
-        logger.error(f"Error initializing users database: {str(e)}")
+        logger.error("Error initializing users database: %s", e)
         raise
 
 async def init_products_db():
@@ -45,33 +41,28 @@ async def init_products_db():
         # Connexion à la base de données products
         conn = await asyncpg.connect(PRODUCTS_DB_URL)
         
-        # Création de la table products si elle n'existe pas
-        await conn.execute('''
-            CREATE TABLE IF NOT EXISTS products (
-                id SERIAL PRIMARY KEY,
-                user_id INTEGER NOT NULL,
-                name VARCHAR(100) NOT NULL,
-                price DECIMAL(10,2) NOT NULL,
-                description TEXT
-            )
-        ''')
+        # Schéma et index gérés par les migrations versionnées (migrations/products_db)
+        await migrate(PRODUCTS_DB_URL, "products_db")
         
-        # Insertion des produits de test
+        # Insertion des produits de test, seulement si la table est vide
+        # (products n'a pas de contrainte unique : ON CONFLICT ne suffit pas)
         await conn.execute('''
-            INSERT INTO products (user_id, name, price, description) VALUES
-            (1, 'Laptop', 999.99, 'High-performance laptop'),
-            (1, 'Smartphone', 699.99, 'Latest smartphone model'),
-            (2, 'Tablet', 499.99, '10-inch tablet'),
-            (2, 'Headphones', 199.99, 'Wireless noise-cancelling headphones'),
-            (3, 'Smartwatch', 299.99, 'Fitness tracking smartwatch')
-            ON CONFLICT DO NOTHING
+            INSERT INTO products (user_id, name, price, description)
+            SELECT * FROM (VALUES
+                (1, 'Laptop', 999.99, 'High-performance laptop'),
+                (1, 'Smartphone', 699.99, 'Latest smartphone model'),
+                (2, 'Tablet', 499.99, '10-inch tablet'),
+                (2, 'Headphones', 199.99, 'Wireless noise-cancelling headphones'),
+                (3, 'Smartwatch', 299.99, 'Fitness tracking smartwatch')
+            ) AS seed(user_id, name, price, description)
+            WHERE NOT EXISTS (SELECT 1 FROM products)
         ''')
         
         logger.info("Products database initialized successfully")
         await conn.close()
         
     except Exception as e:
-        logger.error(f"Error initializing products database: {str(e)}")
+        logger.error("Error initializing products database: %s", e)
         raise
 
 async def main():
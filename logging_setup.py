@@ -0,0 +1,176 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import time
+from logging.handlers import QueueHandler, QueueListener
+
+from metrics import current_trace_id
+
+# Configuration (surchargeable par variables d'environnement)
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# json : une ligne JSON par message ; text : format lisible pour le développement
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")
+# Taille de la file entre la boucle d'événements et le thread d'écriture ;
+# quand elle est pleine, les messages sont abandonnés plutôt que de bloquer
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+# Proportion des requêtes dont les messages DEBUG/INFO sont gardés, par défaut
+# et par modèle de route : LOG_SAMPLE_RATES="/users/{user_id}=0.01,/products/{user_id}=0.1"
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "1.0"))
+LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
+# Bibliothèques qui journalisent chaque appel au niveau INFO (httpx : une ligne
+# par requête sortante) ; limitées à WARNING sauf en DEBUG
+NOISY_LOGGERS = ("httpx", "httpcore")
+
+# Scope ASGI de la requête en cours, pour l'échantillonnage par route
+_request_scope = contextvars.ContextVar("request_scope", default=None)
+
+_listener = None
+
+
+def parse_sample_rates(spec: str) -> dict:
+    rates = {}
+    for item in spec.split(","):
+        if "=" in item:
+            route, rate = item.rsplit("=", 1)
+            rates[route.strip()] = float(rate)
+    return rates
+
+
+class RequestContextFilter(logging.Filter):
+    # Exécuté dans la tâche qui journalise : ajoute le service et la trace, et
+    # applique l'échantillonnage. La décision est prise une fois par requête
+    # (tous ses messages ou aucun) ; WARNING et au-delà ne sont jamais écartés.
+    def __init__(self, service: str, default_rate=None, rates=None):
+        super().__init__()
+        self.service = service
+        self.default_rate = LOG_SAMPLE_RATE if default_rate is None else default_rate
+        self.rates = parse_sample_rates(LOG_SAMPLE_RATES) if rates is None else rates
+        self.dropped = 0
+
+    def filter(self, record) -> bool:
+        record.service = self.service
+        record.trace_id = current_trace_id()
+        if record.levelno >= logging.WARNING:
+            return True
+        scope = _request_scope.get()
+        if scope is None:
+            return True
+        sampled = scope.get("log_sampled")
+        if sampled is None:
+            route = getattr(scope.get("route"), "path", None)
+            rate = self.rates.get(route, self.default_rate)
+            sampled = rate >= 1.0 or random.random() < rate
+            # Avant le routage la route est inconnue : ne pas figer la décision
+            if route is not None:
+                scope["log_sampled"] = sampled
+        if not sampled:
+            self.dropped += 1
+        return sampled
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    # Ne fait sur la boucle d'événements que le strict nécessaire : fusion des
+    # arguments du message et texte de l'exception. La mise en forme JSON et
+    # l'écriture ont lieu dans le thread du QueueListener.
+    def __init__(self, log_queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record):
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record) -> str:
+        entry = {
+            "ts": time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z",
+            "level": record.levelname,
+            "service": getattr(record, "service", None),
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        trace_id = getattr(record, "trace_id", None)
+        if trace_id:
+            entry["trace_id"] = trace_id
+        # Traces reliées à celle du message (lot qui sert plusieurs requêtes)
+        links = getattr(record, "links", None)
+        if links:
+            entry["links"] = links
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+def setup_logging(service: str, stream=None, level=None, sample_rate=None):
+    # Remplace les handlers de la racine par un QueueHandler ; un seul thread
+    # (QueueListener) formate et écrit sur la sortie d'erreur
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+
+    log_queue = queue.Queue(LOG_QUEUE_SIZE)
+    handler = NonBlockingQueueHandler(log_queue)
+    handler.addFilter(RequestContextFilter(service, sample_rate))
+
+    output = logging.StreamHandler(stream or sys.stderr)
+    if LOG_FORMAT == "json":
+        output.setFormatter(JsonFormatter())
+    else:
+        output.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(service)s %(name)s: %(message)s"))
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level or LOG_LEVEL)
+    for name in NOISY_LOGGERS:
+        logging.getLogger(name).setLevel(logging.NOTSET if root.level <= logging.DEBUG else logging.WARNING)
+
+    _listener = QueueListener(log_queue, output, respect_handler_level=False)
+    _listener.start()
+    return _listener
+
+
+def stop_logging():
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+# Vide la file à la sortie du processus
+atexit.register(stop_logging)
+
+
+class RequestLogContextMiddleware:
+    # Middleware ASGI pur (sans tâche supplémentaire) : rend le scope de la
+    # requête visible par RequestContextFilter
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = _request_scope.set(scope)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _request_scope.reset(token)
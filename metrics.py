@@ -0,0 +1,265 @@
+import contextvars
+import functools
+import os
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+from starlette.responses import Response
+
+# Format texte d'exposition Prometheus
+CONTENT_TYPE = "text/plain; version=0.0.4"  # starlette ajoute charset=utf-8
+
+# Bornes des histogrammes de latence, en secondes
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=()) -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    pairs += [f'{name}="{_escape(value)}"' for name, value in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, help_text: str, labels=()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._values = {}
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(labels.get(name, "") for name in self.label_names)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, key)} {value}")
+        return lines
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    kind = "gauge"
+
+    def set(self, value: float, **labels):
+        self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        state = self._values.get(key)
+        if state is None:
+            # Comptes par intervalle (+Inf en dernier), somme et nombre d'observations
+            state = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for key, (counts, total, count) in sorted(self._values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, [('le', le)])} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, key)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, key)} {count}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+
+    def _register(self, cls, name: str, help_text: str, labels=(), **kwargs):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, help_text, labels, **kwargs)
+        return metric
+
+    def counter(self, name: str, help_text: str, labels=()) -> Counter:
+        return self._register(Counter, name, help_text, labels)
+
+    def gauge(self, name: str, help_text: str, labels=()) -> Gauge:
+        return self._register(Gauge, name, help_text, labels)
+
+    def histogram(self, name: str, help_text: str, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, help_text, labels, buckets=buckets)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+# Registre du processus : un service par processus
+registry = Registry()
+
+http_requests = registry.counter("http_requests_total", "HTTP requests handled",
+                                 ("service", "method", "route", "status"))
+http_errors = registry.counter("http_errors_total", "HTTP requests answered with a 5xx status or an exception",
+                               ("service", "route"))
+http_latency = registry.histogram("http_request_duration_seconds", "HTTP request latency",
+                                  ("service", "method", "route"))
+span_latency = registry.histogram("span_duration_seconds", "Duration of instrumented code sections",
+                                  ("span",))
+span_errors = registry.counter("span_errors_total", "Instrumented code sections that raised", ("span",))
+queue_wait = registry.histogram("redis_queue_wait_seconds",
+                                "Time product requests spent in the Redis queue before processing")
+queue_depth = registry.gauge("redis_queue_depth", "Messages waiting in a Redis queue (list or stream group)",
+                             ("queue",))
+product_writes = registry.counter("product_writes_total", "Products created, updated or deleted by the bulk write API",
+                                  ("operation",))
+expired_requests = registry.counter("product_requests_expired_total",
+                                    "Product requests dropped because their deadline had passed")
+
+
+# Contexte de trace W3C (traceparent) de la tâche courante : (trace_id, span_id)
+_trace_context = contextvars.ContextVar("trace_context", default=None)
+
+
+def _new_id(size: int) -> str:
+    return os.urandom(size).hex()
+
+
+def parse_traceparent(header):
+    # "00-<trace_id 32 hex>-<span_id 16 hex>-<flags>" ; None si absent ou invalide
+    if not header:
+        return None
+    parts = header.split("-")
+    if len(parts) != 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    return parts[1], parts[2]
+
+
+def current_traceparent():
+    context = _trace_context.get()
+    if context is None:
+        return None
+    return f"00-{context[0]}-{context[1]}-01"
+
+
+def current_trace_id():
+    context = _trace_context.get()
+    return context[0] if context else None
+
+
+def trace_headers() -> dict:
+    traceparent = current_traceparent()
+    return {"traceparent": traceparent} if traceparent else {}
+
+
+@contextmanager
+def trace_context(traceparent=None):
+    # Reprend la trace reçue (en-tête HTTP ou message Redis) ou en démarre une nouvelle
+    parent = parse_traceparent(traceparent)
+    token = _trace_context.set((parent[0] if parent else _new_id(16), _new_id(8)))
+    try:
+        yield
+    finally:
+        _trace_context.reset(token)
+
+
+@contextmanager
+def span(name: str):
+    # Mesure une section de code ; les appels sortants faits à l'intérieur
+    # propagent ce span comme parent
+    parent = _trace_context.get()
+    token = _trace_context.set((parent[0] if parent else _new_id(16), _new_id(8)))
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        span_errors.inc(span=name)
+        raise
+    finally:
+        span_latency.observe(time.perf_counter() - start, span=name)
+        _trace_context.reset(token)
+
+
+def traced(name: str):
+    # Décorateur équivalent à span() pour une coroutine entière
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def instrument_app(app, service: str):
+    # Middleware de mesure : latence, nombre de requêtes et erreurs par route
+    # (modèle de route, pas le chemin brut, pour borner le nombre de séries)
+    @app.middleware("http")
+    async def timing_middleware(request, call_next):
+        start = time.perf_counter()
+        with trace_context(request.headers.get("traceparent")):
+            status = 500
+            try:
+                response = await call_next(request)
+                status = response.status_code
+                return response
+            finally:
+                route = getattr(request.scope.get("route"), "path", "unmatched")
+                http_latency.observe(time.perf_counter() - start, service=service,
+                                     method=request.method, route=route)
+                http_requests.inc(service=service, method=request.method, route=route, status=status)
+                if status >= 500:
+                    http_errors.inc(service=service, route=route)
+
+
+async def update_queue_depth(queue):
+    # queue : ListQueue ou StreamQueue (work_queue)
+    try:
+        queue_depth.set(await queue.depth(), queue=queue.name)
+    except Exception:
+        # Redis indisponible : on garde la dernière valeur connue
+        pass
+
+
+def set_gauges(prefix: str, values: dict, **labels):
+    # Expose un dictionnaire de métriques existant (pool, cache, consommateur) en
+    # jauges ; les sous-dictionnaires donnent des noms composés
+    for key, value in values.items():
+        if isinstance(value, dict):
+            set_gauges(f"{prefix}_{key}", value, **labels)
+            continue
+        if isinstance(value, bool):
+            value = int(value)
+        if isinstance(value, (int, float)):
+            registry.gauge(f"{prefix}_{key}", f"{prefix.replace('_', ' ')} {key.replace('_', ' ')}",
+                           tuple(labels)).set(value, **labels)
+
+
+def set_route_gauges(name: str, help_text: str, values: dict):
+    # Valeurs par modèle de route (ex. requêtes en cours du contrôle d'admission)
+    gauge = registry.gauge(name, help_text, ("route",))
+    for route, value in values.items():
+        gauge.set(value, route=route)
+
+
+def metrics_response() -> Response:
+    return Response(registry.render(), media_type=CONTENT_TYPE)
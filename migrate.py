@@ -0,0 +1,89 @@
+import argparse
+import asyncio
+import logging
+import os
+
+import asyncpg
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Un sous-dossier par base : migrations/<base>/<version>_<description>.sql,
+# appliqués dans l'ordre des noms de fichiers
+MIGRATIONS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "migrations")
+
+# Verrou consultatif : deux processus ne migrent jamais la même base en même temps
+MIGRATION_LOCK_ID = 7301942
+
+def list_migrations(database: str) -> list:
+    directory = os.path.join(MIGRATIONS_DIR, database)
+    if not os.path.isdir(directory):
+        return []
+    return [(name[:-4], os.path.join(directory, name))
+            for name in sorted(os.listdir(directory)) if name.endswith(".sql")]
+
+async def applied_versions(conn) -> set:
+    await conn.execute('''
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version VARCHAR(200) PRIMARY KEY,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+        )
+    ''')
+    return {row["version"] for row in await conn.fetch("SELECT version FROM schema_migrations")}
+
+async def migrate(dsn: str, database: str) -> list:
+    # Applique les migrations manquantes, chacune dans sa propre transaction ;
+    # relancer la commande ne fait rien si la base est à jour
+    conn = await asyncpg.connect(dsn)
+    applied = []
+    try:
+        await conn.execute("SELECT pg_advisory_lock($1)", MIGRATION_LOCK_ID)
+        try:
+            done = await applied_versions(conn)
+            for version, path in list_migrations(database):
+                if version in done:
+                    continue
+                with open(path, encoding="utf-8") as f:
+                    sql = f.read()
+                logger.info("Applying migration %s/%s", database, version)
+                async with conn.transaction():
+                    await conn.execute(sql)
+                    await conn.execute("INSERT INTO schema_migrations (version) VALUES ($1)", version)
+                applied.append(version)
+        finally:
+            await conn.execute("SELECT pg_advisory_unlock($1)", MIGRATION_LOCK_ID)
+    finally:
+        await conn.close()
+
+    if applied:
+        logger.info("%s: applied %s migration(s)", database, len(applied))
+    else:
+        logger.info("%s: schema is up to date", database)
+    return applied
+
+async def status(dsn: str, database: str):
+    conn = await asyncpg.connect(dsn)
+    try:
+        done = await applied_versions(conn)
+    finally:
+        await conn.close()
+    for version, _ in list_migrations(database):
+        print(f"{database:<12} {'applied' if version in done else 'pending':<8} {version}")
+
+async def main(databases, show_status: bool):
+    from init_db import PRODUCTS_DB_URL, USERS_DB_URL
+    dsns = {"users_db": USERS_DB_URL, "products_db": PRODUCTS_DB_URL}
+    for database in databases:
+        if show_status:
+            await status(dsns[database], database)
+        else:
+            await migrate(dsns[database], database)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Apply versioned SQL migrations")
+    parser.add_argument("--db", choices=["users_db", "products_db"], action="append",
+                        help="database to migrate (default: both)")
+    parser.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    args = parser.parse_args()
+    asyncio.run(main(args.db or ["users_db", "products_db"], args.status))
@@ -0,0 +1,12 @@
+-- Création de la table products
+CREATE TABLE IF NOT EXISTS products (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    name VARCHAR(100) NOT NULL,
+    price DECIMAL(10,2) NOT NULL,
+    description TEXT
+);
+
+-- Bases créées avant l'ajout de ces colonnes (ancien update_db.sql)
+ALTER TABLE products ADD COLUMN IF NOT EXISTS price DECIMAL(10,2);
+ALTER TABLE products ADD COLUMN IF NOT EXISTS description TEXT;
@@ -0,0 +1,9 @@
+-- Index couvrant pour les lectures par utilisateur :
+--   WHERE user_id = $1 AND id > $2 ORDER BY id LIMIT $3  (pagination)
+--   WHERE user_id = ANY($1)                             (lots et cache)
+-- Les colonnes INCLUDE permettent un index-only scan sans lire la table.
+CREATE INDEX IF NOT EXISTS products_user_id_id_idx
+    ON products (user_id, id)
+    INCLUDE (name, price, description);
+
+ANALYZE products;
@@ -0,0 +1,23 @@
+-- Recherche de produits (/products/search)
+--   search_vector : plein texte sur name (poids A) et description (poids B),
+--                   colonne générée donc toujours à jour, pour le classement
+--                   ts_rank_cd sans recalculer to_tsvector à chaque ligne
+--   trigrammes    : mots contenus dans un nom (name ILIKE '%phone%')
+-- L'ajout de la colonne réécrit la table : à prévoir hors des heures de pointe
+-- sur une grosse base. pg_trgm est une extension "trusted" (PostgreSQL 13+) :
+-- le propriétaire de la base peut la créer.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE products ADD COLUMN IF NOT EXISTS search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(name, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED;
+
+CREATE INDEX IF NOT EXISTS products_search_vector_idx
+    ON products USING GIN (search_vector);
+
+CREATE INDEX IF NOT EXISTS products_name_trgm_idx
+    ON products USING GIN (name gin_trgm_ops);
+
+ANALYZE products;
@@ -0,0 +1,138 @@
+-- Agrégats de produits par utilisateur (/products/{user_id}/aggregates), tenus
+-- à jour par des triggers au niveau instruction : une écriture de N lignes
+-- (INSERT multi-lignes, COPY, UPDATE ou DELETE en masse) applique un seul
+-- delta par utilisateur touché au lieu de N mises à jour.
+-- Tranches de prix : [0, 10) [10, 50) [50, 100) [100, 500) [500, 1000) [1000, +inf),
+-- à garder identiques à PRICE_BUCKETS (product_queries.py).
+CREATE TABLE IF NOT EXISTS user_product_stats (
+    user_id INTEGER PRIMARY KEY,
+    product_count BIGINT NOT NULL DEFAULT 0,
+    -- Produits avec un prix (la moyenne porte sur eux seuls)
+    priced_count BIGINT NOT NULL DEFAULT 0,
+    total_price NUMERIC(16,2) NOT NULL DEFAULT 0,
+    price_lt_10 BIGINT NOT NULL DEFAULT 0,
+    price_10_50 BIGINT NOT NULL DEFAULT 0,
+    price_50_100 BIGINT NOT NULL DEFAULT 0,
+    price_100_500 BIGINT NOT NULL DEFAULT 0,
+    price_500_1000 BIGINT NOT NULL DEFAULT 0,
+    price_gte_1000 BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+);
+
+-- Calcul complet depuis products, utilisé pour le remplissage initial et par
+-- backfill_product_stats.py (le filtre sur user_id est appliqué avant le GROUP BY)
+CREATE OR REPLACE VIEW user_product_stats_source AS
+SELECT user_id,
+       count(*) AS product_count,
+       count(price) AS priced_count,
+       coalesce(sum(price), 0) AS total_price,
+       count(*) FILTER (WHERE price < 10) AS price_lt_10,
+       count(*) FILTER (WHERE price >= 10 AND price < 50) AS price_10_50,
+       count(*) FILTER (WHERE price >= 50 AND price < 100) AS price_50_100,
+       count(*) FILTER (WHERE price >= 100 AND price < 500) AS price_100_500,
+       count(*) FILTER (WHERE price >= 500 AND price < 1000) AS price_500_1000,
+       count(*) FILTER (WHERE price >= 1000) AS price_gte_1000
+FROM products
+GROUP BY user_id;
+
+-- Applique les lignes ajoutées (+1) et retirées (-1) par l'instruction, lues
+-- dans les tables de transition new_rows / old_rows. Un UPDATE qui ne touche
+-- ni user_id ni price donne un delta nul et n'écrit rien. Les utilisateurs
+-- sont mis à jour dans l'ordre de user_id pour éviter les interblocages entre
+-- écritures concurrentes.
+CREATE OR REPLACE FUNCTION user_product_stats_apply() RETURNS trigger
+LANGUAGE plpgsql AS $$
+DECLARE
+    changes text;
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        changes := 'SELECT user_id, 1 AS sign, price FROM new_rows';
+    ELSIF TG_OP = 'DELETE' THEN
+        changes := 'SELECT user_id, -1 AS sign, price FROM old_rows';
+    ELSE
+        changes := 'SELECT user_id, 1 AS sign, price FROM new_rows '
+                   'UNION ALL SELECT user_id, -1 AS sign, price FROM old_rows';
+    END IF;
+    EXECUTE format($sql$
+        WITH changes AS (%s),
+        deltas AS (
+            SELECT user_id,
+                   sum(sign) AS product_count,
+                   coalesce(sum(sign) FILTER (WHERE price IS NOT NULL), 0) AS priced_count,
+                   coalesce(sum(sign * price), 0) AS total_price,
+                   coalesce(sum(sign) FILTER (WHERE price < 10), 0) AS price_lt_10,
+                   coalesce(sum(sign) FILTER (WHERE price >= 10 AND price < 50), 0) AS price_10_50,
+                   coalesce(sum(sign) FILTER (WHERE price >= 50 AND price < 100), 0) AS price_50_100,
+                   coalesce(sum(sign) FILTER (WHERE price >= 100 AND price < 500), 0) AS price_100_500,
+                   coalesce(sum(sign) FILTER (WHERE price >= 500 AND price < 1000), 0) AS price_500_1000,
+                   coalesce(sum(sign) FILTER (WHERE price >= 1000), 0) AS price_gte_1000
+            FROM changes
+            GROUP BY user_id
+        )
+        INSERT INTO user_product_stats AS s
+            (user_id, product_count, priced_count, total_price, price_lt_10, price_10_50, price_50_100,
+             price_100_500, price_500_1000, price_gte_1000, updated_at)
+        SELECT user_id, product_count, priced_count, total_price, price_lt_10, price_10_50, price_50_100,
+               price_100_500, price_500_1000, price_gte_1000, now()
+        FROM deltas
+        WHERE product_count <> 0 OR priced_count <> 0 OR total_price <> 0
+           OR price_lt_10 <> 0 OR price_10_50 <> 0 OR price_50_100 <> 0
+           OR price_100_500 <> 0 OR price_500_1000 <> 0 OR price_gte_1000 <> 0
+        ORDER BY user_id
+        ON CONFLICT (user_id) DO UPDATE SET
+            product_count = s.product_count + EXCLUDED.product_count,
+            priced_count = s.priced_count + EXCLUDED.priced_count,
+            total_price = s.total_price + EXCLUDED.total_price,
+            price_lt_10 = s.price_lt_10 + EXCLUDED.price_lt_10,
+            price_10_50 = s.price_10_50 + EXCLUDED.price_10_50,
+            price_50_100 = s.price_50_100 + EXCLUDED.price_50_100,
+            price_100_500 = s.price_100_500 + EXCLUDED.price_100_500,
+            price_500_1000 = s.price_500_1000 + EXCLUDED.price_500_1000,
+            price_gte_1000 = s.price_gte_1000 + EXCLUDED.price_gte_1000,
+            updated_at = EXCLUDED.updated_at
+    $sql$, changes);
+    RETURN NULL;
+END
+$$;
+
+-- TRUNCATE ne déclenche pas les triggers de DELETE
+CREATE OR REPLACE FUNCTION user_product_stats_truncate() RETURNS trigger
+LANGUAGE plpgsql AS $$
+BEGIN
+    TRUNCATE user_product_stats;
+    RETURN NULL;
+END
+$$;
+
+-- Une table de transition n'est permise que sur un trigger à un seul événement
+DROP TRIGGER IF EXISTS user_product_stats_insert ON products;
+CREATE TRIGGER user_product_stats_insert
+    AFTER INSERT ON products REFERENCING NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_product_stats_apply();
+
+DROP TRIGGER IF EXISTS user_product_stats_update ON products;
+CREATE TRIGGER user_product_stats_update
+    AFTER UPDATE ON products REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_product_stats_apply();
+
+DROP TRIGGER IF EXISTS user_product_stats_delete ON products;
+CREATE TRIGGER user_product_stats_delete
+    AFTER DELETE ON products REFERENCING OLD TABLE AS old_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION user_product_stats_apply();
+
+DROP TRIGGER IF EXISTS user_product_stats_truncate ON products;
+CREATE TRIGGER user_product_stats_truncate
+    AFTER TRUNCATE ON products
+    FOR EACH STATEMENT EXECUTE FUNCTION user_product_stats_truncate();
+
+-- Remplissage initial : les triggers bloquent les écritures sur products
+-- jusqu'à la fin de la migration, le calcul ne peut donc pas manquer de ligne
+DELETE FROM user_product_stats;
+INSERT INTO user_product_stats
+    (user_id, product_count, priced_count, total_price, price_lt_10, price_10_50, price_50_100,
+     price_100_500, price_500_1000, price_gte_1000)
+SELECT user_id, product_count, priced_count, total_price, price_lt_10, price_10_50, price_50_100,
+       price_100_500, price_500_1000, price_gte_1000
+FROM user_product_stats_source;
+
+ANALYZE user_product_stats;
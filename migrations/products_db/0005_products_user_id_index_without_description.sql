@@ -0,0 +1,17 @@
+-- Retire description des colonnes INCLUDE de products_user_id_id_idx (0002).
+-- Une entrée de B-tree est limitée à environ 2,7 Ko : avec une colonne TEXT
+-- sans limite dans l'index, tout INSERT ou UPDATE d'une longue description
+-- échouait ("index row size exceeds maximum"), limite que le plafond de 2000
+-- caractères de l'API ne garantit pas (jusqu'à 4 octets par caractère).
+-- Les lectures par utilisateur restent servies par l'index, mais la liste par
+-- défaut, qui renvoie description, n'est plus un index-only scan : elle lit
+-- les lignes de la table.
+-- Reconstruit l'index sous verrou d'écriture : à prévoir hors des heures de
+-- pointe sur une grosse base.
+DROP INDEX IF EXISTS products_user_id_id_idx;
+
+CREATE INDEX products_user_id_id_idx
+    ON products (user_id, id)
+    INCLUDE (name, price);
+
+ANALYZE products;
@@ -0,0 +1,10 @@
+-- Création de la table users
+CREATE TABLE IF NOT EXISTS users (
+    id SERIAL PRIMARY KEY,
+    name VARCHAR(100) NOT NULL,
+    email VARCHAR(100) UNIQUE NOT NULL
+);
+
+-- Bases créées avant l'ajout de la colonne email (ancien update_db.sql)
+ALTER TABLE users ADD COLUMN IF NOT EXISTS email VARCHAR(100);
+CREATE UNIQUE INDEX IF NOT EXISTS users_email_key ON users (email);
@@ -0,0 +1,268 @@
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+
+from serialization import dumps, loads
+
+logger = logging.getLogger(__name__)
+
+# Configuration du cache (surchargeable par variables d'environnement)
+PRODUCT_CACHE_MAX_ENTRIES = int(os.getenv("PRODUCT_CACHE_MAX_ENTRIES", "10000"))
+PRODUCT_CACHE_TTL = float(os.getenv("PRODUCT_CACHE_TTL", "30"))
+# TTL local tant que le service est abonné aux événements de modification
+# (change_events). Par défaut identique au TTL normal : les événements Pub/Sub
+# peuvent se perdre sans coupure de l'abonnement, un TTL plus long est à
+# choisir explicitement.
+PRODUCT_CACHE_EVENT_TTL = float(os.getenv("PRODUCT_CACHE_EVENT_TTL", str(PRODUCT_CACHE_TTL)))
+PRODUCT_CACHE_REDIS_TTL = int(os.getenv("PRODUCT_CACHE_REDIS_TTL", "300"))
+PRODUCT_CACHE_USE_REDIS = os.getenv("PRODUCT_CACHE_USE_REDIS", "1") == "1"
+PRODUCT_CACHE_KEY_PREFIX = "products_cache"
+
+
+class _LoadCancelled(Exception):
+    # Transmis aux demandes en attente quand la requête qui portait le
+    # chargement est annulée : elles relancent le chargement elles-mêmes
+    pass
+
+
+class ProductCache:
+    # Cache en lecture des produits par utilisateur :
+    #   1. LRU locale bornée en nombre d'entrées, avec TTL
+    #   2. niveau Redis optionnel partagé entre les instances et les services
+    # Les chargements concurrents d'un même user_id sont dédupliqués (single-flight).
+    def __init__(self, max_entries: int = PRODUCT_CACHE_MAX_ENTRIES, ttl: float = PRODUCT_CACHE_TTL,
+                 redis_client=None, redis_ttl: int = PRODUCT_CACHE_REDIS_TTL,
+                 event_ttl: float = PRODUCT_CACHE_EVENT_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.base_ttl = ttl
+        self.event_ttl = event_ttl
+        self.event_driven = False
+        self.redis_client = redis_client if PRODUCT_CACHE_USE_REDIS else None
+        self.redis_ttl = redis_ttl
+        self.redis_enabled = False
+
+        self._entries = OrderedDict()
+        self._inflight = {}
+        # Génération par user_id, relevée avant chaque lecture (Redis ou chargement)
+        # et comparée avant d'écrire le résultat : une invalidation survenue
+        # entre-temps l'écarte. Bornée à max_entries ; une génération oubliée
+        # vaut _generation_floor, supérieure à toute génération déjà écartée, ce
+        # qui fait au pire rejeter une écriture valide.
+        self._generations = OrderedDict()
+        self._generation_clock = 0
+        self._generation_floor = 0
+        # Taille approximative : longueur JSON des listes de produits en cache
+        self.memory_bytes = 0
+
+        self.local_hits = 0
+        self.redis_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_stores = 0
+
+    def enable_redis(self, enabled: bool):
+        self.redis_enabled = enabled and self.redis_client is not None
+
+    @staticmethod
+    def redis_key(user_id) -> str:
+        return f"{PRODUCT_CACHE_KEY_PREFIX}:{user_id}"
+
+    async def get(self, user_id, loader_many):
+        return (await self.get_many([user_id], loader_many))[user_id]
+
+    async def get_many(self, user_ids, loader_many) -> dict:
+        # loader_many(ids) doit renvoyer {user_id: produits} pour tous les ids demandés
+        results = {}
+        missing = []
+        for user_id in dict.fromkeys(user_ids):
+            products = self._get_local(user_id)
+            if products is not None:
+                self.local_hits += 1
+                results[user_id] = products
+            else:
+                missing.append(user_id)
+
+        generations = {user_id: self.generation(user_id) for user_id in missing}
+        if missing and self.redis_enabled:
+            for user_id, products in (await self._get_redis(missing)).items():
+                self.redis_hits += 1
+                if self.generation(user_id) == generations[user_id]:
+                    self._set_local(user_id, products[0], products[1])
+                results[user_id] = products[0]
+            missing = [user_id for user_id in missing if user_id not in results]
+
+        # Single-flight : on attend les chargements déjà en cours pour ces ids
+        waiting = {}
+        to_load = []
+        for user_id in missing:
+            if user_id in self._inflight:
+                self.coalesced += 1
+                waiting[user_id] = self._inflight[user_id]
+            else:
+                to_load.append(user_id)
+
+        if to_load:
+            self.misses += len(to_load)
+            loop = asyncio.get_running_loop()
+            futures = {user_id: loop.create_future() for user_id in to_load}
+            self._inflight.update(futures)
+            try:
+                loaded = await loader_many(to_load)
+                for user_id in to_load:
+                    products = loaded.get(user_id, [])
+                    # Un résultat invalidé pendant son chargement n'est pas mis en cache
+                    await self.set(user_id, products, generations[user_id])
+                    futures[user_id].set_result(products)
+                    results[user_id] = products
+            except asyncio.CancelledError:
+                self._fail(futures, _LoadCancelled())
+                raise
+            except Exception as e:
+                self._fail(futures, e)
+                raise
+            finally:
+                for user_id in to_load:
+                    self._inflight.pop(user_id, None)
+
+        retry = []
+        for user_id, future in waiting.items():
+            try:
+                results[user_id] = await asyncio.shield(future)
+            except _LoadCancelled:
+                retry.append(user_id)
+        if retry:
+            results.update(await self.get_many(retry, loader_many))
+        return results
+
+    @staticmethod
+    def _fail(futures: dict, error: BaseException):
+        for future in futures.values():
+            if not future.done():
+                future.set_exception(error)
+                # Évite l'avertissement "exception never retrieved" sans attente
+                future.exception()
+
+    async def set(self, user_id, products: list, generation=None):
+        # generation : valeur de generation(user_id) relevée avant la lecture des
+        # produits ; l'écriture est abandonnée si la clé a été invalidée depuis
+        if generation is not None and self.generation(user_id) != generation:
+            self.stale_stores += 1
+            return
+        payload = dumps(products)
+        self._set_local(user_id, products, len(payload))
+        if self.redis_enabled:
+            key = self.redis_key(user_id)
+            try:
+                await self.redis_client.set(key, payload, ex=self.redis_ttl)
+                # Invalidation arrivée pendant l'écriture : son DELETE a pu passer
+                # avant notre SET, on retire la valeur périmée
+                if generation is not None and self.generation(user_id) != generation:
+                    self.stale_stores += 1
+                    await self.redis_client.delete(key)
+            except Exception as e:
+                logger.warning("Could not write product cache to Redis: %s", e)
+
+    def generation(self, user_id) -> int:
+        return self._generations.get(user_id, self._generation_floor)
+
+    async def invalidate(self, user_id):
+        await self.invalidate_many([user_id])
+
+    async def invalidate_many(self, user_ids):
+        # Niveaux local et Redis : après chaque écriture sur les produits de ces
+        # utilisateurs, et à chaque événement d'une autre instance. Le DELETE y
+        # est refait car un chargement lancé ici avant l'écriture a pu remettre
+        # l'ancienne valeur dans Redis après celui de l'instance qui a écrit.
+        self.invalidate_local(user_ids)
+        if self.redis_enabled and user_ids:
+            try:
+                await self.redis_client.delete(*(self.redis_key(user_id) for user_id in user_ids))
+            except Exception as e:
+                logger.warning("Could not invalidate product cache in Redis: %s", e)
+
+    def invalidate_local(self, user_ids):
+        # Niveau local seulement ; les chargements en cours pour ces ids ne
+        # seront pas mis en cache
+        for user_id in user_ids:
+            self._drop_local(user_id)
+            self._generation_clock += 1
+            self._generations.pop(user_id, None)
+            self._generations[user_id] = self._generation_clock
+        while len(self._generations) > self.max_entries:
+            _, forgotten = self._generations.popitem(last=False)
+            self._generation_floor = max(self._generation_floor, forgotten)
+        self.invalidations += len(user_ids)
+
+    def set_event_driven(self, enabled: bool):
+        # Abonné aux événements : TTL long. Abonnement perdu : des invalidations
+        # ont pu être manquées, le niveau local est vidé et le TTL court rétabli.
+        self.event_driven = enabled
+        self.ttl = self.event_ttl if enabled else self.base_ttl
+        if not enabled:
+            self.clear()
+
+    def clear(self):
+        # Invalide aussi les lectures en cours
+        self._generation_clock += 1
+        self._generation_floor = self._generation_clock
+        self._generations.clear()
+        self._entries.clear()
+        self.memory_bytes = 0
+
+    def _get_local(self, user_id):
+        entry = self._entries.get(user_id)
+        if entry is None:
+            return None
+        expires_at, products, _ = entry
+        if expires_at < time.monotonic():
+            self._drop_local(user_id)
+            return None
+        self._entries.move_to_end(user_id)
+        return products
+
+    def _set_local(self, user_id, products: list, size: int):
+        self._drop_local(user_id)
+        self._entries[user_id] = (time.monotonic() + self.ttl, products, size)
+        self.memory_bytes += size
+        while len(self._entries) > self.max_entries:
+            _, (_, _, evicted_size) = self._entries.popitem(last=False)
+            self.memory_bytes -= evicted_size
+            self.evictions += 1
+
+    def _drop_local(self, user_id):
+        entry = self._entries.pop(user_id, None)
+        if entry is not None:
+            self.memory_bytes -= entry[2]
+
+    async def _get_redis(self, user_ids) -> dict:
+        try:
+            payloads = await self.redis_client.mget([self.redis_key(user_id) for user_id in user_ids])
+        except Exception as e:
+            logger.warning("Could not read product cache from Redis: %s", e)
+            return {}
+        return {user_id: (loads(payload), len(payload))
+                for user_id, payload in zip(user_ids, payloads) if payload is not None}
+
+    def metrics(self) -> dict:
+        lookups = self.local_hits + self.redis_hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl,
+            "event_driven": self.event_driven,
+            "redis_tier": self.redis_enabled,
+            "memory_bytes": self.memory_bytes,
+            "local_hits": self.local_hits,
+            "redis_hits": self.redis_hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "stale_stores": self.stale_stores,
+            "hit_ratio": (self.local_hits + self.redis_hits + self.coalesced) / lookups if lookups else 0.0,
+        }
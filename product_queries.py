@@ -0,0 +1,187 @@
+import os
+import re
+from decimal import Decimal
+
+from serialization import fetch_rows
+
+# Colonnes de la table products pouvant être demandées via fields=
+PRODUCT_COLUMNS = ("id", "user_id", "name", "price", "description")
+
+# Taille de page par défaut et maximale pour la pagination par curseur
+PAGE_DEFAULT_LIMIT = int(os.getenv("PRODUCTS_PAGE_DEFAULT_LIMIT", "50"))
+PAGE_MAX_LIMIT = int(os.getenv("PRODUCTS_PAGE_MAX_LIMIT", "500"))
+
+# Colonnes explicites : la table contient aussi search_vector, qui n'est jamais renvoyé
+PRODUCT_SELECT_LIST = ", ".join(PRODUCT_COLUMNS)
+
+SELECT_PRODUCTS_BY_USERS = f"SELECT {PRODUCT_SELECT_LIST} FROM products WHERE user_id = ANY($1::int[])"
+
+# Recherche plein texte (migrations/products_db/0003_products_search.sql) : la
+# configuration doit être celle de la colonne générée search_vector
+SEARCH_CONFIG = "english"
+SEARCH_DEFAULT_LIMIT = int(os.getenv("PRODUCTS_SEARCH_DEFAULT_LIMIT", "20"))
+SEARCH_MAX_LIMIT = int(os.getenv("PRODUCTS_SEARCH_MAX_LIMIT", "100"))
+# Le coût d'une page croît avec offset (les lignes sautées sont classées quand même)
+SEARCH_MAX_OFFSET = int(os.getenv("PRODUCTS_SEARCH_MAX_OFFSET", "1000"))
+SEARCH_MAX_TERMS = 8
+# En dessous de 3 caractères, l'index trigramme ne filtre rien : pas de
+# recherche à l'intérieur des mots
+SEARCH_MIN_INFIX_LENGTH = 3
+
+# Agrégats par utilisateur tenus à jour par trigger (migrations/products_db/0004) :
+# (colonne, borne basse incluse, borne haute exclue), mêmes tranches que la migration
+PRICE_BUCKETS = (
+    ("price_lt_10", 0, 10),
+    ("price_10_50", 10, 50),
+    ("price_50_100", 50, 100),
+    ("price_100_500", 100, 500),
+    ("price_500_1000", 500, 1000),
+    ("price_gte_1000", 1000, None),
+)
+_STATS_COLUMNS = ", ".join(["user_id", "product_count", "priced_count", "total_price"]
+                           + [column for column, _, _ in PRICE_BUCKETS] + ["updated_at"])
+SELECT_USER_PRODUCT_STATS = f"SELECT {_STATS_COLUMNS} FROM user_product_stats WHERE user_id = $1"
+SELECT_USERS_PRODUCT_STATS = f"SELECT {_STATS_COLUMNS} FROM user_product_stats WHERE user_id = ANY($1::int[])"
+
+# Nombre de lignes lues par aller-retour du curseur serveur pendant un export
+EXPORT_PREFETCH = int(os.getenv("PRODUCTS_EXPORT_PREFETCH", "1000"))
+
+
+def parse_fields(fields) -> list:
+    # Transforme "name,price" en liste de colonnes validées ; "id" est toujours
+    # inclus car il sert de curseur de pagination
+    if not fields:
+        return list(PRODUCT_COLUMNS)
+    requested = [f.strip() for f in fields.split(",") if f.strip()]
+    unknown = [f for f in requested if f not in PRODUCT_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown product fields: {', '.join(unknown)}")
+    return ["id"] + [f for f in dict.fromkeys(requested) if f != "id"]
+
+
+def clamp_limit(limit) -> int:
+    if limit is None:
+        return PAGE_DEFAULT_LIMIT
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    return min(limit, PAGE_MAX_LIMIT)
+
+
+def build_page_query(columns: list) -> str:
+    # Pagination par clé (keyset) sur id : le coût dépend de la taille de la
+    # page et non du nombre total de produits de l'utilisateur. On lit une
+    # ligne de plus que la limite pour savoir s'il reste une page suivante.
+    # Les colonnes viennent de parse_fields, donc d'une liste blanche.
+    return (f"SELECT {', '.join(columns)} FROM products "
+            f"WHERE user_id = $1 AND id > $2 ORDER BY id LIMIT $3")
+
+
+async def fetch_products_page(conn, user_id: int, limit: int, cursor, columns: list):
+    rows = await fetch_rows(conn, build_page_query(columns), user_id, cursor or 0, limit + 1)
+    next_cursor = rows[limit - 1]["id"] if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def build_export_query(by_user: bool, max_rows=None) -> str:
+    # Export complet trié par id, lu via un curseur côté serveur
+    query = f"SELECT {PRODUCT_SELECT_LIST} FROM products"
+    if by_user:
+        query += " WHERE user_id = $1"
+    query += " ORDER BY id"
+    if max_rows is not None:
+        query += f" LIMIT {int(max_rows)}"
+    return query
+
+
+def search_terms(q) -> list:
+    # Mots de la requête en minuscules ; la ponctuation est ignorée, ce qui
+    # rend la construction du tsquery sûre
+    terms = re.findall(r"\w+", (q or "").lower())[:SEARCH_MAX_TERMS]
+    if not terms:
+        raise ValueError("q must contain at least one word")
+    return terms
+
+
+def prefix_tsquery(terms: list) -> str:
+    # Tous les mots doivent correspondre, le dernier comme les autres en préfixe
+    # ("wire head" trouve "Wireless Headphones")
+    return " & ".join(f"{term}:*" for term in terms)
+
+
+def infix_pattern(q: str):
+    # Motif ILIKE pour trouver les mots contenus dans un nom ("phone" dans
+    # "Smartphone"), servi par l'index trigramme ; None si trop court
+    q = " ".join(q.split())
+    if len(q) < SEARCH_MIN_INFIX_LENGTH:
+        return None
+    escaped = q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def check_search_page(limit, offset) -> tuple:
+    limit = SEARCH_DEFAULT_LIMIT if limit is None else limit
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    offset = offset or 0
+    if offset < 0:
+        raise ValueError("offset must not be negative")
+    if offset > SEARCH_MAX_OFFSET:
+        raise ValueError(f"offset must be at most {SEARCH_MAX_OFFSET}")
+    return min(limit, SEARCH_MAX_LIMIT), offset
+
+
+def build_search_query(columns: list, infix: bool, min_price: bool, max_price: bool) -> str:
+    # $1 tsquery, $2 limite (+1 pour savoir s'il reste une page), $3 offset,
+    # puis les paramètres optionnels dans l'ordre motif, prix min, prix max.
+    # Une requête par combinaison de filtres plutôt que des "$n IS NULL OR ..." :
+    # chaque variante garde un plan qui utilise les index GIN.
+    match = "p.search_vector @@ query"
+    conditions = []
+    params = 3
+    if infix:
+        params += 1
+        match = f"({match} OR p.name ILIKE ${params})"
+    if min_price:
+        params += 1
+        conditions.append(f"p.price >= ${params}")
+    if max_price:
+        params += 1
+        conditions.append(f"p.price <= ${params}")
+    where = " AND ".join([match] + conditions)
+    select = ", ".join(f"p.{column}" for column in columns)
+    return (f"SELECT {select}, ts_rank_cd(p.search_vector, query, 32) AS rank "
+            f"FROM products p, to_tsquery('{SEARCH_CONFIG}', $1) AS query "
+            f"WHERE {where} ORDER BY rank DESC, p.id LIMIT $2 OFFSET $3")
+
+
+async def search_products(conn, q: str, limit: int, offset: int, columns: list, min_price=None, max_price=None):
+    # Renvoie (produits classés, offset de la page suivante ou None)
+    pattern = infix_pattern(q)
+    query = build_search_query(columns, pattern is not None, min_price is not None, max_price is not None)
+    args = [prefix_tsquery(search_terms(q)), limit + 1, offset]
+    args += [value for value in (pattern, min_price, max_price) if value is not None]
+    rows = await fetch_rows(conn, query, *args)
+    next_offset = offset + limit if len(rows) > limit else None
+    return rows[:limit], next_offset
+
+
+def build_products_by_ids_query(columns: list) -> str:
+    # Lecture par clé primaire des produits classés par l'index en mémoire
+    return f"SELECT {', '.join(columns)} FROM products WHERE id = ANY($1::int[])"
+
+
+def product_aggregates(user_id: int, stats) -> dict:
+    # Réponse de /products/{user_id}/aggregates à partir d'une ligne de
+    # user_product_stats (None : utilisateur sans produit)
+    stats = stats or {}
+    priced = stats.get("priced_count", 0)
+    total = stats.get("total_price", Decimal("0.00"))
+    return {
+        "user_id": user_id,
+        "product_count": stats.get("product_count", 0),
+        "total_price": total,
+        "average_price": (total / priced).quantize(Decimal("0.01")) if priced else None,
+        "price_buckets": [{"min": low, "max": high, "count": stats.get(column, 0)}
+                          for column, low, high in PRICE_BUCKETS],
+        "updated_at": stats.get("updated_at"),
+    }
\ No newline at end of file
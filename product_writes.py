@@ -0,0 +1,80 @@
+import os
+
+# Taille maximale d'un lot d'écritures (création, mise à jour ou suppression)
+BULK_MAX_ITEMS = int(os.getenv("PRODUCTS_BULK_MAX_ITEMS", "10000"))
+# À partir de cette taille, les lignes sont envoyées par COPY ; en dessous,
+# en tableaux dans une seule instruction (unnest). Jamais une instruction par
+# ligne : chacune déclencherait les triggers de user_product_stats.
+BULK_COPY_THRESHOLD = int(os.getenv("PRODUCTS_BULK_COPY_THRESHOLD", "1000"))
+
+WRITE_COLUMNS = ("id", "user_id", "name", "price", "description")
+
+# Identifiants réservés d'avance : l'ordre des ids renvoyés est celui du lot,
+# et COPY peut écrire directement dans products
+ALLOCATE_IDS = "SELECT nextval(pg_get_serial_sequence('products', 'id')) FROM generate_series(1, $1)"
+INSERT_FROM_ARRAYS = ("INSERT INTO products (id, user_id, name, price, description) "
+                      "SELECT * FROM unnest($1::int[], $2::int[], $3::text[], $4::numeric[], $5::text[])")
+
+# Verrouille les lignes visées (dans l'ordre des ids, contre les interblocages)
+# et donne leur propriétaire actuel, touché lui aussi si le produit change d'utilisateur
+LOCK_PRODUCTS = "SELECT id, user_id FROM products WHERE id = ANY($1::int[]) ORDER BY id FOR UPDATE"
+
+# Mise à jour partielle : un champ NULL garde sa valeur ; description peut être
+# remise à NULL, d'où l'indicateur set_description
+UPDATE_COLUMNS = ("id", "user_id", "name", "price", "set_description", "description")
+UPDATE_TEMP_TABLE = ("CREATE TEMP TABLE products_update (id int, user_id int, name text, price numeric, "
+                     "set_description bool, description text) ON COMMIT DROP")
+_UPDATE = ("UPDATE products p SET user_id = COALESCE(u.user_id, p.user_id), name = COALESCE(u.name, p.name), "
+           "price = COALESCE(u.price, p.price), "
+           "description = CASE WHEN u.set_description THEN u.description ELSE p.description END "
+           "FROM {source} WHERE p.id = u.id")
+UPDATE_FROM_ARRAYS = _UPDATE.format(
+    source="unnest($1::int[], $2::int[], $3::text[], $4::numeric[], $5::bool[], $6::text[]) "
+           "AS u(id, user_id, name, price, set_description, description)")
+UPDATE_FROM_TEMP_TABLE = _UPDATE.format(source="products_update u")
+
+DELETE_PRODUCTS = "DELETE FROM products WHERE id = ANY($1::int[]) RETURNING id, user_id"
+
+
+def check_batch_ids(ids: list):
+    if len(set(ids)) != len(ids):
+        raise ValueError("Each product id may appear only once per batch")
+
+
+async def create_products(conn, products: list) -> tuple:
+    # products : dicts user_id, name, price, description ; à appeler dans une
+    # transaction. Renvoie (résultat, utilisateurs touchés).
+    ids = [row[0] for row in await conn.fetch(ALLOCATE_IDS, len(products))]
+    rows = [(product_id, p["user_id"], p["name"], p["price"], p.get("description"))
+            for product_id, p in zip(ids, products)]
+    if len(rows) >= BULK_COPY_THRESHOLD:
+        await conn.copy_records_to_table("products", records=rows, columns=WRITE_COLUMNS)
+    elif rows:
+        await conn.execute(INSERT_FROM_ARRAYS, *(list(column) for column in zip(*rows)))
+    return {"created": len(ids), "ids": ids}, sorted({p["user_id"] for p in products})
+
+
+async def update_products(conn, updates: list) -> tuple:
+    # updates : dicts avec id et les seuls champs à modifier
+    ids = [u["id"] for u in updates]
+    check_batch_ids(ids)
+    owners = {row["id"]: row["user_id"] for row in await conn.fetch(LOCK_PRODUCTS, ids)}
+    rows = [(u["id"], u.get("user_id"), u.get("name"), u.get("price"), "description" in u, u.get("description"))
+            for u in updates if u["id"] in owners]
+    if len(rows) >= BULK_COPY_THRESHOLD:
+        await conn.execute(UPDATE_TEMP_TABLE)
+        await conn.copy_records_to_table("products_update", records=rows, columns=UPDATE_COLUMNS)
+        await conn.execute(UPDATE_FROM_TEMP_TABLE)
+    elif rows:
+        await conn.execute(UPDATE_FROM_ARRAYS, *(list(column) for column in zip(*rows)))
+    user_ids = set(owners.values()) | {row[1] for row in rows if row[1] is not None}
+    not_found = [product_id for product_id in ids if product_id not in owners]
+    return {"updated": len(rows), "not_found": not_found}, sorted(user_ids)
+
+
+async def delete_products(conn, ids: list) -> tuple:
+    check_batch_ids(ids)
+    deleted = await conn.fetch(DELETE_PRODUCTS, ids)
+    deleted_ids = {row["id"] for row in deleted}
+    not_found = [product_id for product_id in ids if product_id not in deleted_ids]
+    return {"deleted": len(deleted), "not_found": not_found}, sorted({row["user_id"] for row in deleted})
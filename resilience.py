@@ -0,0 +1,254 @@
+import asyncio
+import contextvars
+import logging
+import os
+import time
+
+from starlette.responses import JSONResponse
+from starlette.routing import Match
+
+from metrics import set_gauges, set_route_gauges
+
+logger = logging.getLogger(__name__)
+
+# Disjoncteurs : nombre d'échecs consécutifs avant ouverture, durée d'ouverture
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", "5"))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", "10"))
+
+# Contrôle d'admission : requêtes simultanées maximales par modèle de route,
+# par défaut et par route : ADMISSION_LIMITS="/api/users/{user_id}=200,/users/{user_id}=300"
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "500"))
+ADMISSION_LIMITS = os.getenv("ADMISSION_LIMITS", "")
+# Valeur de Retry-After (secondes) des réponses 503 de délestage
+RETRY_AFTER = int(os.getenv("RETRY_AFTER_SECONDS", "1"))
+
+# Échéance de la requête (horodatage Unix, secondes) transmise de service en service
+DEADLINE_HEADER = "X-Request-Deadline"
+
+# Échéance de la requête en cours (None : pas d'échéance)
+_deadline = contextvars.ContextVar("deadline", default=None)
+
+
+class CircuitOpenError(Exception):
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit breaker '{name}' is open")
+        self.name = name
+        self.retry_after = retry_after
+
+
+class Overloaded(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # closed : les appels passent et les échecs consécutifs sont comptés
+    # open : les appels échouent immédiatement pendant reset_timeout secondes
+    # half_open : un seul appel d'essai ; succès -> closed, échec -> open
+    def __init__(self, name: str, failure_threshold: int = BREAKER_FAILURE_THRESHOLD,
+                 reset_timeout: float = BREAKER_RESET_TIMEOUT):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self._probe_started = None
+
+        self.rejected = 0
+        self.opened = 0
+
+    def check(self):
+        # À appeler avant l'appel ; lève CircuitOpenError si l'appel ne doit pas partir
+        if self.state == "closed":
+            return
+        remaining = self.opened_at + self.reset_timeout - time.monotonic()
+        if self.state == "open" and remaining <= 0:
+            self.state = "half_open"
+        # Un appel d'essai à la fois ; un essai sans issue connue (annulé) est
+        # remplacé après reset_timeout
+        now = time.monotonic()
+        if self.state == "half_open" and (self._probe_started is None
+                                          or now - self._probe_started > self.reset_timeout):
+            self._probe_started = now
+            return
+        self.rejected += 1
+        raise CircuitOpenError(self.name, max(remaining, 0.0) or self.reset_timeout)
+
+    def record_success(self):
+        if self.state != "closed":
+            logger.info("Circuit breaker '%s' closed", self.name)
+        self.state = "closed"
+        self.failures = 0
+        self._probe_started = None
+
+    def record_failure(self):
+        self.failures += 1
+        self._probe_started = None
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened += 1
+                logger.warning("Circuit breaker '%s' opened after %s failures", self.name, self.failures)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def metrics(self) -> dict:
+        return {
+            "state": self.state,
+            "open": self.state != "closed",
+            "consecutive_failures": self.failures,
+            "times_opened": self.opened,
+            "rejected": self.rejected,
+        }
+
+
+def parse_limits(spec: str) -> dict:
+    limits = {}
+    for item in spec.split(","):
+        if "=" in item:
+            route, limit = item.rsplit("=", 1)
+            limits[route.strip()] = int(limit)
+    return limits
+
+
+def overloaded_response(detail: str, retry_after: float = RETRY_AFTER) -> JSONResponse:
+    return JSONResponse({"detail": detail}, status_code=503,
+                        headers={"Retry-After": str(max(1, int(retry_after + 0.999)))})
+
+
+class AdmissionController:
+    # Compte les requêtes en cours par modèle de route ; au-delà de la limite,
+    # le middleware répond 503 + Retry-After sans exécuter le handler.
+    # Gère aussi l'échéance : reprise de X-Request-Deadline, ou fixée à
+    # default_timeout secondes pour les requêtes qui n'en ont pas.
+    def __init__(self, default_limit: int = ADMISSION_MAX_IN_FLIGHT, limits=None, default_timeout=None):
+        self.default_limit = default_limit
+        self.limits = parse_limits(ADMISSION_LIMITS) if limits is None else limits
+        self.default_timeout = default_timeout
+        self.in_flight = {}
+        self.rejected = {}
+        self.expired = 0
+
+    def metrics(self) -> dict:
+        return {
+            "in_flight": dict(self.in_flight),
+            "rejected": dict(self.rejected),
+            "expired_on_arrival": self.expired,
+        }
+
+
+class AdmissionControlMiddleware:
+    # Middleware ASGI pur (pas de tâche supplémentaire par requête)
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    @staticmethod
+    def _route(scope):
+        for route in scope["app"].router.routes:
+            match, _ = route.matches(scope)
+            if match == Match.FULL:
+                return getattr(route, "path", None)
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        controller = self.controller
+
+        deadline = parse_deadline(dict(scope["headers"]).get(DEADLINE_HEADER.lower().encode()))
+        if deadline is None and controller.default_timeout:
+            deadline = time.time() + controller.default_timeout
+        if deadline is not None and deadline <= time.time():
+            # L'appelant a déjà abandonné : inutile de commencer le travail
+            controller.expired += 1
+            await JSONResponse({"detail": "Request deadline exceeded"}, status_code=504)(scope, receive, send)
+            return
+
+        route = self._route(scope)
+        if route is not None:
+            current = controller.in_flight.get(route, 0)
+            if current >= controller.limits.get(route, controller.default_limit):
+                controller.rejected[route] = controller.rejected.get(route, 0) + 1
+                await overloaded_response("Too many concurrent requests")(scope, receive, send)
+                return
+            controller.in_flight[route] = current + 1
+
+        token = _deadline.set(deadline)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            _deadline.reset(token)
+            if route is not None:
+                controller.in_flight[route] -= 1
+
+
+def parse_deadline(value):
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def current_deadline():
+    return _deadline.get()
+
+
+def remaining_time(default: float) -> float:
+    # Temps restant avant l'échéance, borné par default ; lève
+    # asyncio.TimeoutError si l'appelant a déjà abandonné
+    deadline = _deadline.get()
+    if deadline is None:
+        return default
+    remaining = deadline - time.time()
+    if remaining <= 0:
+        raise asyncio.TimeoutError("Request deadline exceeded")
+    return min(default, remaining)
+
+
+def deadline_headers() -> dict:
+    deadline = _deadline.get()
+    return {DEADLINE_HEADER: f"{deadline:.3f}"} if deadline is not None else {}
+
+
+class QueueDepthGuard:
+    # Refuse le travail quand la file Redis (ListQueue ou StreamQueue) dépasse
+    # max_depth. La profondeur est relue au plus une fois par refresh_interval
+    # pour ne pas ajouter un aller-retour Redis à chaque requête.
+    def __init__(self, queue, max_depth: int, refresh_interval: float = 0.1):
+        self.queue = queue
+        self.max_depth = max_depth
+        self.refresh_interval = refresh_interval
+        self.depth = 0
+        self._checked_at = 0.0
+        self.shed = 0
+
+    async def check(self):
+        if self.max_depth <= 0:
+            return
+        now = time.monotonic()
+        if now - self._checked_at >= self.refresh_interval:
+            self._checked_at = now
+            try:
+                self.depth = await self.queue.depth()
+            except Exception as e:
+                logger.warning("Could not read depth of '%s': %s", self.queue.name, e)
+        if self.depth > self.max_depth:
+            self.shed += 1
+            raise Overloaded(f"Queue '{self.queue.name}' is too deep ({self.depth} > {self.max_depth})")
+
+    def metrics(self) -> dict:
+        return {"queue": self.queue.name, "depth": self.depth, "max_depth": self.max_depth, "shed": self.shed}
+
+
+def publish_metrics(admission: AdmissionController, breakers=(), guard=None):
+    # Recopie l'état courant dans le registre avant un rendu de /metrics
+    set_route_gauges("admission_in_flight", "Requests in flight per route", admission.in_flight)
+    set_route_gauges("admission_rejected", "Requests rejected by admission control per route", admission.rejected)
+    set_gauges("admission", {"expired_on_arrival": admission.expired})
+    for breaker in breakers:
+        set_gauges("circuit_breaker", breaker.metrics(), upstream=breaker.name)
+    if guard is not None:
+        set_gauges("queue_guard", {"max_depth": guard.max_depth, "shed": guard.shed})
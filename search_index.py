@@ -0,0 +1,187 @@
+import heapq
+import logging
+import math
+import os
+import re
+import time
+from bisect import bisect_left, insort
+
+from product_queries import search_terms
+
+logger = logging.getLogger(__name__)
+
+# Moteur de /products/search :
+#   postgres : index GIN plein texte et trigramme (migrations/products_db/0003)
+#   memory   : index inversé en mémoire dans chaque processus, chargé au
+#              démarrage puis tenu à jour par utilisateur ; PostgreSQL reste
+#              utilisé tant que le chargement n'est pas terminé
+SEARCH_BACKEND = os.getenv("PRODUCTS_SEARCH_BACKEND", "postgres")
+# Nombre maximal de mots de l'index pris en compte pour un préfixe de la
+# requête ("1" peut correspondre à des centaines de milliers de mots)
+SEARCH_INDEX_MAX_EXPANSIONS = int(os.getenv("SEARCH_INDEX_MAX_EXPANSIONS", "1000"))
+# Lignes lues par aller-retour du curseur pendant le chargement
+SEARCH_INDEX_PREFETCH = int(os.getenv("SEARCH_INDEX_PREFETCH", "5000"))
+
+# Poids d'un mot selon le champ où il apparaît (comme setweight A / B)
+NAME_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+# Un mot de l'index qui ne fait que commencer par le mot cherché compte moins
+PREFIX_MATCH_FACTOR = 0.7
+
+LOAD_QUERY = "SELECT id, user_id, name, price, description FROM products"
+
+
+def tokenize(text) -> list:
+    return re.findall(r"\w+", text.lower()) if text else []
+
+
+class SearchIndex:
+    # Index inversé mot -> {product_id: poids}. Seuls l'identifiant, le
+    # propriétaire, le prix et les mots de chaque produit sont gardés ; les
+    # lignes renvoyées sont relues dans PostgreSQL par clé primaire.
+    def __init__(self):
+        self._postings = {}
+        # product_id -> (user_id, prix, mots)
+        self._docs = {}
+        self._by_user = {}
+        # Liste triée des mots pour la recherche par préfixe, construite à la
+        # première recherche puis tenue à jour mot par mot
+        self._sorted_terms = None
+
+        self.ready = False
+        self.loading = False
+        self._touched_while_loading = set()
+        self.load_seconds = None
+
+        self.queries = 0
+        self.updates = 0
+
+    def add(self, product: dict):
+        product_id = product["id"]
+        if product_id in self._docs:
+            self.remove(product_id)
+        weights = {}
+        for term in tokenize(product.get("name")):
+            weights[term] = weights.get(term, 0.0) + NAME_WEIGHT
+        for term in tokenize(product.get("description")):
+            weights[term] = weights.get(term, 0.0) + DESCRIPTION_WEIGHT
+        for term, weight in weights.items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = {}
+                if self._sorted_terms is not None:
+                    insort(self._sorted_terms, term)
+            postings[product_id] = weight
+        user_id = product["user_id"]
+        price = float(product["price"]) if product.get("price") is not None else None
+        self._docs[product_id] = (user_id, price, tuple(weights))
+        self._by_user.setdefault(user_id, set()).add(product_id)
+
+    def remove(self, product_id):
+        doc = self._docs.pop(product_id, None)
+        if doc is None:
+            return
+        user_id, _, terms = doc
+        for term in terms:
+            postings = self._postings[term]
+            del postings[product_id]
+            if not postings:
+                del self._postings[term]
+                if self._sorted_terms is not None:
+                    del self._sorted_terms[bisect_left(self._sorted_terms, term)]
+        owned = self._by_user.get(user_id)
+        if owned is not None:
+            owned.discard(product_id)
+            if not owned:
+                del self._by_user[user_id]
+
+    def replace_users(self, products_by_user: dict):
+        # Mise à jour incrémentale : les produits de ces utilisateurs sont
+        # remplacés par ceux fournis ({user_id: produits}, liste vide si aucun)
+        for user_id, products in products_by_user.items():
+            for product_id in list(self._by_user.get(user_id, ())):
+                self.remove(product_id)
+            for product in products:
+                self.add(product)
+        if self.loading:
+            self._touched_while_loading.update(products_by_user)
+        self.updates += len(products_by_user)
+
+    async def load(self, conn) -> set:
+        # Chargement complet depuis un instantané cohérent de la table. Renvoie
+        # les utilisateurs mis à jour pendant le chargement : le curseur a pu
+        # réécrire leurs anciens produits, l'appelant doit les relire.
+        started = time.perf_counter()
+        self.loading = True
+        self._touched_while_loading = set()
+        try:
+            async with conn.transaction(isolation="repeatable_read", readonly=True):
+                async for row in conn.cursor(LOAD_QUERY, prefetch=SEARCH_INDEX_PREFETCH):
+                    self.add(row)
+        finally:
+            self.loading = False
+        self.load_seconds = time.perf_counter() - started
+        self.ready = True
+        logger.info("Search index loaded: %s products, %s terms in %.1f s",
+                    len(self._docs), len(self._postings), self.load_seconds)
+        touched, self._touched_while_loading = self._touched_while_loading, set()
+        return touched
+
+    def _expand(self, prefix: str) -> list:
+        if self._sorted_terms is None:
+            self._sorted_terms = sorted(self._postings)
+        terms = self._sorted_terms
+        matches = []
+        i = bisect_left(terms, prefix)
+        while i < len(terms) and terms[i].startswith(prefix) and len(matches) < SEARCH_INDEX_MAX_EXPANSIONS:
+            matches.append(terms[i])
+            i += 1
+        return matches
+
+    def search(self, q: str, limit: int, offset: int, min_price=None, max_price=None) -> tuple:
+        # Comme la requête SQL, tous les mots doivent correspondre, chacun en
+        # préfixe ; mais sans racinisation ni recherche à l'intérieur des mots.
+        # Score : somme des poids x idf.
+        # Renvoie ([(product_id, score)], offset de la page suivante ou None).
+        self.queries += 1
+        total = len(self._docs) or 1
+        scores = None
+        for query_term in search_terms(q):
+            matches = {}
+            for term in self._expand(query_term):
+                postings = self._postings[term]
+                idf = math.log(1.0 + total / len(postings))
+                factor = 1.0 if term == query_term else PREFIX_MATCH_FACTOR
+                for product_id, weight in postings.items():
+                    score = weight * idf * factor
+                    if score > matches.get(product_id, 0.0):
+                        matches[product_id] = score
+            if scores is None:
+                scores = matches
+            else:
+                scores = {product_id: score + matches[product_id]
+                          for product_id, score in scores.items() if product_id in matches}
+            if not scores:
+                return [], None
+
+        if min_price is not None or max_price is not None:
+            low = float(min_price) if min_price is not None else -math.inf
+            high = float(max_price) if max_price is not None else math.inf
+            scores = {product_id: score for product_id, score in scores.items()
+                      if self._docs[product_id][1] is not None and low <= self._docs[product_id][1] <= high}
+
+        # Seules les offset + limit + 1 meilleures correspondances sont triées
+        top = heapq.nsmallest(offset + limit + 1, scores.items(), key=lambda item: (-item[1], item[0]))
+        next_offset = offset + limit if len(top) > offset + limit else None
+        return top[offset:offset + limit], next_offset
+
+    def metrics(self) -> dict:
+        return {
+            "ready": self.ready,
+            "loading": self.loading,
+            "documents": len(self._docs),
+            "terms": len(self._postings),
+            "load_seconds": self.load_seconds,
+            "queries": self.queries,
+            "updates": self.updates,
+        }
@@ -0,0 +1,153 @@
+import argparse
+import asyncio
+import logging
+import random
+import time
+from decimal import Decimal
+from itertools import islice
+
+import asyncpg
+
+from init_db import PRODUCTS_DB_URL, USERS_DB_URL, init_products_db, init_users_db
+
+# Configuration du logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Nombre de lignes envoyées par COPY : borne la mémoire et rythme les mesures
+COPY_CHUNK_ROWS = 50000
+
+# Vocabulaire des noms et descriptions générés
+ADJECTIVES = ["Compact", "Wireless", "Smart", "Portable", "Premium", "Classic", "Ultra", "Eco",
+              "Pro", "Mini", "Rugged", "Silent", "Digital", "Vintage", "Modular", "Solar"]
+NOUNS = ["Laptop", "Smartphone", "Tablet", "Headphones", "Smartwatch", "Camera", "Speaker",
+         "Keyboard", "Monitor", "Router", "Charger", "Drone", "Printer", "Backpack", "Lamp", "Mouse"]
+FEATURES = ["long battery life", "fast charging", "noise cancelling", "water resistant",
+            "lightweight design", "high resolution", "bluetooth", "fitness tracking",
+            "touch screen", "metal body", "two year warranty", "energy efficient"]
+DESCRIPTIONS = [f"{a.capitalize()}, {b}" for a in FEATURES for b in FEATURES if a != b]
+
+
+def owner_ids(rng: random.Random, max_user_id: int, skew: float):
+    # Propriétaire de chaque produit tiré selon une loi de puissance (approximation
+    # continue de Zipf, en mémoire constante) : l'utilisateur de rang k reçoit
+    # environ k^-skew produits. skew=0 donne une répartition uniforme.
+    if skew == 1.0:
+        while True:
+            yield min(max_user_id, int((max_user_id + 1) ** rng.random()))
+    exponent = 1.0 - skew
+    top = (max_user_id + 1) ** exponent - 1.0
+    while True:
+        yield min(max_user_id, max(1, int((top * rng.random() + 1.0) ** (1.0 / exponent))))
+
+
+def generate_users(first_id: int, count: int):
+    for user_id in range(first_id, first_id + count):
+        yield (user_id, f"User {user_id}", f"user{user_id}@example.com")
+
+
+def generate_products(rng: random.Random, first_id: int, count: int, max_user_id: int, skew: float):
+    owners = owner_ids(rng, max_user_id, skew)
+    for product_id in range(first_id, first_id + count):
+        name = f"{rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} {product_id}"
+        price = Decimal(rng.randint(100, 300000)) / 100
+        yield (product_id, next(owners), name, price, rng.choice(DESCRIPTIONS))
+
+
+async def next_id(conn, table: str) -> int:
+    return await conn.fetchval(f"SELECT COALESCE(MAX(id), 0) + 1 FROM {table}")
+
+
+async def copy_rows(conn, table: str, columns, rows, total: int) -> float:
+    # Les lignes sont lues par tranches depuis le générateur : une seule tranche
+    # en mémoire à la fois, quelle que soit la volumétrie
+    started = time.perf_counter()
+    loaded = 0
+    while True:
+        chunk = list(islice(rows, COPY_CHUNK_ROWS))
+        if not chunk:
+            break
+        await conn.copy_records_to_table(table, records=chunk, columns=columns)
+        loaded += len(chunk)
+        elapsed = time.perf_counter() - started
+        logger.info("%s: %s/%s rows (%.0f rows/s)", table, loaded, total, loaded / elapsed)
+    elapsed = time.perf_counter() - started
+
+    # Les ids sont fournis explicitement : on recale la séquence SERIAL
+    await conn.execute(f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                       f"(SELECT COALESCE(MAX(id), 1) FROM {table}))")
+    await conn.execute(f"ANALYZE {table}")
+    return elapsed
+
+
+async def seed_users(count: int, first_id: int) -> tuple:
+    conn = await asyncpg.connect(USERS_DB_URL)
+    try:
+        elapsed = await copy_rows(conn, "users", ("id", "name", "email"),
+                                  generate_users(first_id, count), count)
+    finally:
+        await conn.close()
+    return "users", count, elapsed
+
+
+async def seed_products(count: int, max_user_id: int, skew: float, seed: int) -> tuple:
+    conn = await asyncpg.connect(PRODUCTS_DB_URL)
+    try:
+        rows = generate_products(random.Random(seed), await next_id(conn, "products"), count, max_user_id, skew)
+        elapsed = await copy_rows(conn, "products", ("id", "user_id", "name", "price", "description"),
+                                  rows, count)
+    finally:
+        await conn.close()
+    return "products", count, elapsed
+
+
+async def main(users: int, products: int, skew: float, seed: int, truncate: bool):
+    # Schéma et données de démonstration d'abord (migrations comprises)
+    await init_users_db()
+    await init_products_db()
+
+    if truncate:
+        for dsn, table in ((USERS_DB_URL, "users"), (PRODUCTS_DB_URL, "products")):
+            conn = await asyncpg.connect(dsn)
+            try:
+                await conn.execute(f"TRUNCATE {table} RESTART IDENTITY")
+            finally:
+                await conn.close()
+
+    # Les produits référencent les utilisateurs existants et ceux qui vont être créés
+    conn = await asyncpg.connect(USERS_DB_URL)
+    try:
+        first_user_id = await next_id(conn, "users")
+    finally:
+        await conn.close()
+    max_user_id = first_user_id + users - 1
+    if products and max_user_id < 1:
+        raise SystemExit("No users to own the products: use --users")
+
+    # Les deux bases sont chargées en parallèle, chacune sur sa connexion
+    started = time.perf_counter()
+    tasks = []
+    if users:
+        tasks.append(seed_users(users, first_user_id))
+    if products:
+        tasks.append(seed_products(products, max_user_id, skew, seed))
+    results = await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    print(f"\n{'table':<10} {'rows':>12} {'seconds':>9} {'rows/s':>12}")
+    for table, count, seconds in results:
+        print(f"{table:<10} {count:>12} {seconds:>9.2f} {count / seconds if seconds else 0:>12.0f}")
+    total = sum(count for _, count, _ in results)
+    print(f"{'total':<10} {total:>12} {elapsed:>9.2f} {total / elapsed if elapsed else 0:>12.0f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk load generated users and products with COPY")
+    parser.add_argument("--users", type=int, default=100000, help="users to create")
+    parser.add_argument("--products", type=int, default=1000000, help="products to create")
+    parser.add_argument("--skew", type=float, default=1.0,
+                        help="power-law exponent of products per user (0 = uniform)")
+    parser.add_argument("--seed", type=int, default=42, help="random seed for reproducible data")
+    parser.add_argument("--truncate", action="store_true", help="empty both tables before loading")
+    args = parser.parse_args()
+    asyncio.run(main(args.users, args.products, args.skew, args.seed, args.truncate))
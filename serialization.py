@@ -0,0 +1,113 @@
+import json
+import os
+from decimal import Decimal
+
+from starlette.responses import Response
+
+# Backend JSON rapide optionnel : orjson s'il est installé, sinon json standard
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+JSON_BACKEND = os.getenv("JSON_BACKEND", "orjson" if orjson is not None else "json")
+if JSON_BACKEND == "orjson" and orjson is None:
+    JSON_BACKEND = "json"
+
+
+def _default(value):
+    # Les Decimal (prix) sont écrits en chaîne pour conserver la valeur exacte
+    if isinstance(value, Decimal):
+        return str(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+if JSON_BACKEND == "orjson":
+    def dumps(obj) -> bytes:
+        return orjson.dumps(obj, default=_default)
+
+    loads = orjson.loads
+else:
+    def dumps(obj) -> bytes:
+        return json.dumps(obj, default=_default, separators=(",", ":")).encode()
+
+    loads = json.loads
+
+
+def _to_str(value):
+    return str(value)
+
+
+def _to_isoformat(value):
+    return value.isoformat()
+
+
+# Convertisseurs par type PostgreSQL (nom du type asyncpg) ; les types absents
+# sont déjà des valeurs JSON natives (int, str, bool, float) et passent tels quels
+TYPE_CONVERTERS = {
+    "numeric": _to_str,
+    "money": _to_str,
+    "uuid": _to_str,
+    "date": _to_isoformat,
+    "time": _to_isoformat,
+    "timetz": _to_isoformat,
+    "timestamp": _to_isoformat,
+    "timestamptz": _to_isoformat,
+    "interval": _to_str,
+}
+
+
+class RowSerializer:
+    # Précompile, pour une requête donnée, la liste des colonnes et le
+    # convertisseur de chacune d'elles à partir des types renvoyés par PostgreSQL
+    def __init__(self, columns):
+        self.names = tuple(name for name, _ in columns)
+        self.converters = tuple((index, TYPE_CONVERTERS[type_name])
+                                for index, (_, type_name) in enumerate(columns)
+                                if type_name in TYPE_CONVERTERS)
+
+    @classmethod
+    def from_statement(cls, statement) -> "RowSerializer":
+        return cls([(attribute.name, attribute.type.name) for attribute in statement.get_attributes()])
+
+    def to_dict(self, row) -> dict:
+        if not self.converters:
+            return dict(zip(self.names, row.values()))
+        values = list(row.values())
+        for index, converter in self.converters:
+            value = values[index]
+            if value is not None:
+                values[index] = converter(value)
+        return dict(zip(self.names, values))
+
+    def to_dicts(self, rows) -> list:
+        return [self.to_dict(row) for row in rows]
+
+
+# Un sérialiseur par texte de requête, construit à la première exécution
+_serializers = {}
+
+
+def serializer_for(query: str, statement) -> RowSerializer:
+    serializer = _serializers.get(query)
+    if serializer is None:
+        serializer = _serializers[query] = RowSerializer.from_statement(statement)
+    return serializer
+
+
+async def fetch_rows(conn, query: str, *args) -> list:
+    # Exécute la requête (instruction préparée, mise en cache par asyncpg) et
+    # renvoie des dictionnaires prêts à être encodés en JSON
+    statement = await conn.prepare(query)
+    rows = await statement.fetch(*args)
+    return serializer_for(query, statement).to_dicts(rows)
+
+
+class FastJSONResponse(Response):
+    # Réponse JSON encodée directement avec le backend rapide, sans jsonable_encoder
+    media_type = "application/json"
+
+    def render(self, content) -> bytes:
+        return dumps(content)
@@ -0,0 +1,166 @@
+# Tests du cache HTTP de la passerelle : validateurs (ETag, If-Modified-Since),
+# invalidation du cache de réponses par version et versions de contenu Redis.
+# Les tests Redis demandent fakeredis avec Lua (requirements-test.txt).
+#
+# Usage : python -m unittest discover tests
+import os
+import sys
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from http_cache import (ContentVersions, ResponseCache, etag_matches, http_date,  # noqa: E402
+                        not_modified_since, versioned_etag)
+
+try:
+    import fakeredis
+    from fakeredis import aioredis as fake_aioredis
+except ImportError:
+    fake_aioredis = None
+
+
+class Clock:
+    # Remplace time.monotonic dans http_cache
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class EtagMatchesTest(unittest.TestCase):
+    def test_exact_and_list(self):
+        self.assertTrue(etag_matches('"a"', '"a"'))
+        self.assertTrue(etag_matches('"x", "a" ,"y"', '"a"'))
+        self.assertFalse(etag_matches('"b"', '"a"'))
+
+    def test_weak_comparison(self):
+        self.assertTrue(etag_matches('W/"a"', '"a"'))
+
+    def test_wildcard(self):
+        self.assertTrue(etag_matches(" * ", '"a"'))
+
+    def test_missing_header(self):
+        self.assertFalse(etag_matches(None, '"a"'))
+        self.assertFalse(etag_matches("", '"a"'))
+
+    def test_versioned_etag_changes_with_version_modified_and_variant(self):
+        etag = versioned_etag(1, 2, 1700000000.5, "limit=10")
+        self.assertNotEqual(etag, versioned_etag(1, 3, 1700000000.5, "limit=10"))
+        self.assertNotEqual(etag, versioned_etag(1, 2, 1700000001.5, "limit=10"))
+        self.assertNotEqual(etag, versioned_etag(1, 2, 1700000000.5, "limit=20"))
+
+
+class NotModifiedSinceTest(unittest.TestCase):
+    def test_same_second(self):
+        self.assertTrue(not_modified_since(http_date(1700000000), 1700000000.9))
+
+    def test_modified_after(self):
+        self.assertFalse(not_modified_since(http_date(1700000000), 1700000001.0))
+
+    def test_invalid_or_missing_header(self):
+        self.assertFalse(not_modified_since("not a date", 1700000000))
+        self.assertFalse(not_modified_since(None, 1700000000))
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch("http_cache.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_hit_for_same_version(self):
+        cache = ResponseCache()
+        cache.put((1, ""), (1, 10.0), b"body")
+        self.assertEqual(cache.get((1, ""), (1, 10.0)), b"body")
+        self.assertEqual(cache.size_of((1, ""), (1, 10.0)), 4)
+
+    def test_new_version_invalidates(self):
+        cache = ResponseCache()
+        cache.put((1, ""), (1, 10.0), b"body")
+        self.assertIsNone(cache.get((1, ""), (2, 11.0)))
+        self.assertEqual(cache.stale, 1)
+        self.assertEqual(cache.memory_bytes, 0)
+        # L'entrée périmée est retirée, même pour l'ancienne version
+        self.assertIsNone(cache.get((1, ""), (1, 10.0)))
+
+    def test_recreated_version_key_invalidates(self):
+        cache = ResponseCache()
+        cache.put((1, ""), (0, 10.0), b"body")
+        self.assertIsNone(cache.get((1, ""), (0, 20.0)))
+
+    def test_max_age(self):
+        cache = ResponseCache(max_age=60)
+        cache.put((1, ""), (1, 10.0), b"body")
+        self.clock.now += 59
+        self.assertEqual(cache.get((1, ""), (1, 10.0)), b"body")
+        self.clock.now += 2
+        self.assertIsNone(cache.get((1, ""), (1, 10.0)))
+        self.assertEqual(cache.stale, 1)
+
+    def test_eviction_by_entries_and_bytes(self):
+        cache = ResponseCache(max_entries=2, max_bytes=10)
+        cache.put(1, 1, b"aaaa")
+        cache.put(2, 1, b"bbbb")
+        cache.get(1, 1)
+        cache.put(3, 1, b"cccc")
+        self.assertIsNone(cache.get(2, 1))
+        self.assertEqual(cache.get(1, 1), b"aaaa")
+        cache.put(4, 1, b"dddddddd")
+        self.assertEqual(cache.memory_bytes, 8)
+        self.assertEqual(cache.evictions, 3)
+
+    def test_oversized_body_not_stored(self):
+        cache = ResponseCache(max_bytes=4)
+        cache.put(1, 1, b"too large")
+        self.assertEqual(cache.metrics()["entries"], 0)
+
+
+@unittest.skipIf(fake_aioredis is None, "fakeredis is not installed")
+class ContentVersionsTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = fake_aioredis.FakeRedis(server=fakeredis.FakeServer())
+        self.versions = ContentVersions(self.redis, ttl=300)
+        self.versions.enable(True)
+
+    async def test_disabled_returns_none(self):
+        versions = ContentVersions(None)
+        versions.enable(True)
+        self.assertIsNone(await versions.get(1))
+        self.assertIsNone(await versions.start(1))
+        self.assertEqual(await versions.bump_many([1]), {})
+
+    async def test_get_is_read_only(self):
+        self.assertEqual(await self.versions.get(1), (0, None))
+        self.assertEqual(await self.redis.exists(ContentVersions.key(1)), 0)
+
+    async def test_start_creates_key_with_ttl(self):
+        version, modified = await self.versions.start(1)
+        self.assertEqual(version, 0)
+        self.assertEqual(await self.versions.get(1), (0, modified))
+        self.assertGreater(await self.redis.ttl(ContentVersions.key(1)), 0)
+        # Deuxième appel : la date de modification n'est pas réécrite
+        self.assertEqual(await self.versions.start(1), (0, modified))
+
+    async def test_bump_advances_version_and_modified_by_a_second(self):
+        _, modified = await self.versions.start(1)
+        self.assertEqual(await self.versions.bump_many([1, 2]), {1: 1, 2: 1})
+        version, bumped = await self.versions.get(1)
+        self.assertEqual(version, 1)
+        self.assertGreaterEqual(int(bumped), int(modified) + 1)
+        # If-Modified-Since à la date précédente ne donne pas de 304
+        self.assertFalse(not_modified_since(http_date(modified), bumped))
+        self.assertGreater(await self.redis.ttl(ContentVersions.key(2)), 0)
+
+    async def test_redis_error_returns_none(self):
+        async def failing(*args, **kwargs):
+            raise ConnectionError("down")
+        self.redis.hmget = failing
+        self.assertIsNone(await self.versions.get(1))
+        self.assertEqual(self.versions.errors, 1)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,216 @@
+# Tests du cache de produits : chargements dédupliqués (single-flight),
+# annulation du chargement partagé, écritures écartées après invalidation
+# (générations) et niveau Redis.
+# Les tests Redis demandent fakeredis (requirements-test.txt).
+#
+# Usage : python -m unittest discover tests
+import asyncio
+import os
+import sys
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from product_cache import ProductCache  # noqa: E402
+
+try:
+    import fakeredis
+    from fakeredis import aioredis as fake_aioredis
+except ImportError:
+    fake_aioredis = None
+
+
+class Loader:
+    # loader_many bloqué jusqu'à release() ; compte les appels et les ids chargés
+    def __init__(self):
+        self.calls = []
+        self.gate = asyncio.Event()
+        self.started = asyncio.Event()
+        self.value = "v1"
+
+    async def __call__(self, user_ids):
+        self.calls.append(list(user_ids))
+        self.started.set()
+        await self.gate.wait()
+        return {user_id: [f"{self.value}-{user_id}"] for user_id in user_ids}
+
+    def release(self):
+        self.gate.set()
+
+
+class SingleFlightTest(unittest.IsolatedAsyncioTestCase):
+    async def test_concurrent_loads_are_coalesced(self):
+        cache = ProductCache()
+        loader = Loader()
+        first = asyncio.create_task(cache.get_many([1, 2], loader))
+        await loader.started.wait()
+        second = asyncio.create_task(cache.get_many([2, 3], loader))
+        await asyncio.sleep(0)
+        loader.release()
+        self.assertEqual(await first, {1: ["v1-1"], 2: ["v1-2"]})
+        self.assertEqual(await second, {2: ["v1-2"], 3: ["v1-3"]})
+        self.assertEqual(loader.calls, [[1, 2], [3]])
+        self.assertEqual(cache.coalesced, 1)
+
+    async def test_cached_value_is_served_locally(self):
+        cache = ProductCache()
+        loader = Loader()
+        loader.release()
+        await cache.get(1, loader)
+        self.assertEqual(await cache.get(1, loader), ["v1-1"])
+        self.assertEqual(len(loader.calls), 1)
+        self.assertEqual(cache.local_hits, 1)
+
+    async def test_loader_error_reaches_waiters(self):
+        cache = ProductCache()
+        started = asyncio.Event()
+
+        async def failing(user_ids):
+            started.set()
+            await asyncio.sleep(0)
+            raise RuntimeError("db down")
+
+        first = asyncio.create_task(cache.get(1, failing))
+        await started.wait()
+        second = asyncio.create_task(cache.get(1, failing))
+        for task in (first, second):
+            with self.assertRaises(RuntimeError):
+                await task
+        self.assertEqual(cache.metrics()["entries"], 0)
+
+    async def test_waiter_reloads_when_loading_request_is_cancelled(self):
+        cache = ProductCache()
+        loader = Loader()
+        first = asyncio.create_task(cache.get(1, loader))
+        await loader.started.wait()
+        second = asyncio.create_task(cache.get(1, loader))
+        await asyncio.sleep(0)
+        first.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await first
+        loader.release()
+        self.assertEqual(await second, ["v1-1"])
+        self.assertEqual(loader.calls, [[1], [1]])
+
+    async def test_cancelled_waiter_does_not_cancel_the_load(self):
+        cache = ProductCache()
+        loader = Loader()
+        first = asyncio.create_task(cache.get(1, loader))
+        await loader.started.wait()
+        second = asyncio.create_task(cache.get(1, loader))
+        await asyncio.sleep(0)
+        second.cancel()
+        loader.release()
+        self.assertEqual(await first, ["v1-1"])
+        with self.assertRaises(asyncio.CancelledError):
+            await second
+
+
+class GenerationTest(unittest.IsolatedAsyncioTestCase):
+    async def test_invalidation_during_load_drops_the_store(self):
+        cache = ProductCache()
+        loader = Loader()
+        task = asyncio.create_task(cache.get(1, loader))
+        await loader.started.wait()
+        cache.invalidate_local([1])
+        loader.release()
+        # La demande en cours reçoit quand même son résultat, sans le mettre en cache
+        self.assertEqual(await task, ["v1-1"])
+        self.assertEqual(cache.stale_stores, 1)
+        self.assertEqual(cache.metrics()["entries"], 0)
+
+    async def test_clear_drops_inflight_stores(self):
+        cache = ProductCache()
+        loader = Loader()
+        task = asyncio.create_task(cache.get(1, loader))
+        await loader.started.wait()
+        cache.clear()
+        loader.release()
+        await task
+        self.assertEqual(cache.stale_stores, 1)
+
+    async def test_set_with_current_generation_is_stored(self):
+        cache = ProductCache()
+        await cache.set(1, ["a"], cache.generation(1))
+        self.assertEqual(await cache.get(1, Loader()), ["a"])
+
+    async def test_forgotten_generations_stay_above_dropped_ones(self):
+        cache = ProductCache(max_entries=2)
+        before = cache.generation(1)
+        cache.invalidate_local([1])
+        cache.invalidate_local([2, 3, 4])
+        # 1 est sorti de la table des générations : la valeur plancher la remplace
+        self.assertNotEqual(cache.generation(1), before)
+        await cache.set(1, ["stale"], before)
+        self.assertEqual(cache.stale_stores, 1)
+
+    async def test_ttl_and_event_driven_mode(self):
+        cache = ProductCache(ttl=30, event_ttl=300)
+        clock = mock.patch("product_cache.time.monotonic", return_value=1000.0)
+        monotonic = clock.start()
+        self.addCleanup(clock.stop)
+        await cache.set(1, ["a"])
+        monotonic.return_value = 1031.0
+        self.assertIsNone(cache._get_local(1))
+        cache.set_event_driven(True)
+        await cache.set(1, ["a"])
+        monotonic.return_value = 1300.0
+        self.assertEqual(cache._get_local(1), ["a"])
+        # Abonnement perdu : niveau local vidé, TTL court rétabli
+        cache.set_event_driven(False)
+        self.assertEqual(cache.metrics()["entries"], 0)
+        self.assertEqual(cache.ttl, 30)
+
+    async def test_lru_eviction(self):
+        cache = ProductCache(max_entries=2)
+        for user_id in (1, 2, 3):
+            await cache.set(user_id, [user_id])
+        self.assertIsNone(cache._get_local(1))
+        self.assertEqual(cache.evictions, 1)
+
+
+@unittest.skipIf(fake_aioredis is None, "fakeredis is not installed")
+class RedisTierTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.redis = fake_aioredis.FakeRedis(server=fakeredis.FakeServer())
+        self.cache = ProductCache(redis_client=self.redis)
+        self.cache.enable_redis(True)
+
+    async def test_value_is_shared_through_redis(self):
+        loader = Loader()
+        loader.release()
+        await self.cache.get(1, loader)
+        other = ProductCache(redis_client=self.redis)
+        other.enable_redis(True)
+        self.assertEqual(await other.get(1, loader), ["v1-1"])
+        self.assertEqual(other.redis_hits, 1)
+        self.assertEqual(len(loader.calls), 1)
+
+    async def test_event_during_load_leaves_no_stale_value_in_redis(self):
+        loader = Loader()
+        task = asyncio.create_task(self.cache.get(1, loader))
+        await loader.started.wait()
+        await self.cache.invalidate_many([1])
+        loader.release()
+        await task
+        self.assertIsNone(await self.redis.get(ProductCache.redis_key(1)))
+
+    async def test_invalidation_during_redis_write_removes_the_value(self):
+        generation = self.cache.generation(1)
+        original_set = self.redis.set
+
+        async def set_then_invalidate(*args, **kwargs):
+            result = await original_set(*args, **kwargs)
+            self.cache.invalidate_local([1])
+            return result
+
+        self.redis.set = set_then_invalidate
+        await self.cache.set(1, ["stale"], generation)
+        self.assertIsNone(await self.redis.get(ProductCache.redis_key(1)))
+        self.assertEqual(self.cache.stale_stores, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
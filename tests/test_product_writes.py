@@ -0,0 +1,163 @@
+# Tests des écritures de produits en lot : création et mise à jour par
+# tableaux (unnest) et par COPY, suppression, limite de description et
+# comptage des lignes écrites par l'API.
+# Les tests SQL demandent une base products_db migrée, désignée par
+# PRODUCTS_TEST_DATABASE_URL ; chaque test est annulé par un ROLLBACK.
+#
+# Usage : PRODUCTS_TEST_DATABASE_URL=postgresql://... python -m unittest discover tests
+import os
+import sys
+import unittest
+from contextlib import asynccontextmanager
+from decimal import Decimal
+from unittest import mock
+
+from pydantic import ValidationError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import product_writes  # noqa: E402
+import products_service  # noqa: E402
+from product_writes import create_products, delete_products, update_products  # noqa: E402
+from products_service import BulkCreateRequest, BulkUpdateRequest, write_products  # noqa: E402
+
+TEST_DATABASE_URL = os.getenv("PRODUCTS_TEST_DATABASE_URL")
+# Utilisateurs réservés aux tests, hors des plages de seed_db.py
+USER_ID = 910000000
+
+
+class ProductModelTest(unittest.TestCase):
+    def test_description_limit(self):
+        product = {"user_id": 1, "name": "Lamp", "price": "1.00", "description": "d" * 2000}
+        BulkCreateRequest(products=[product])
+        with self.assertRaises(ValidationError):
+            BulkCreateRequest(products=[{**product, "description": "d" * 2001}])
+        with self.assertRaises(ValidationError):
+            BulkUpdateRequest(products=[{"id": 1, "description": "d" * 2001}])
+
+
+class FakePool:
+    # db_pool minimal : acquire() puis transaction() sans base
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+
+class WriteProductsTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        for patcher in (mock.patch.object(products_service, "db_pool", FakePool()),
+                        mock.patch.object(products_service, "products_changed", mock.AsyncMock(return_value={7: 3})),
+                        mock.patch.object(products_service, "product_writes")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def test_counts_written_rows_per_operation(self):
+        for operation, key in (("create", "created"), ("update", "updated"), ("delete", "deleted")):
+            async def write(conn, items):
+                return {key: len(items)}, [7]
+            with self.assertLogs("products_service", "INFO"):
+                result = await write_products(operation, write, [1, 2])
+            self.assertEqual(result, {key: 2, "user_ids": [7], "versions": {"7": 3}})
+            products_service.product_writes.inc.assert_called_with(2, operation=operation)
+
+    async def test_invalid_batch_is_a_400(self):
+        async def write(conn, items):
+            raise ValueError("Each product id may appear only once per batch")
+        with self.assertRaises(products_service.HTTPException) as raised:
+            await write_products("update", write, [1, 1])
+        self.assertEqual(raised.exception.status_code, 400)
+
+    async def test_oversized_batch_is_a_413(self):
+        with mock.patch.object(products_service, "BULK_MAX_ITEMS", 1):
+            with self.assertRaises(products_service.HTTPException) as raised:
+                await write_products("delete", mock.AsyncMock(), [1, 2])
+        self.assertEqual(raised.exception.status_code, 413)
+
+
+@unittest.skipIf(not TEST_DATABASE_URL, "PRODUCTS_TEST_DATABASE_URL is not set")
+class ProductWritesSqlTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        import asyncpg
+        self.conn = await asyncpg.connect(TEST_DATABASE_URL)
+        self.transaction = self.conn.transaction()
+        await self.transaction.start()
+
+    async def asyncTearDown(self):
+        await self.transaction.rollback()
+        await self.conn.close()
+
+    def products(self, count):
+        return [{"user_id": USER_ID + i % 2, "name": f"Test product {i}", "price": Decimal("1.50"),
+                 "description": None if i % 3 else "d" * 2000}
+                for i in range(count)]
+
+    async def rows(self, ids):
+        rows = await self.conn.fetch("SELECT id, user_id, name, price, description FROM products "
+                                     "WHERE id = ANY($1::int[]) ORDER BY id", ids)
+        return {row["id"]: dict(row) for row in rows}
+
+    async def create(self, count, copy_threshold):
+        with mock.patch.object(product_writes, "BULK_COPY_THRESHOLD", copy_threshold):
+            return await create_products(self.conn, self.products(count))
+
+    async def check_create(self, copy_threshold):
+        (result, user_ids) = await self.create(5, copy_threshold)
+        self.assertEqual(result["created"], 5)
+        self.assertEqual(user_ids, [USER_ID, USER_ID + 1])
+        rows = await self.rows(result["ids"])
+        # Ids dans l'ordre du lot
+        self.assertEqual([rows[product_id]["name"] for product_id in result["ids"]],
+                         [f"Test product {i}" for i in range(5)])
+        self.assertEqual(len(rows[result["ids"][0]]["description"]), 2000)
+
+    async def test_create_with_arrays(self):
+        await self.check_create(copy_threshold=1000)
+
+    async def test_create_with_copy(self):
+        await self.check_create(copy_threshold=1)
+
+    async def check_update(self, copy_threshold):
+        (created, _) = await self.create(3, 1000)
+        first, second, third = created["ids"]
+        updates = [{"id": first, "price": Decimal("9.99")},
+                   {"id": second, "user_id": USER_ID + 5, "description": None},
+                   {"id": third, "name": "Renamed", "description": "new"},
+                   {"id": 0, "name": "Missing"}]
+        with mock.patch.object(product_writes, "BULK_COPY_THRESHOLD", copy_threshold):
+            result, user_ids = await update_products(self.conn, updates)
+        self.assertEqual(result, {"updated": 3, "not_found": [0]})
+        # Ancien et nouveau propriétaire du produit déplacé
+        self.assertEqual(user_ids, [USER_ID, USER_ID + 1, USER_ID + 5])
+        rows = await self.rows(created["ids"])
+        self.assertEqual(rows[first]["price"], Decimal("9.99"))
+        self.assertEqual(rows[first]["name"], "Test product 0")
+        self.assertEqual(rows[first]["description"], "d" * 2000)
+        self.assertEqual(rows[second]["user_id"], USER_ID + 5)
+        self.assertIsNone(rows[second]["description"])
+        self.assertEqual((rows[third]["name"], rows[third]["description"]), ("Renamed", "new"))
+
+    async def test_update_with_arrays(self):
+        await self.check_update(copy_threshold=1000)
+
+    async def test_update_with_temp_table(self):
+        await self.check_update(copy_threshold=1)
+
+    async def test_update_rejects_duplicate_ids(self):
+        with self.assertRaises(ValueError):
+            await update_products(self.conn, [{"id": 1, "name": "a"}, {"id": 1, "name": "b"}])
+
+    async def test_delete(self):
+        (created, _) = await self.create(2, 1000)
+        result, user_ids = await delete_products(self.conn, created["ids"] + [0])
+        self.assertEqual(result, {"deleted": 2, "not_found": [0]})
+        self.assertEqual(user_ids, [USER_ID, USER_ID + 1])
+        self.assertEqual(await self.rows(created["ids"]), {})
+
+
+if __name__ == "__main__":
+    unittest.main()
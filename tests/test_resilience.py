@@ -0,0 +1,233 @@
+# Tests des protections de resilience : états du disjoncteur, contrôle
+# d'admission par route et délestage sur la profondeur de file.
+#
+# Usage : python -m unittest discover tests
+import asyncio
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+import httpx
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse
+from starlette.routing import Route
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from resilience import (DEADLINE_HEADER, AdmissionControlMiddleware, AdmissionController,  # noqa: E402
+                        CircuitBreaker, CircuitOpenError, Overloaded, QueueDepthGuard)
+
+
+class Clock:
+    # Remplace time.monotonic dans resilience
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch("resilience.time.monotonic", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.breaker = CircuitBreaker("products", failure_threshold=3, reset_timeout=10)
+
+    def open_breaker(self):
+        for _ in range(3):
+            self.breaker.record_failure()
+
+    def test_opens_after_consecutive_failures(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.check()
+        self.assertEqual(self.breaker.state, "closed")
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        with self.assertRaises(CircuitOpenError) as raised:
+            self.breaker.check()
+        self.assertAlmostEqual(raised.exception.retry_after, 10)
+        self.assertEqual(self.breaker.metrics()["rejected"], 1)
+
+    def test_success_resets_failure_count(self):
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.breaker.record_success()
+        self.breaker.record_failure()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "closed")
+
+    def test_half_open_allows_a_single_probe(self):
+        self.open_breaker()
+        self.clock.now += 10
+        self.breaker.check()
+        self.assertEqual(self.breaker.state, "half_open")
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.check()
+
+    def test_probe_success_closes(self):
+        self.open_breaker()
+        self.clock.now += 10
+        self.breaker.check()
+        self.breaker.record_success()
+        self.assertEqual(self.breaker.state, "closed")
+        self.breaker.check()
+
+    def test_probe_failure_reopens(self):
+        self.open_breaker()
+        self.clock.now += 10
+        self.breaker.check()
+        self.breaker.record_failure()
+        self.assertEqual(self.breaker.state, "open")
+        self.assertEqual(self.breaker.metrics()["times_opened"], 2)
+        with self.assertRaises(CircuitOpenError):
+            self.breaker.check()
+
+    def test_lost_probe_is_replaced_after_reset_timeout(self):
+        # Essai annulé sans succès ni échec enregistré
+        self.open_breaker()
+        self.clock.now += 10
+        self.breaker.check()
+        self.clock.now += 11
+        self.breaker.check()
+        self.assertEqual(self.breaker.state, "half_open")
+
+
+def admission_app(controller: AdmissionController, release: asyncio.Event) -> Starlette:
+    async def slow(request):
+        await release.wait()
+        return JSONResponse({"ok": True})
+
+    async def fast(request):
+        return JSONResponse({"ok": True})
+
+    app = Starlette(routes=[Route("/slow/{item_id}", slow), Route("/fast", fast)])
+    app.add_middleware(AdmissionControlMiddleware, controller=controller)
+    return app
+
+
+class AdmissionControlTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.release = asyncio.Event()
+        self.controller = AdmissionController(default_limit=10, limits={"/slow/{item_id}": 1})
+        self.client = httpx.AsyncClient(app=admission_app(self.controller, self.release), base_url="http://test")
+
+    async def asyncTearDown(self):
+        await self.client.aclose()
+
+    async def test_sheds_above_route_limit(self):
+        first = asyncio.create_task(self.client.get("/slow/1"))
+        while self.controller.in_flight.get("/slow/{item_id}") != 1:
+            await asyncio.sleep(0.001)
+        # Limite par modèle de route, pas par chemin
+        shed = await self.client.get("/slow/2")
+        self.assertEqual(shed.status_code, 503)
+        self.assertEqual(shed.headers["Retry-After"], "1")
+        # Les autres routes ne sont pas touchées
+        self.assertEqual((await self.client.get("/fast")).status_code, 200)
+        self.release.set()
+        self.assertEqual((await first).status_code, 200)
+        self.assertEqual(self.controller.in_flight["/slow/{item_id}"], 0)
+        self.assertEqual(self.controller.metrics()["rejected"], {"/slow/{item_id}": 1})
+        self.assertEqual((await self.client.get("/slow/3")).status_code, 200)
+
+    async def test_expired_deadline_is_rejected(self):
+        response = await self.client.get("/fast", headers={DEADLINE_HEADER: f"{time.time() - 1:.3f}"})
+        self.assertEqual(response.status_code, 504)
+        self.assertEqual(self.controller.expired, 1)
+
+
+class FakeQueue:
+    name = "product_requests"
+
+    def __init__(self, depth: int):
+        self._depth = depth
+        self.reads = 0
+        self.error = None
+
+    async def depth(self) -> int:
+        self.reads += 1
+        if self.error:
+            raise self.error
+        return self._depth
+
+
+class QueueDepthGuardTest(unittest.IsolatedAsyncioTestCase):
+    async def test_sheds_when_queue_too_deep(self):
+        queue = FakeQueue(5)
+        guard = QueueDepthGuard(queue, max_depth=10, refresh_interval=0)
+        await guard.check()
+        queue._depth = 11
+        with self.assertRaises(Overloaded):
+            await guard.check()
+        self.assertEqual(guard.metrics()["shed"], 1)
+
+    async def test_depth_is_cached_between_refreshes(self):
+        queue = FakeQueue(11)
+        guard = QueueDepthGuard(queue, max_depth=10, refresh_interval=60)
+        for _ in range(3):
+            with self.assertRaises(Overloaded):
+                await guard.check()
+        self.assertEqual(queue.reads, 1)
+        self.assertEqual(guard.shed, 3)
+
+    async def test_read_error_keeps_last_depth(self):
+        queue = FakeQueue(11)
+        guard = QueueDepthGuard(queue, max_depth=10, refresh_interval=0)
+        with self.assertRaises(Overloaded):
+            await guard.check()
+        queue.error = ConnectionError("redis down")
+        with self.assertRaises(Overloaded):
+            await guard.check()
+
+    async def test_disabled_with_zero_max_depth(self):
+        queue = FakeQueue(10 ** 6)
+        await QueueDepthGuard(queue, max_depth=0).check()
+        self.assertEqual(queue.reads, 0)
+
+
+
+class GatewayRetryTest(unittest.IsolatedAsyncioTestCase):
+    # Nouvelles tentatives de la passerelle face aux 503 de délestage
+    async def asyncSetUp(self):
+        import gateway_service
+        self.gateway = gateway_service
+        self.calls = 0
+        self.breaker = CircuitBreaker("users", failure_threshold=gateway_service.UPSTREAM_RETRIES + 1,
+                                      reset_timeout=10)
+        for patcher in (mock.patch.dict(gateway_service.UPSTREAM_BREAKERS, {"users": self.breaker}),
+                        mock.patch.object(gateway_service, "RETRY_BACKOFF_BASE", 0)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def use_upstream(self, status_code, headers=None):
+        def handler(request):
+            self.calls += 1
+            return httpx.Response(status_code, json={"detail": "x"}, headers=headers)
+        patcher = mock.patch.object(self.gateway, "http_client", httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    async def test_shed_response_is_not_retried_nor_counted(self):
+        self.use_upstream(503, {"Retry-After": "1"})
+        for _ in range(3):
+            response = await self.gateway.get_with_retry("http://users/users/1", "users")
+            self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.calls, 3)
+        self.assertEqual(self.breaker.state, "closed")
+        self.assertEqual(self.gateway.upstream_error(response).headers, {"Retry-After": "1"})
+
+    async def test_unavailable_response_is_retried_and_counted(self):
+        self.use_upstream(503)
+        response = await self.gateway.get_with_retry("http://users/users/1", "users")
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(self.calls, self.gateway.UPSTREAM_RETRIES + 1)
+        self.assertEqual(self.breaker.state, "open")
+
+if __name__ == "__main__":
+    unittest.main()
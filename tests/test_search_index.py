@@ -0,0 +1,145 @@
+# Tests de l'index de recherche en mémoire : ajout, retrait et remplacement
+# par utilisateur, liste triée des mots, développement des préfixes, score,
+# filtre de prix et rattrapage des mises à jour faites pendant le chargement.
+#
+# Usage : python -m unittest discover tests
+import os
+import sys
+import unittest
+from contextlib import asynccontextmanager
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from search_index import SearchIndex  # noqa: E402
+
+
+def product(product_id, user_id, name, price=10, description=None):
+    return {"id": product_id, "user_id": user_id, "name": name, "price": price, "description": description}
+
+
+class SearchIndexTest(unittest.TestCase):
+    def setUp(self):
+        self.index = SearchIndex()
+        self.index.add(product(1, 1, "Red lamp", 20, "Desk lamp"))
+        self.index.add(product(2, 1, "Blue chair", 50))
+        self.index.add(product(3, 2, "Lampshade", 5, "Fits any red lamp"))
+
+    def ids(self, q, limit=10, offset=0, **filters):
+        return [product_id for product_id, _ in self.index.search(q, limit, offset, **filters)[0]]
+
+    def assert_terms_sorted(self):
+        self.assertEqual(self.index._sorted_terms, sorted(self.index._postings))
+
+    def test_exact_name_match_ranks_first(self):
+        self.assertEqual(self.ids("lamp"), [1, 3])
+
+    def test_all_terms_must_match(self):
+        self.assertEqual(self.ids("red lamp"), [1, 3])
+        self.assertEqual(self.ids("blue lamp"), [])
+
+    def test_prefix_match(self):
+        self.assertEqual(self.ids("cha"), [2])
+
+    def test_price_filter(self):
+        self.assertEqual(self.ids("lamp", min_price=10), [1])
+        self.assertEqual(self.ids("lamp", max_price=10), [3])
+        self.assertEqual(self.ids("lamp", min_price=30), [])
+
+    def test_product_without_price_is_excluded_by_price_filter(self):
+        self.index.add(product(4, 3, "Lamp", None))
+        self.assertIn(4, self.ids("lamp"))
+        self.assertNotIn(4, self.ids("lamp", max_price=1000))
+
+    def test_pagination(self):
+        results, next_offset = self.index.search("lamp", 1, 0)
+        self.assertEqual([product_id for product_id, _ in results], [1])
+        self.assertEqual(next_offset, 1)
+        results, next_offset = self.index.search("lamp", 1, 1)
+        self.assertEqual([product_id for product_id, _ in results], [3])
+        self.assertIsNone(next_offset)
+
+    def test_remove(self):
+        self.index.remove(1)
+        self.index.remove(99)
+        self.assertEqual(self.ids("lamp"), [3])
+        self.assertEqual(self.ids("desk"), [])
+        self.assertNotIn("desk", self.index._postings)
+
+    def test_add_replaces_existing_product(self):
+        self.index.add(product(2, 1, "Green sofa", 50))
+        self.assertEqual(self.ids("chair"), [])
+        self.assertEqual(self.ids("sofa"), [2])
+
+    def test_replace_users(self):
+        self.index.replace_users({1: [product(5, 1, "Lamp post", 90)], 2: []})
+        self.assertEqual(self.ids("lamp"), [5])
+        self.assertEqual(self.ids("chair"), [])
+        self.assertEqual(self.index.metrics()["documents"], 1)
+        self.assertEqual(self.index.updates, 2)
+
+    def test_sorted_terms_follow_adds_and_removes(self):
+        self.ids("lamp")
+        self.assert_terms_sorted()
+        self.index.add(product(6, 4, "Aardvark zebra"))
+        self.index.remove(2)
+        self.index.replace_users({2: [product(7, 2, "Mango")]})
+        self.assert_terms_sorted()
+        self.assertEqual(self.ids("aard"), [6])
+        self.assertEqual(self.ids("chair"), [])
+
+    def test_prefix_expansion_is_capped(self):
+        for product_id in range(10, 20):
+            self.index.add(product(product_id, 5, f"item{product_id}"))
+        with mock.patch("search_index.SEARCH_INDEX_MAX_EXPANSIONS", 3):
+            self.assertEqual(self.ids("item"), [10, 11, 12])
+
+    def test_query_without_words_is_rejected(self):
+        with self.assertRaises(ValueError):
+            self.index.search("!!", 10, 0)
+
+
+class FakeConnection:
+    # Connexion asyncpg minimale : on_row(n) est appelé avant la n-ième ligne
+    def __init__(self, rows, on_row=None):
+        self.rows = rows
+        self.on_row = on_row
+
+    @asynccontextmanager
+    async def transaction(self, **kwargs):
+        yield
+
+    async def cursor(self, query, prefetch=None):
+        for number, row in enumerate(self.rows):
+            if self.on_row is not None:
+                self.on_row(number)
+            yield row
+
+
+class SearchIndexLoadTest(unittest.IsolatedAsyncioTestCase):
+    async def test_load_builds_the_index(self):
+        index = SearchIndex()
+        touched = await index.load(FakeConnection([product(1, 1, "Lamp"), product(2, 2, "Chair")]))
+        self.assertEqual(touched, set())
+        self.assertTrue(index.ready)
+        self.assertFalse(index.loading)
+        self.assertEqual(index.metrics()["documents"], 2)
+
+    async def test_users_updated_while_loading_are_returned(self):
+        index = SearchIndex()
+
+        def update_during_load(number):
+            if number == 1:
+                index.replace_users({1: [product(1, 1, "New lamp")]})
+
+        rows = [product(1, 1, "Old lamp"), product(2, 2, "Chair")]
+        touched = await index.load(FakeConnection(rows, update_during_load))
+        self.assertEqual(touched, {1})
+        # Mises à jour suivantes : plus de suivi
+        index.replace_users({2: []})
+        self.assertEqual(index._touched_while_loading, set())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,121 @@
+# Tests du format des messages Redis (wire_format) : allers-retours encode /
+# decode, négociation du format et repli sur JSON.
+#
+# Usage : python -m unittest discover tests
+import os
+import sys
+import unittest
+from unittest import mock
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import wire_format  # noqa: E402
+from wire_format import (FORMAT_COLUMNAR, FORMAT_JSON, FORMAT_MSGPACK, MAGIC, WIRE_VERSION, choose_format,  # noqa: E402
+                         decode, encode)
+
+REPLY = {
+    "correlation_id": "abc",
+    "products": [
+        {"id": 1, "user_id": 7, "name": "Lamp", "price": "12.50", "description": None},
+        {"id": 2, "user_id": 7, "name": "Drone", "price": "999.00", "description": "x" * 50},
+    ],
+    "next_cursor": 2,
+}
+
+
+class RoundTripTest(unittest.TestCase):
+    def test_json_is_plain_json(self):
+        data = encode(REPLY, FORMAT_JSON)
+        self.assertFalse(data.startswith(MAGIC))
+        self.assertEqual(decode(data), REPLY)
+
+    def test_columnar_round_trip(self):
+        data = encode(REPLY, FORMAT_COLUMNAR)
+        self.assertTrue(data.startswith(MAGIC))
+        self.assertEqual(data[2], WIRE_VERSION)
+        self.assertEqual(decode(data), REPLY)
+
+    @unittest.skipIf(wire_format.msgpack is None, "msgpack is not installed")
+    def test_msgpack_round_trip(self):
+        data = encode(REPLY, FORMAT_MSGPACK)
+        self.assertTrue(data.startswith(MAGIC))
+        self.assertEqual(decode(data), REPLY)
+
+    def test_compressed_round_trip(self):
+        for fmt in wire_format.SUPPORTED_FORMATS:
+            with self.subTest(fmt=fmt), mock.patch.object(wire_format, "COMPRESSION_THRESHOLD", 16):
+                data = encode(REPLY, fmt)
+                if fmt != FORMAT_JSON:
+                    self.assertTrue(data[4] & wire_format.FLAG_ZLIB)
+                self.assertEqual(decode(data), REPLY)
+
+    def test_compression_disabled(self):
+        with mock.patch.object(wire_format, "COMPRESSION_THRESHOLD", 0):
+            data = encode(REPLY, FORMAT_COLUMNAR)
+        self.assertEqual(data[4], 0)
+        self.assertEqual(decode(data), REPLY)
+
+    def test_message_without_products(self):
+        request = {"user_id": 7, "accept": ["columnar", "json"]}
+        for fmt in wire_format.SUPPORTED_FORMATS:
+            with self.subTest(fmt=fmt):
+                self.assertEqual(decode(encode(request, fmt)), request)
+        empty = {"products": [], "next_cursor": None}
+        self.assertEqual(decode(encode(empty, FORMAT_COLUMNAR)), empty)
+
+    def test_decode_accepts_str(self):
+        self.assertEqual(decode(encode(REPLY).decode()), REPLY)
+
+
+class NegotiationTest(unittest.TestCase):
+    def test_old_caller_gets_json(self):
+        self.assertEqual(choose_format(None), FORMAT_JSON)
+        self.assertEqual(choose_format([]), FORMAT_JSON)
+
+    def test_prefers_our_order(self):
+        self.assertEqual(choose_format([FORMAT_JSON, FORMAT_COLUMNAR]), FORMAT_COLUMNAR)
+        self.assertEqual(choose_format(list(reversed(wire_format.SUPPORTED_FORMATS))),
+                         wire_format.SUPPORTED_FORMATS[0])
+
+    def test_unknown_formats_fall_back_to_json(self):
+        self.assertEqual(choose_format(["avro", "protobuf"]), FORMAT_JSON)
+
+    def test_msgpack_not_offered_without_library(self):
+        with mock.patch.object(wire_format, "SUPPORTED_FORMATS", [FORMAT_COLUMNAR, FORMAT_JSON]):
+            self.assertEqual(choose_format([FORMAT_MSGPACK, FORMAT_COLUMNAR]), FORMAT_COLUMNAR)
+
+
+class FallbackTest(unittest.TestCase):
+    def test_unknown_format_encodes_as_json(self):
+        data = encode(REPLY, "avro")
+        self.assertFalse(data.startswith(MAGIC))
+        self.assertEqual(decode(data), REPLY)
+
+    def test_msgpack_without_library_encodes_as_json(self):
+        with mock.patch.object(wire_format, "msgpack", None):
+            data = encode(REPLY, FORMAT_MSGPACK)
+        self.assertFalse(data.startswith(MAGIC))
+        self.assertEqual(decode(data), REPLY)
+
+    def test_unsupported_version_is_rejected(self):
+        data = bytearray(encode(REPLY, FORMAT_COLUMNAR))
+        data[2] = WIRE_VERSION + 1
+        with self.assertRaisesRegex(ValueError, "version"):
+            decode(bytes(data))
+
+    def test_unknown_codec_is_rejected(self):
+        data = bytearray(encode(REPLY, FORMAT_COLUMNAR))
+        data[3] = 99
+        with self.assertRaisesRegex(ValueError, "codec"):
+            decode(bytes(data))
+
+    @unittest.skipIf(wire_format.msgpack is None, "msgpack is not installed")
+    def test_msgpack_message_without_library(self):
+        data = encode(REPLY, FORMAT_MSGPACK)
+        with mock.patch.object(wire_format, "msgpack", None), self.assertRaisesRegex(ValueError, "msgpack"):
+            decode(data)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,3 @@
+# Requêtes sur users (vérifiées par check_query_plans.py)
+SELECT_USER_BY_ID = "SELECT * FROM users WHERE id = $1"
+SELECT_USERS_BY_IDS = "SELECT * FROM users WHERE id = ANY($1::int[])"
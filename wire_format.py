@@ -0,0 +1,111 @@
+import os
+import zlib
+
+from serialization import dumps, loads
+
+# MessagePack optionnel : sans lui, seul le format colonnes JSON compact est proposé
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Formats des messages Redis (demandes product_requests et réponses produits)
+#   json     : JSON texte historique, sans en-tête (compris par les anciens workers)
+#   columnar : JSON avec les noms de colonnes envoyés une seule fois
+#   msgpack  : MessagePack binaire, même disposition en colonnes
+FORMAT_JSON = "json"
+FORMAT_COLUMNAR = "columnar"
+FORMAT_MSGPACK = "msgpack"
+
+# Formats acceptés par ce processus, du plus au moins préféré
+SUPPORTED_FORMATS = ([FORMAT_MSGPACK] if msgpack is not None else []) + [FORMAT_COLUMNAR, FORMAT_JSON]
+
+# Format des demandes publiées : json tant que d'anciens workers peuvent tourner
+PRODUCT_REQUEST_FORMAT = os.getenv("PRODUCT_REQUEST_FORMAT", FORMAT_JSON)
+
+# Compression zlib des charges utiles au-delà de ce nombre d'octets (0 pour désactiver)
+COMPRESSION_THRESHOLD = int(os.getenv("WIRE_COMPRESSION_THRESHOLD", "4096"))
+COMPRESSION_LEVEL = int(os.getenv("WIRE_COMPRESSION_LEVEL", "1"))
+
+# En-tête des formats compacts : magie, version, codec, drapeaux
+MAGIC = b"\xb7P"
+WIRE_VERSION = 1
+CODEC_COLUMNAR = 1
+CODEC_MSGPACK = 2
+FLAG_ZLIB = 0x01
+
+_CODECS = {FORMAT_COLUMNAR: CODEC_COLUMNAR, FORMAT_MSGPACK: CODEC_MSGPACK}
+
+
+def choose_format(accepted) -> str:
+    # Premier format que nous préférons et que l'autre partie accepte ;
+    # un ancien appelant n'envoie pas "accept" et reçoit du JSON
+    if not accepted:
+        return FORMAT_JSON
+    for fmt in SUPPORTED_FORMATS:
+        if fmt in accepted:
+            return fmt
+    return FORMAT_JSON
+
+
+def _to_columnar(message: dict) -> dict:
+    products = message.get("products")
+    if not products or not isinstance(products[0], dict):
+        return message
+    columns = list(products[0].keys())
+    encoded = dict(message)
+    # Toutes les lignes d'une réponse viennent du même RowSerializer : même ordre de clés
+    encoded["products"] = {"columns": columns, "rows": [list(p.values()) for p in products]}
+    return encoded
+
+
+def _from_columnar(message: dict) -> dict:
+    products = message.get("products")
+    if isinstance(products, dict) and "columns" in products:
+        columns = products["columns"]
+        message["products"] = [dict(zip(columns, row)) for row in products["rows"]]
+    return message
+
+
+def encode(message: dict, fmt: str = FORMAT_JSON) -> bytes:
+    if fmt == FORMAT_JSON or fmt not in _CODECS:
+        return dumps(message)
+    if fmt == FORMAT_MSGPACK and msgpack is None:
+        return dumps(message)
+
+    columnar = _to_columnar(message)
+    if fmt == FORMAT_MSGPACK:
+        body = msgpack.packb(columnar, use_bin_type=True)
+    else:
+        body = dumps(columnar)
+
+    flags = 0
+    if COMPRESSION_THRESHOLD and len(body) > COMPRESSION_THRESHOLD:
+        body = zlib.compress(body, COMPRESSION_LEVEL)
+        flags |= FLAG_ZLIB
+    return MAGIC + bytes((WIRE_VERSION, _CODECS[fmt], flags)) + body
+
+
+def decode(data) -> dict:
+    if isinstance(data, str):
+        data = data.encode()
+    if not data.startswith(MAGIC):
+        # Format historique : JSON texte brut
+        return loads(data)
+
+    version, codec, flags = data[2], data[3], data[4]
+    if version != WIRE_VERSION:
+        raise ValueError(f"Unsupported wire format version {version}")
+    body = data[5:]
+    if flags & FLAG_ZLIB:
+        body = zlib.decompress(body)
+
+    if codec == CODEC_MSGPACK:
+        if msgpack is None:
+            raise ValueError("Received a msgpack message but msgpack is not installed")
+        message = msgpack.unpackb(body, raw=False)
+    elif codec == CODEC_COLUMNAR:
+        message = loads(body)
+    else:
+        raise ValueError(f"Unknown wire codec {codec}")
+    return _from_columnar(message)
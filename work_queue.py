@@ -0,0 +1,219 @@
+import logging
+import os
+import socket
+import time
+
+from redis.exceptions import ResponseError
+
+logger = logging.getLogger(__name__)
+
+# Transport des demandes de produits entre users_service et products_service :
+#   list   : liste LPUSH/BLPOP, sans acquittement ; fonctionne avec toutes les
+#            versions de Redis, dont le redis-server Windows (redis.windows.conf)
+#   stream : Redis Streams + groupe de consommateurs (acquittement explicite,
+#            reprise des demandes d'un consommateur mort) ; Redis >= 6.2
+# Les deux services doivent utiliser le même mode.
+PRODUCT_QUEUE_MODE = os.getenv("PRODUCT_QUEUE_MODE", "list")
+PRODUCT_REQUESTS_QUEUE = "product_requests"
+PRODUCT_REQUESTS_STREAM = "product_requests:stream"
+PRODUCT_REQUESTS_GROUP = os.getenv("PRODUCT_REQUESTS_GROUP", "products")
+
+# Longueur approximative maximale du flux (XADD MAXLEN ~, 0 : pas de limite)
+STREAM_MAXLEN = int(os.getenv("STREAM_MAXLEN", "100000"))
+# Une demande non acquittée depuis STREAM_CLAIM_IDLE_MS est reprise par un autre
+# consommateur. Un consommateur vivant garde jusqu'à CONSUMER_MAX_PENDING entrées
+# lues mais pas encore traitées : le délai doit dépasser largement le temps de
+# vider ce tampon sous charge, sinon une demande est traitée deux fois. Une
+# demande reprise après PRODUCTS_TIMEOUT n'a plus d'appelant : elle est écartée
+# par son échéance, ce délai ne sert qu'à ne rien perdre.
+STREAM_CLAIM_IDLE_MS = int(os.getenv("STREAM_CLAIM_IDLE_MS", "30000"))
+# Intervalle (secondes) entre deux recherches de demandes à reprendre
+STREAM_CLAIM_INTERVAL = float(os.getenv("STREAM_CLAIM_INTERVAL", "1"))
+# Sans compteur de retard (Redis < 7), les entrées non lues sont comptées par
+# XRANGE jusqu'à cette limite : la profondeur est alors un minimum
+STREAM_DEPTH_SCAN_LIMIT = int(os.getenv("STREAM_DEPTH_SCAN_LIMIT", "2000"))
+# XAUTOCLAIM
+STREAM_MIN_REDIS_VERSION = (6, 2)
+
+# Champ du message dans une entrée du flux
+MESSAGE_FIELD = b"m"
+
+
+class ListQueue:
+    # Liste Redis : un message lu est retiré de la file, ack() n'a rien à faire
+    mode = "list"
+
+    def __init__(self, client, name: str = PRODUCT_REQUESTS_QUEUE):
+        self.client = client
+        self.name = name
+        self.requeued = 0
+
+    async def setup(self):
+        pass
+
+    async def publish(self, payload):
+        await self.client.lpush(self.name, payload)
+
+    async def read(self, count: int, block_timeout: int) -> list:
+        # Renvoie des couples (identifiant, message) ; pas d'identifiant pour une liste
+        request = await self.client.blpop(self.name, timeout=block_timeout)
+        if not request:
+            return []
+        messages = [request[1]]
+        if count > 1:
+            # Vide d'un coup les messages déjà en attente (LRANGE + LTRIM atomiques,
+            # compatible avec les versions de Redis sans LPOP count)
+            async with self.client.pipeline(transaction=True) as pipe:
+                pipe.lrange(self.name, 0, count - 2)
+                pipe.ltrim(self.name, count - 1, -1)
+                more, _ = await pipe.execute()
+            messages.extend(more)
+        return [(None, message) for message in messages]
+
+    async def ack(self, entry_ids: list):
+        pass
+
+    async def release(self, entries: list):
+        # Remettre en tête de file pour qu'un autre worker les reprenne
+        await self.client.lpush(self.name, *reversed([message for _, message in entries]))
+        self.requeued += len(entries)
+
+    async def depth(self) -> int:
+        return await self.client.llen(self.name)
+
+    def metrics(self) -> dict:
+        return {"mode": self.mode, "requeued": self.requeued}
+
+
+class StreamQueue:
+    # Flux Redis lu par un groupe de consommateurs : une entrée reste en attente
+    # (PEL) jusqu'à XACK. Celles d'un consommateur mort sont reprises par
+    # XAUTOCLAIM après STREAM_CLAIM_IDLE_MS.
+    mode = "stream"
+
+    def __init__(self, client, name: str = PRODUCT_REQUESTS_STREAM, group: str = PRODUCT_REQUESTS_GROUP,
+                 consumer=None, maxlen: int = STREAM_MAXLEN, claim_idle_ms: int = STREAM_CLAIM_IDLE_MS,
+                 claim_interval: float = STREAM_CLAIM_INTERVAL, depth_scan_limit: int = STREAM_DEPTH_SCAN_LIMIT):
+        self.client = client
+        self.name = name
+        self.group = group
+        # Nom fixé au démarrage du consommateur (après un éventuel fork)
+        self.consumer = consumer
+        self.maxlen = maxlen
+        self.claim_idle_ms = claim_idle_ms
+        self.claim_interval = claim_interval
+        self.depth_scan_limit = depth_scan_limit
+        self._claim_cursor = "0-0"
+        self._claimed_at = 0.0
+
+        self.acked = 0
+        self.reclaimed = 0
+
+    async def setup(self):
+        if self.consumer is None:
+            self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        await self._check_server_version()
+        try:
+            await self.client.xgroup_create(self.name, self.group, id="0", mkstream=True)
+            logger.info("Created consumer group '%s' on '%s'", self.group, self.name)
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    async def _check_server_version(self):
+        try:
+            info = await self.client.info("server")
+        except ResponseError as e:
+            # INFO désactivé ou renommé (certains Redis hébergés) : XAUTOCLAIM échouera plus tard
+            logger.warning("Could not check Redis version: %s", e)
+            return
+        version = info.get("redis_version", "0")
+        if tuple(int(part) for part in str(version).split(".")[:2]) < STREAM_MIN_REDIS_VERSION:
+            raise RuntimeError(f"PRODUCT_QUEUE_MODE=stream needs Redis >= 6.2 (server is {version}); "
+                               f"use PRODUCT_QUEUE_MODE=list")
+
+    async def publish(self, payload):
+        await self.client.xadd(self.name, {MESSAGE_FIELD: payload}, maxlen=self.maxlen or None, approximate=True)
+
+    async def read(self, count: int, block_timeout: int) -> list:
+        try:
+            entries = await self._reclaim(count)
+            if not entries:
+                response = await self.client.xreadgroup(self.group, self.consumer, {self.name: ">"},
+                                                        count=count, block=block_timeout * 1000)
+                entries = response[0][1] if response else []
+        except ResponseError as e:
+            # Flux ou groupe supprimé (FLUSHALL, redémarrage de Redis sans persistance)
+            if "NOGROUP" not in str(e):
+                raise
+            await self.setup()
+            return []
+        return [(entry_id, fields[MESSAGE_FIELD]) for entry_id, fields in entries if fields]
+
+    async def _reclaim(self, count: int) -> list:
+        now = time.monotonic()
+        if now - self._claimed_at < self.claim_interval:
+            return []
+        self._claimed_at = now
+        response = await self.client.xautoclaim(self.name, self.group, self.consumer, self.claim_idle_ms,
+                                                start_id=self._claim_cursor, count=count)
+        self._claim_cursor = response[0]
+        # Entrées supprimées par MAXLEN entre-temps : fields vide
+        entries = [entry for entry in response[1] if entry[1]]
+        if entries:
+            self.reclaimed += len(entries)
+            logger.warning("Reclaimed %s pending entries from '%s'", len(entries), self.name)
+            # D'autres entrées peuvent suivre : pas d'attente avant la prochaine reprise
+            self._claimed_at = 0.0
+        return entries
+
+    async def ack(self, entry_ids: list):
+        if not entry_ids:
+            return
+        await self.client.xack(self.name, self.group, *entry_ids)
+        self.acked += len(entry_ids)
+
+    async def release(self, entries: list):
+        # Les entrées non traitées restent en attente et seront reprises
+        # (XAUTOCLAIM) par un autre consommateur
+        pass
+
+    async def depth(self) -> int:
+        # Entrées pas encore lues par le groupe + lues mais non acquittées
+        try:
+            groups = await self.client.xinfo_groups(self.name)
+        except ResponseError as e:
+            # Flux pas encore créé : aucune demande en attente
+            if "no such key" not in str(e).lower():
+                raise
+            return 0
+        for group in groups:
+            name = group["name"]
+            if (name.decode() if isinstance(name, bytes) else name) == self.group:
+                return group["pending"] + await self._unread(group)
+        return await self.client.xlen(self.name)
+
+    async def _unread(self, group: dict) -> int:
+        # lag est NULL avant Redis 7, et après qu'un MAXLEN a supprimé des
+        # entrées non lues : justement quand la file déborde
+        if group.get("lag") is not None:
+            return group["lag"]
+        if group.get("entries-read") is not None:
+            added = (await self.client.xinfo_stream(self.name)).get("entries-added")
+            if added is not None:
+                return max(0, added - group["entries-read"])
+        last_id = group["last-delivered-id"]
+        last_id = last_id.decode() if isinstance(last_id, bytes) else last_id
+        unread = await self.client.xrange(self.name, min=f"({last_id}", count=self.depth_scan_limit)
+        return len(unread)
+
+    def metrics(self) -> dict:
+        return {"mode": self.mode, "acked": self.acked, "reclaimed": self.reclaimed}
+
+
+def product_request_queue(client, mode: str = PRODUCT_QUEUE_MODE):
+    if mode == "list":
+        return ListQueue(client)
+    if mode == "stream":
+        return StreamQueue(client)
+    raise ValueError(f"Unknown product queue mode '{mode}' (expected 'stream' or 'list')")